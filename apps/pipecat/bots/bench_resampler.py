@@ -0,0 +1,101 @@
+"""Benchmark for `StreamingResampler`.
+
+Resamples synthetic speech-like audio delivered in snippets, as a TTS provider
+streams it, and reports throughput, CPU time per second of audio and how far the
+result strays from resampling the whole signal at once (clicks at snippet
+boundaries show up there). When `resampy` is installed, the per-snippet `resampy`
+conversion `HumeTTSService` used before is measured too.
+
+    python -m bots.bench_resampler [--seconds 60] [--snippet-ms 200] [--rates 48000:24000 ...]
+"""
+
+import argparse
+import time
+from typing import Callable, List
+
+import numpy as np
+
+from bots.resampler import StreamingResampler
+
+
+def synthetic_audio(sample_rate: int, seconds: float) -> bytes:
+    """A few drifting harmonics with noise, loud enough to exercise clipping."""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    pitch = 140 + 40 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    signal = sum(np.sin(k * phase) / k for k in range(1, 12))
+    signal += 0.05 * rng.standard_normal(len(t))
+    signal *= 12000 / np.max(np.abs(signal))
+    return signal.astype(np.int16).tobytes()
+
+
+def snippets(pcm: bytes, sample_rate: int, snippet_ms: int) -> List[bytes]:
+    size = sample_rate * snippet_ms // 1000 * 2
+    return [pcm[i : i + size] for i in range(0, len(pcm), size)]
+
+
+def run_streaming(chunks: List[bytes], from_rate: int, to_rate: int) -> bytes:
+    resampler = StreamingResampler(from_rate, to_rate)
+    return b"".join([resampler.process(chunk) for chunk in chunks]) + resampler.flush()
+
+
+def run_resampy(chunks: List[bytes], from_rate: int, to_rate: int) -> bytes:
+    import resampy
+
+    out = []
+    for chunk in chunks:
+        samples = np.frombuffer(chunk, dtype=np.int16).astype(np.float32)
+        resampled = resampy.resample(samples, from_rate, to_rate)
+        out.append(np.clip(resampled, -32768, 32767).astype(np.int16).tobytes())
+    return b"".join(out)
+
+
+def measure(run: Callable, chunks: List[bytes], from_rate: int, to_rate: int):
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    out = run(chunks, from_rate, to_rate)
+    return out, time.perf_counter() - wall, time.process_time() - cpu
+
+
+def max_deviation(out: bytes, reference: bytes) -> int:
+    a = np.frombuffer(out, dtype=np.int16).astype(np.int32)
+    b = np.frombuffer(reference, dtype=np.int16).astype(np.int32)
+    n = min(len(a), len(b))
+    return int(np.max(np.abs(a[:n] - b[:n]))) if n else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--snippet-ms", type=int, default=200)
+    parser.add_argument(
+        "--rates", nargs="*", default=["48000:24000", "48000:16000", "48000:44100", "24000:16000"]
+    )
+    args = parser.parse_args()
+
+    try:
+        import resampy  # noqa: F401
+
+        runs = [("streaming", run_streaming), ("resampy", run_resampy)]
+    except ImportError:
+        runs = [("streaming", run_streaming)]
+
+    for rates in args.rates:
+        from_rate, to_rate = (int(rate) for rate in rates.split(":"))
+        pcm = synthetic_audio(from_rate, args.seconds)
+        chunks = snippets(pcm, from_rate, args.snippet_ms)
+        # The same resampler over the whole signal at once
+        reference = run_streaming([pcm], from_rate, to_rate)
+        print(f"{from_rate} -> {to_rate}: {args.seconds:.0f}s in {args.snippet_ms} ms snippets")
+        for label, run in runs:
+            out, wall, cpu = measure(run, chunks, from_rate, to_rate)
+            print(
+                f"  {label:<10} {args.seconds / wall:8.0f}x realtime  "
+                f"{cpu / args.seconds * 1000:6.2f} ms CPU per audio second  "
+                f"max deviation from one-shot {max_deviation(out, reference)}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Process-wide pool of TTS provider connections.
+
+Pipelines are short-lived, but the connections they need are not: every pipeline
+used to open its own aiohttp session, paying DNS and TLS handshakes on its first
+sentence. The pool keeps one keep-alive HTTP session per provider that pipelines of
+the same process share.
+
+The pool is per process. Pipelines run in the webapp process (`bots/websocket`,
+`bots/smallwebrtc`, `bots/tts`) share it, and `keep_warm` in the webapp lifespan
+applies to them. A Daily session (`bots/webrtc`) runs in a process of
+its own, so there the pool only spares the session's later requests a reconnect; the
+session warms its own connection while the transport joins and closes the pool when
+it ends.
+"""
+
+import asyncio
+import os
+from typing import Dict, Optional
+
+import aiohttp
+from loguru import logger
+
+MINIMAX_HTTP_URL = "https://api.minimax.chat"
+
+
+class TTSConnectionPool:
+    """Shares keep-alive HTTP sessions between pipelines in one process.
+
+    Sessions are keyed by provider and never handed out exclusively; aiohttp keeps
+    their connections alive. A maintenance task re-opens the connections of
+    `keep_warm` URLs before aiohttp's keep-alive closes them.
+    """
+
+    def __init__(
+        self,
+        *,
+        http_limit_per_host: int = 20,
+        http_keepalive_secs: float = 60.0,
+    ):
+        self._http_limit_per_host = http_limit_per_host
+        self._http_keepalive_secs = http_keepalive_secs
+
+        self._http_sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._warm_urls: Dict[str, str] = {}
+        self._maintenance_task: Optional[asyncio.Task] = None
+
+    #
+    # HTTP
+    #
+
+    def http_session(self, provider: str) -> aiohttp.ClientSession:
+        """Return the shared keep-alive session for `provider`.
+
+        The session belongs to the pool: callers must not close it.
+        """
+        session = self._http_sessions.get(provider)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit_per_host=self._http_limit_per_host,
+                keepalive_timeout=self._http_keepalive_secs,
+                ttl_dns_cache=300,
+            )
+            session = aiohttp.ClientSession(connector=connector)
+            self._http_sessions[provider] = session
+        self._ensure_maintenance()
+        return session
+
+    def keep_warm(self, provider: str, url: str):
+        """Keep a connection to `url` open so the first request skips DNS and TLS."""
+        self._warm_urls[provider] = url
+        self._ensure_maintenance()
+
+    async def _warm_http(self):
+        for provider, url in self._warm_urls.items():
+            try:
+                async with self.http_session(provider).head(url) as response:
+                    await response.release()
+            except Exception as e:
+                logger.debug(f"Could not warm {provider} connection: {e}")
+
+    #
+    # Maintenance
+    #
+
+    def _ensure_maintenance(self):
+        if self._maintenance_task is None or self._maintenance_task.done():
+            self._maintenance_task = asyncio.get_running_loop().create_task(self._maintain())
+
+    async def _maintain(self):
+        interval = max(1.0, self._http_keepalive_secs / 2)
+        # Connect right away: the first requests after startup are the ones keep_warm is for
+        while True:
+            await self._warm_http()
+            await asyncio.sleep(interval)
+
+    async def close(self):
+        if self._maintenance_task:
+            self._maintenance_task.cancel()
+            try:
+                await self._maintenance_task
+            except asyncio.CancelledError:
+                pass
+            self._maintenance_task = None
+        for session in self._http_sessions.values():
+            await session.close()
+        self._http_sessions.clear()
+
+
+_pool: Optional[TTSConnectionPool] = None
+_pool_pid: Optional[int] = None
+
+
+def get_tts_pool() -> TTSConnectionPool:
+    """Return the process-wide pool, creating it on first use.
+
+    Voice bots run in forked processes with their own event loop, and neither
+    aiohttp sessions nor sockets can be shared with the parent, so each process gets
+    its own pool.
+    """
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        _pool = TTSConnectionPool(
+            http_keepalive_secs=float(os.getenv("TTS_POOL_KEEPALIVE_SECS", "60")),
+        )
+        _pool_pid = os.getpid()
+    return _pool
+
+
+async def close_tts_pool():
+    global _pool
+    if _pool is not None and _pool_pid == os.getpid():
+        await _pool.close()
+    _pool = None
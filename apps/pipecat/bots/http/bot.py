@@ -4,12 +4,12 @@ import os
 import json
 from bots.http.frame_serializer import BotFrameSerializer
 from bots.persistent_context import PersistentContext
-from common.publisher import PublisherFactory
+from common.outbox import publish_via_outbox
 from bots.rtvi import create_rtvi_processor
 from bots.types import BotConfig, BotParams
+from common.blob_store import default_blob_store
 from common.config import SERVICE_API_KEYS
 from common.models import Attachment, Message
-from common.publisher import default_publisher_factory
 from fastapi import HTTPException, status
 from loguru import logger
 from openai._types import NOT_GIVEN
@@ -29,6 +29,7 @@ from pipecat.processors.frameworks.rtvi import (
 )
 from pipecat.services.ai_services import OpenAILLMContext
 from pipecat.services.google import GoogleLLMContext, GoogleLLMService
+from bots.mem0.local_memory import get_local_memory
 from bots.mem0.memory import Mem0MemoryService
 # from langchain_community.chat_message_histories import SQLChatMessageHistory
 # from langchain_core.messages import HumanMessage, AIMessage
@@ -147,9 +148,13 @@ async def http_bot_pipeline(
     #
 
     tts = CartesiaTTSService(api_key=os.getenv("CARTESIA_API_KEY"), model="sonic-turbo-2025-03-07", voice_id="f786b574-daa5-4673-aa0c-cbe3e8534c02")
+    if os.getenv("MEM0_BACKEND", "mem0") == "local":
+        memory_backend = {"memory": get_local_memory()}
+    else:
+        memory_backend = {"local_config": memory_config}
     memory = Mem0MemoryService(
         # api_key=os.getenv("MEM0_API_KEY"),  # Your Mem0 API key
-        local_config=memory_config,
+        **memory_backend,
         user_id=params.user_id,  # Unique identifier for the user
         agent_id="fastapi_memory_bot",  # Optional identifier for the agent
         # run_id="session1",  # Optional identifier for the run
@@ -187,7 +192,6 @@ async def http_bot_pipeline(
     async def on_context_message(messages: list[Any]):
         logger.debug(f"{len(messages)} message(s) received for storage: {str(messages)[:120]}...")
         try:
-            default_publisher_factory = PublisherFactory()
             payload = {
                 "pattern": "message",
                 "data": {
@@ -198,7 +202,8 @@ async def http_bot_pipeline(
                     "messages": messages,
                 }
             }
-            default_publisher_factory.publish(json.dumps(payload))
+            # Stored locally first; the outbox drainer ships it to the broker
+            await publish_via_outbox(payload)
             # add_chat_history_to_db(history, messages)
         except Exception as e:
             logger.error(f"Error storing messages: {e}")
@@ -228,7 +233,9 @@ async def http_bot_pipeline(
                                 {
                                     "type": "image_url",
                                     "image_url": {
-                                        "url": f"data:{attachment.file_type};base64,{attachment.file_data}"
+                                        "url": await default_blob_store.data_url(
+                                            attachment.digest, attachment.file_type
+                                        )
                                     },
                                 }
                             )
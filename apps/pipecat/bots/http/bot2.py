@@ -4,12 +4,12 @@ import os
 import json
 from bots.http.frame_serializer import BotFrameSerializer
 from bots.persistent_context import PersistentContext
-from common.publisher import PublisherFactory
+from common.publisher import get_publisher
 from bots.rtvi import create_rtvi_processor
 from bots.types import BotConfig, BotParams
+from common.blob_store import default_blob_store
 from common.config import SERVICE_API_KEYS
 from common.models import Attachment, Message
-from common.publisher import default_publisher_factory
 from fastapi import HTTPException, status
 from loguru import logger
 from openai._types import NOT_GIVEN
@@ -158,7 +158,6 @@ async def http_bot_pipeline(
     async def on_context_message(messages: list[Any]):
         logger.debug(f"{len(messages)} message(s) received for storage: {str(messages)[:120]}...")
         try:
-            default_publisher_factory = PublisherFactory()
             print(params.user_id, params.participant_id)
             payload = {
                 "pattern": "message",
@@ -170,7 +169,7 @@ async def http_bot_pipeline(
                     "messages": messages,
                 }
             }
-            default_publisher_factory.publish(json.dumps(payload))
+            get_publisher().publish(json.dumps(payload))
         except Exception as e:
             logger.error(f"Error storing messages: {e}")
             raise e
@@ -199,7 +198,9 @@ async def http_bot_pipeline(
                                 {
                                     "type": "image_url",
                                     "image_url": {
-                                        "url": f"data:{attachment.file_type};base64,{attachment.file_data}"
+                                        "url": await default_blob_store.data_url(
+                                            attachment.digest, attachment.file_type
+                                        )
                                     },
                                 }
                             )
@@ -19,7 +19,10 @@ from pipecat.frames.frames import (
 )
 
 from loguru import logger
-from .utils import resample_pcm
+from bots.resampler import StreamingResampler
+
+# Hume 返回的 PCM 采样率
+HUME_SAMPLE_RATE = 48000
 
 class HumeTTSService(TTSService):
     def __init__(
@@ -51,6 +54,8 @@ class HumeTTSService(TTSService):
             await self.start_ttfb_metrics()
             await self.start_tts_usage_metrics(text)
             yield TTSStartedFrame()
+            # 每次合成一个重采样器，滤波器状态跨片段保留
+            resampler = StreamingResampler(HUME_SAMPLE_RATE, self.sample_rate)
             async for snippet in self.hume_client.tts.synthesize_json_streaming(
               utterances = [
                 PostedUtterance(
@@ -64,7 +69,12 @@ class HumeTTSService(TTSService):
               num_generations=1,
             ):
               await self.stop_ttfb_metrics()
-              yield TTSAudioRawFrame(audio=resample_pcm(base64.b64decode(snippet.audio), 48000, self.sample_rate), sample_rate=self.sample_rate, num_channels=1)
+              audio = resampler.process(base64.b64decode(snippet.audio))
+              if audio:
+                yield TTSAudioRawFrame(audio=audio, sample_rate=self.sample_rate, num_channels=1)
+            audio = resampler.flush()
+            if audio:
+              yield TTSAudioRawFrame(audio=audio, sample_rate=self.sample_rate, num_channels=1)
             yield TTSStoppedFrame()
         except Exception as e:
             logger.error(f"{self}: Error generating TTS: {e}")
@@ -1,20 +1,15 @@
 import asyncio
-import datetime
-import io
-import wave
-import aiofiles
 from typing import Any, AsyncGenerator, List, Tuple
 import os
 import json
 from pipecat.frames.frames import EndFrame, TTSSpeakFrame,TTSTextFrame,  TTSStartedFrame, Frame, TTSAudioRawFrame, TTSStoppedFrame, TransportMessageUrgentFrame, StartFrame, CancelFrame
 from bots.http.frame_serializer import BotFrameSerializer
 from bots.persistent_context import PersistentContext
-from common.publisher import PublisherFactory
+from common.outbox import default_outbox_drainer, publish_via_outbox
 from bots.rtvi import create_rtvi_processor
 from bots.types import BotConfig, BotParams
 from common.config import SERVICE_API_KEYS
 from common.models import Attachment, Message
-from common.publisher import default_publisher_factory
 from fastapi import HTTPException, status
 from loguru import logger
 from openai._types import NOT_GIVEN
@@ -25,6 +20,10 @@ from pipecat.services.cartesia.tts import CartesiaTTSService
 from pipecat.pipeline.pipeline import Pipeline
 from pipecat.pipeline.runner import PipelineRunner
 from bots.minimax.tts import MiniMaxHttpTTSService
+from bots.tts_cache import default_tts_cache, with_tts_cache
+from bots.wav_writer import StreamingWavWriter
+from common.database import default_session_factory
+from common.recordings import default_recording_store
 from pipecat.pipeline.task import PipelineTask
 from pipecat.processors.async_generator import AsyncGeneratorProcessor
 from pipecat.transcriptions.language import Language
@@ -41,33 +40,14 @@ from pipecat.services.elevenlabs.tts import ElevenLabsHttpTTSService
 from pipecat.services.rime.tts import RimeHttpTTSService
 import aiohttp
 
-os.makedirs("recordings", exist_ok=True)
-
-
-async def save_audio(audio: bytes, sample_rate: int, num_channels: int, name: str):
-    if len(audio) > 0:
-        filename = os.path.join(
-            "recordings",
-            f"{name}_conversation_recording.wav",
-        )
-        with io.BytesIO() as buffer:
-            with wave.open(buffer, "wb") as wf:
-                wf.setsampwidth(2)
-                wf.setnchannels(num_channels)
-                wf.setframerate(sample_rate)
-                wf.writeframes(audio)
-            async with aiofiles.open(filename, "wb") as file:
-                await file.write(buffer.getvalue())
-        print(f"Merged audio saved to {filename}")
-    else:
-        print("No audio data to save")
-
-
 class AudioBufferProcessor(FrameProcessor):
+    """Records the synthesized speech straight to a WAV file as it is produced."""
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self._params = kwargs.get("params")
-        self._audio_buffer = []
+        self._writer = None
+        self._recording_id = None
         self._word_timestamps_buffer = []
         self._sample_rate = 24000
         self._num_channels = 1
@@ -75,10 +55,12 @@ class AudioBufferProcessor(FrameProcessor):
         await super().process_frame(frame, direction)
         # print(f"frame: {frame}")
         if isinstance(frame, TTSStartedFrame):
-            self._audio_buffer = []
-            self._word_timestamps_buffer = []
+            await self._start_recording()
         elif isinstance(frame, TTSAudioRawFrame):
-            self._audio_buffer.append(frame.audio)
+            if self._writer is None:
+                await self._start_recording()
+            self._writer.set_format(frame.sample_rate, frame.num_channels)
+            self._writer.write(frame.audio)
         elif isinstance(frame, TTSTextFrame):
             # TTSTextFrame#44(pts: 0:00:01.817739, text: [l])
             self._word_timestamps_buffer.append({
@@ -86,31 +68,54 @@ class AudioBufferProcessor(FrameProcessor):
                 'start_time': frame.pts
             })
         elif isinstance(frame, EndFrame) or isinstance(frame, TTSStoppedFrame):
-            if self._audio_buffer:
-                await save_audio(
-                    b"".join(self._audio_buffer),
-                    self._sample_rate,
-                    self._num_channels,
-                    f"tts_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                )
-                await self.push_frame(TransportMessageUrgentFrame(message={'label': 'rtvi-ai', 'type': 'server-message', 'data': {'fileUrl': f"tts_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}", 'word_timestamps': self._word_timestamps_buffer, 'userId': self._params.user_id }}), direction)
-                default_publisher_factory = PublisherFactory()
-                print(f"self._word_timestamps_buffer: {self._params.actions[0].data}")
+            # Taken before closing so a later EndFrame does not save the recording twice
+            writer, self._writer = self._writer, None
+            if writer and writer.has_audio:
+                await writer.close()
                 payload = {
                     "pattern": "document",
                     "data": {
                         "content": self._params.actions[0].data['arguments'][0]['value'],
-                        "fileUrl": f"tts_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}",
+                        "fileUrl": self._recording_id,
                         "wordTimestamps": self._word_timestamps_buffer,
                         "userId": self._params.user_id
                     }
                 }
-                default_publisher_factory.publish(json.dumps(payload))
+                # The recording is indexed in the same transaction as the event announcing it
+                async with default_session_factory() as db:
+                    await default_recording_store.save(
+                        self._recording_id,
+                        kind="lesson",
+                        duration_secs=writer.duration_secs,
+                        sample_rate=writer.sample_rate,
+                        num_channels=writer.num_channels,
+                        user_id=self._params.user_id,
+                        db=db,
+                    )
+                    await publish_via_outbox(payload, db=db)
+                    await db.commit()
+                default_outbox_drainer.notify()
+                # Announced only once the recording is indexed, so the URL resolves
+                await self.push_frame(TransportMessageUrgentFrame(message={'label': 'rtvi-ai', 'type': 'server-message', 'data': {'fileUrl': self._recording_id, 'word_timestamps': self._word_timestamps_buffer, 'userId': self._params.user_id }}), direction)
                 await self.push_frame(EndFrame(), direction)
                 await self.push_frame(TTSStoppedFrame(), direction)
                 # await self.push_frame(CancelFrame(), direction)
+            elif writer:
+                await writer.discard()
         await self.push_frame(frame, direction)
 
+    async def _start_recording(self):
+        if self._writer:
+            await self._writer.discard()
+        self._recording_id = default_recording_store.new_id()
+        self._word_timestamps_buffer = []
+        self._writer = StreamingWavWriter(
+            default_recording_store.path_for(self._recording_id),
+            sample_rate=self._sample_rate,
+            num_channels=self._num_channels,
+        )
+        await self._writer.open()
+
 
 
 
@@ -122,61 +127,56 @@ async def lesson_tts_bot_pipeline(
 
     async_generator = AsyncGeneratorProcessor(serializer=BotFrameSerializer())
     rtvi = await create_rtvi_processor(config, user_aggregator=None)
-    if session is None:
-        session = aiohttp.ClientSession()
-    try:
-        # tts = ElevenLabsHttpTTSService(
-        #     api_key=os.getenv("ELEVENLABS_API_KEY", ""),
-        #     voice_id=params.voice_id,
-        #     aiohttp_session=session
-        # )
-        tts = CartesiaTTSService(
-            api_key=os.getenv("CARTESIA_API_KEY"), 
-            model="sonic-turbo-2025-03-07", 
-            voice_id="f786b574-daa5-4673-aa0c-cbe3e8534c02",
-            params=CartesiaTTSService.InputParams(
-                speed="slow"
-            )
+    # tts = ElevenLabsHttpTTSService(
+    #     api_key=os.getenv("ELEVENLABS_API_KEY", ""),
+    #     voice_id=params.voice_id,
+    #     aiohttp_session=session
+    # )
+    tts = CartesiaTTSService(
+        api_key=os.getenv("CARTESIA_API_KEY"), 
+        model="sonic-turbo-2025-03-07", 
+        voice_id="f786b574-daa5-4673-aa0c-cbe3e8534c02",
+        params=CartesiaTTSService.InputParams(
+            speed="slow"
         )
-        # tts = RimeHttpTTSService(
-        #     api_key=os.getenv("RIME_API_KEY", ""),
-        #     voice_id="luna",
-        #     model="arcana",
-        #     aiohttp_session=session,
-        #     params=RimeHttpTTSService.InputParams(
-        #         speed=0.7
-        #     )
-        # )
-        audiobuffer = AudioBufferProcessor(params=params)
-        processors = [
-            rtvi,
-            tts,
-            audiobuffer,
-            async_generator,
-        ]
-
-        pipeline = Pipeline(processors)
-
-        runner = PipelineRunner(handle_sigint=False)
-
-        task = PipelineTask(pipeline, observers=[RTVIObserver(rtvi)])
-
-        runner_task = asyncio.create_task(runner.run(task))
-
-        @rtvi.event_handler("on_bot_started")
-        async def on_bot_started(rtvi: RTVIProcessor):
-            # await task.queue_frames([StartFrame()])
-            for action in params.actions:
-                logger.debug(f"Processing action: {action}")
-                await rtvi.handle_message(action)
-                await tts.start(StartFrame())
-
-            action = RTVIActionRun(service="system", action="end")
-            message = RTVIMessage(type="action", id="END", data=action.model_dump())
-            await rtvi.handle_message(message)
-            
-    finally:
-        if session is None:
-            await session.close()
+    )
+    # Lesson content is identical for every learner; the output is a file, so no pacing
+    tts = with_tts_cache(tts, default_tts_cache, realtime=False)
+    # tts = RimeHttpTTSService(
+    #     api_key=os.getenv("RIME_API_KEY", ""),
+    #     voice_id="luna",
+    #     model="arcana",
+    #     aiohttp_session=session,
+    #     params=RimeHttpTTSService.InputParams(
+    #         speed=0.7
+    #     )
+    # )
+    audiobuffer = AudioBufferProcessor(params=params)
+    processors = [
+        rtvi,
+        tts,
+        audiobuffer,
+        async_generator,
+    ]
+
+    pipeline = Pipeline(processors)
+
+    runner = PipelineRunner(handle_sigint=False)
+
+    task = PipelineTask(pipeline, observers=[RTVIObserver(rtvi)])
+
+    runner_task = asyncio.create_task(runner.run(task))
+
+    @rtvi.event_handler("on_bot_started")
+    async def on_bot_started(rtvi: RTVIProcessor):
+        # await task.queue_frames([StartFrame()])
+        for action in params.actions:
+            logger.debug(f"Processing action: {action}")
+            await rtvi.handle_message(action)
+            await tts.start(StartFrame())
+
+        action = RTVIActionRun(service="system", action="end")
+        message = RTVIMessage(type="action", id="END", data=action.model_dump())
+        await rtvi.handle_message(message)
 
     return (async_generator.generator(), runner_task)
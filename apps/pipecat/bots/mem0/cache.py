@@ -0,0 +1,148 @@
+"""Caches in front of Mem0 retrieval.
+
+Voice conversations repeat themselves: "yes", "okay" and near-identical questions
+come back every few turns, and each used to cost an embedding call and a vector
+store query. `MemoryCache` keeps embeddings by normalized text and search results
+per memory scope (user, agent, run) for a short time, dropping a scope's results as
+soon as new memories are written for it.
+"""
+
+import os
+import string
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Utterances that carry nothing worth searching memories for
+TRIVIAL_UTTERANCES = frozenset(
+    {
+        "yes", "yeah", "yep", "yup", "no", "nope", "ok", "okay", "k", "sure", "right",
+        "hmm", "hm", "mm", "mhm", "uh", "um", "uh huh", "ah", "oh", "huh", "hi", "hey",
+        "hello", "bye", "thanks", "thank you", "cool", "great", "nice", "fine", "alright",
+        "嗯", "嗯嗯", "好", "好的", "好吧", "对", "对的", "是", "是的", "行", "可以", "哦", "啊",
+        "没有", "不是", "谢谢", "再见", "你好",
+    }
+)
+
+_STRIP = string.punctuation + string.whitespace + "，。！？、；：…～·“”‘’"
+
+
+def normalize_query(text: str) -> str:
+    """Fold case, width and spacing so trivially different utterances share entries."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return " ".join(text.split()).strip(_STRIP)
+
+
+def is_trivial_query(text: str, *, min_chars: int = 2) -> bool:
+    """Whether searching memories for `text` is not worth a round trip."""
+    normalized = normalize_query(text)
+    return len(normalized) < min_chars or normalized in TRIVIAL_UTTERANCES
+
+
+class CachingEmbedder:
+    """Wraps a Mem0 embedder so each distinct text is only embedded once.
+
+    Installed on a local `Memory` in place of its `embedding_model`; Mem0 embeds on
+    its worker threads, hence the lock.
+    """
+
+    def __init__(self, embedder: Any, cache: "MemoryCache"):
+        self.wrapped = embedder
+        self._cache = cache
+
+    def embed(self, text: str, memory_action: Optional[str] = None):
+        key = (memory_action, normalize_query(text))
+        embedding = self._cache.get_embedding(key)
+        if embedding is None:
+            embedding = self.wrapped.embed(text, memory_action)
+            self._cache.put_embedding(key, embedding)
+        return embedding
+
+    def __getattr__(self, name: str):
+        return getattr(self.wrapped, name)
+
+
+class MemoryCache:
+    """Process-wide embedding LRU and per-scope search result cache.
+
+    Args:
+        max_embeddings: Embeddings kept, least recently used dropped first.
+        search_ttl_secs: How long search results are reused; 0 disables the cache.
+        max_searches: Search results kept across all scopes.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_embeddings: int = 2048,
+        search_ttl_secs: float = 120.0,
+        max_searches: int = 1024,
+    ):
+        self._max_embeddings = max_embeddings
+        self._embeddings: "OrderedDict[Tuple[Optional[str], str], Any]" = OrderedDict()
+        self._embeddings_lock = threading.Lock()
+        self._search_ttl_secs = search_ttl_secs
+        self._max_searches = max_searches
+        # (scope, query key) -> (expires at, results)
+        self._searches: "OrderedDict[Tuple[Hashable, Hashable], Tuple[float, Any]]" = OrderedDict()
+        self.embedding_hits = 0
+        self.embedding_misses = 0
+        self.search_hits = 0
+        self.search_misses = 0
+
+    def get_embedding(self, key: Tuple[Optional[str], str]):
+        with self._embeddings_lock:
+            embedding = self._embeddings.get(key)
+            if embedding is None:
+                self.embedding_misses += 1
+                return None
+            self._embeddings.move_to_end(key)
+            self.embedding_hits += 1
+            return embedding
+
+    def put_embedding(self, key: Tuple[Optional[str], str], embedding: Any):
+        with self._embeddings_lock:
+            self._embeddings[key] = embedding
+            self._embeddings.move_to_end(key)
+            while len(self._embeddings) > self._max_embeddings:
+                self._embeddings.popitem(last=False)
+
+    def install(self, memory: Any):
+        """Put the embedding cache in front of `memory`'s embedder, once."""
+        embedder = getattr(memory, "embedding_model", None)
+        if embedder is not None and not isinstance(embedder, CachingEmbedder):
+            memory.embedding_model = CachingEmbedder(embedder, self)
+
+    def get_search(self, scope: Hashable, key: Hashable):
+        entry = self._searches.get((scope, key))
+        if entry is None or entry[0] < time.monotonic():
+            self.search_misses += 1
+            return None
+        self.search_hits += 1
+        return entry[1]
+
+    def put_search(self, scope: Hashable, key: Hashable, results: Any):
+        if self._search_ttl_secs <= 0:
+            return
+        self._searches[(scope, key)] = (time.monotonic() + self._search_ttl_secs, results)
+        self._searches.move_to_end((scope, key))
+        while len(self._searches) > self._max_searches:
+            self._searches.popitem(last=False)
+
+    def invalidate(self, scope: Hashable):
+        """Drop the search results of `scope`, e.g. after memories were written for it."""
+        for entry in [entry for entry in self._searches if entry[0] == scope]:
+            del self._searches[entry]
+
+
+# Create a default cache for convenience
+default_memory_cache = MemoryCache(
+    max_embeddings=int(os.getenv("MEM0_EMBEDDING_CACHE_SIZE", "2048")),
+    search_ttl_secs=float(os.getenv("MEM0_SEARCH_CACHE_TTL_SECS", "120")),
+)
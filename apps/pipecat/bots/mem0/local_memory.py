@@ -0,0 +1,362 @@
+"""In-process memory backend with the `search`/`add` surface of Mem0's `Memory`.
+
+The Mem0 setup goes to a remote Qdrant and a remote embedder, two network round
+trips per retrieval. `LocalMemory` keeps each user's memories in a flat vector index
+on local disk: vectors live in a memory-mapped file and their metadata in an
+append-only log, and a search is one matrix-vector product over the rows of the
+user. Memories are the user's own utterances, without Mem0's LLM extraction. The
+embedder is pluggable; the default `HashingEmbedder` needs no model or network,
+which also makes the memory path testable offline.
+
+Select it with `MEM0_BACKEND=local`. Several processes may share the directory:
+writes hold an exclusive `fcntl` lock on it and every operation first reads what
+other processes appended to the log.
+"""
+
+import fcntl
+import json
+import os
+import re
+import threading
+import unicodedata
+import uuid
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+
+_WORD_RE = re.compile(r"\w+")
+# Han, kana and hangul runs, which are written without spaces between words
+_CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af\uf900-\ufaff]+")
+_SCOPE_FIELDS = ("user_id", "agent_id", "run_id")
+
+
+class HashingEmbedder:
+    """Embeds text by hashing words and character n-grams into a fixed-size vector.
+
+    Character n-grams tolerate small spelling differences; runs of CJK characters are
+    split into character bigrams, which stand in for words. Vectors are L2-normalized,
+    so a dot product is the cosine similarity. Any object with the same `embed` method
+    can replace it.
+    """
+
+    def __init__(self, dims: int = 512, ngram_sizes: Tuple[int, ...] = (2, 3)):
+        self.dims = dims
+        self._ngram_sizes = ngram_sizes
+
+    def _features(self, text: str):
+        text = unicodedata.normalize("NFKC", text).casefold()
+        for run in _CJK_RE.findall(text):
+            for i in range(len(run)):
+                yield run[i], 0.5
+                if i + 1 < len(run):
+                    yield run[i : i + 2], 1.0
+        for word in _WORD_RE.findall(_CJK_RE.sub(" ", text)):
+            yield word, 1.0
+            padded = f"#{word}#"
+            for n in self._ngram_sizes:
+                for i in range(len(padded) - n + 1):
+                    yield padded[i : i + n], 0.5
+
+    def embed(self, text: str, memory_action: Optional[str] = None) -> List[float]:
+        vector = np.zeros(self.dims, dtype=np.float32)
+        for feature, weight in self._features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dims] += weight if h & 0x80000000 else -weight
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+
+class LocalMemory:
+    """A persistent flat vector index of memories, scoped by user, agent and run.
+
+    Args:
+        path: Directory holding `vectors.f32` and `memories.jsonl`.
+        embedder: Object with `embed(text, memory_action=None)`. Its vectors must
+            have `dims` dimensions and be normalized.
+        dims: Vector size.
+        min_score: Memories less similar than this are not returned.
+        duplicate_score: A new memory this similar to an existing one of the same
+            scope is not stored again.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        embedder: Optional[Any] = None,
+        dims: int = 512,
+        min_score: float = 0.2,
+        duplicate_score: float = 0.97,
+        initial_capacity: int = 1024,
+    ):
+        self._path = path
+        self.dims = dims
+        self.embedding_model = embedder or HashingEmbedder(dims)
+        self._min_score = min_score
+        self._duplicate_score = duplicate_score
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._log_path = os.path.join(path, "memories.jsonl")
+        # Held shared to read and exclusive to write, across processes
+        self._lock_file = open(os.path.join(path, "memories.lock"), "a")
+
+        # Row -> metadata; None once deleted
+        self._rows: List[Optional[Dict[str, Any]]] = []
+        self._ids: Dict[str, int] = {}
+        # Scope -> rows, rebuilt as an array on demand
+        self._scope_rows: Dict[Tuple, List[int]] = {}
+        self._scope_arrays: Dict[Tuple, np.ndarray] = {}
+        # Bytes of the log applied so far
+        self._log_offset = 0
+        self._capacity = 0
+        self._vectors: Optional[np.memmap] = None
+        with self._locked(exclusive=False):
+            self._read_log_tail()
+            self._ensure_capacity(max(initial_capacity, len(self._rows)))
+
+    #
+    # Storage
+    #
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        """Hold the thread lock and the file lock, then catch up with the log."""
+        with self._lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                if self._vectors is not None:
+                    self._read_log_tail()
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _read_log_tail(self):
+        """Apply the log entries appended since the last read, by any process."""
+        try:
+            size = os.path.getsize(self._log_path)
+        except FileNotFoundError:
+            return
+        if size <= self._log_offset:
+            return
+        with open(self._log_path, "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read(size - self._log_offset)
+        self._log_offset = size
+        for line in data.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A line cut short by a crash
+                continue
+            if entry.get("op") == "add":
+                self._apply_add(entry["row"], entry["memory"])
+            elif entry.get("op") == "delete":
+                self._apply_delete(entry["id"])
+        if self._vectors is not None:
+            # Rows added elsewhere may lie past the mapped capacity
+            self._ensure_capacity(len(self._rows))
+
+    def _apply_add(self, row: int, memory: Dict[str, Any]):
+        while len(self._rows) <= row:
+            self._rows.append(None)
+        self._rows[row] = memory
+        self._ids[memory["id"]] = row
+        scope = self._scope_of(memory)
+        self._scope_rows.setdefault(scope, []).append(row)
+        self._scope_arrays.pop(scope, None)
+
+    def _apply_delete(self, memory_id: str):
+        row = self._ids.pop(memory_id, None)
+        if row is None:
+            return
+        memory = self._rows[row]
+        self._rows[row] = None
+        scope = self._scope_of(memory)
+        self._scope_rows[scope].remove(row)
+        self._scope_arrays.pop(scope, None)
+
+    def _append_log(self, entry: Dict[str, Any]):
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self._log_path, "a+b") as f:
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # Never extend a line a crashed writer left unfinished
+                    line = b"\n" + line
+            f.write(line)
+            self._log_offset = f.tell()
+
+    def _ensure_capacity(self, rows: int):
+        if rows <= self._capacity and self._vectors is not None:
+            return
+        capacity = max(rows, self._capacity * 2, 1)
+        size = capacity * self.dims * 4
+        with open(self._vectors_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dims))
+        self._capacity = capacity
+
+    @staticmethod
+    def _scope_of(memory: Dict[str, Any]) -> Tuple:
+        return tuple(memory.get(field) for field in _SCOPE_FIELDS)
+
+    def _candidate_rows(self, user_id, agent_id, run_id) -> np.ndarray:
+        wanted = (user_id, agent_id, run_id)
+        if all(value is not None for value in wanted):
+            scopes = [wanted] if wanted in self._scope_rows else []
+        else:
+            # Unspecified fields match anything
+            scopes = [
+                scope
+                for scope in self._scope_rows
+                if all(w is None or w == s for w, s in zip(wanted, scope))
+            ]
+        arrays = []
+        for scope in scopes:
+            array = self._scope_arrays.get(scope)
+            if array is None:
+                array = np.asarray(self._scope_rows[scope], dtype=np.int64)
+                self._scope_arrays[scope] = array
+            arrays.append(array)
+        if not arrays:
+            return np.zeros(0, dtype=np.int64)
+        return arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+
+    def _embed(self, text: str, memory_action: str) -> np.ndarray:
+        vector = np.asarray(self.embedding_model.embed(text, memory_action), dtype=np.float32)
+        if vector.shape != (self.dims,):
+            raise ValueError(f"Embedder returned {vector.shape[0]} dimensions, expected {self.dims}")
+        return vector
+
+    def _top(self, vector: np.ndarray, rows: np.ndarray, limit: int) -> List[Tuple[int, float]]:
+        if len(rows) == 0:
+            return []
+        scores = self._vectors[rows] @ vector
+        if len(rows) > limit:
+            best = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            best = np.arange(len(rows))
+        best = best[np.argsort(-scores[best])]
+        return [(int(rows[i]), float(scores[i])) for i in best]
+
+    #
+    # Mem0 surface
+    #
+
+    def search(
+        self,
+        query: str,
+        *,
+        user_id: Optional[str] = None,
+        agent_id: Optional[str] = None,
+        run_id: Optional[str] = None,
+        limit: int = 100,
+        threshold: Optional[float] = None,
+        **kwargs,
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Return the memories of the scope most similar to `query`, best first."""
+        vector = self._embed(query, "search")
+        min_score = self._min_score if threshold is None else threshold
+        with self._locked(exclusive=False):
+            rows = self._candidate_rows(user_id, agent_id, run_id)
+            results = [
+                {**self._rows[row], "score": score}
+                for row, score in self._top(vector, rows, limit)
+                if score >= min_score
+            ]
+        return {"results": results}
+
+    def add(
+        self,
+        messages,
+        *,
+        user_id: Optional[str] = None,
+        agent_id: Optional[str] = None,
+        run_id: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs,
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Store the user messages of `messages` (a string or a list of messages)."""
+        if isinstance(messages, str):
+            messages = [{"role": "user", "content": messages}]
+        texts = [
+            " ".join(message["content"].split())
+            for message in messages
+            if message.get("role") == "user" and isinstance(message.get("content"), str)
+        ]
+        results = []
+        for text in texts:
+            if not text:
+                continue
+            vector = self._embed(text, "add")
+            with self._locked(exclusive=True):
+                rows = self._candidate_rows(user_id, agent_id, run_id)
+                top = self._top(vector, rows, 1)
+                if top and top[0][1] >= self._duplicate_score:
+                    continue
+                memory = {
+                    "id": str(uuid.uuid4()),
+                    "memory": text,
+                    "user_id": user_id,
+                    "agent_id": agent_id,
+                    "run_id": run_id,
+                    "metadata": metadata or {},
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                }
+                row = len(self._rows)
+                self._ensure_capacity(row + 1)
+                self._vectors[row] = vector
+                self._vectors.flush()
+                # The vector is on disk before the log names its row
+                self._append_log({"op": "add", "row": row, "memory": memory})
+                self._apply_add(row, memory)
+            results.append({"id": memory["id"], "memory": text, "event": "ADD"})
+        return {"results": results}
+
+    def get_all(
+        self,
+        *,
+        user_id: Optional[str] = None,
+        agent_id: Optional[str] = None,
+        run_id: Optional[str] = None,
+        limit: int = 100,
+        **kwargs,
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        with self._locked(exclusive=False):
+            rows = self._candidate_rows(user_id, agent_id, run_id)[:limit]
+            return {"results": [dict(self._rows[row]) for row in rows]}
+
+    def delete(self, memory_id: str):
+        with self._locked(exclusive=True):
+            if memory_id not in self._ids:
+                return
+            self._append_log({"op": "delete", "id": memory_id})
+            self._apply_delete(memory_id)
+
+
+_local_memory: Optional[LocalMemory] = None
+_local_memory_pid: Optional[int] = None
+
+
+def get_local_memory() -> LocalMemory:
+    """Return the process-wide local memory, opening it on first use."""
+    global _local_memory, _local_memory_pid
+    if _local_memory is None or _local_memory_pid != os.getpid():
+        path = os.getenv("LOCAL_MEMORY_PATH", "./local_memory")
+        _local_memory = LocalMemory(path, dims=int(os.getenv("LOCAL_MEMORY_DIMS", "512")))
+        _local_memory_pid = os.getpid()
+        logger.info(f"Opened local memory at {path}")
+    return _local_memory
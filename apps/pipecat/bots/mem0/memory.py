@@ -11,7 +11,10 @@ and retrieve conversational memories, enhancing LLM context with relevant
 historical information.
 """
 
-from typing import Any, Dict, List, Optional
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
 
 from loguru import logger
 from pydantic import BaseModel, Field
@@ -23,6 +26,10 @@ from pipecat.processors.aggregators.openai_llm_context import (
 )
 from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
 
+from bots.mem0.cache import MemoryCache, default_memory_cache, is_trivial_query, normalize_query
+from bots.persistent_context import EphemeralMessage
+from bots.tokens import estimate_tokens
+
 try:
     from mem0 import Memory, MemoryClient  # noqa: F401
 except ModuleNotFoundError as e:
@@ -33,12 +40,74 @@ except ModuleNotFoundError as e:
     raise Exception(f"Missing module: {e}")
 
 
+# Mem0 calls block on LLM extraction and vector store round trips. They run on their
+# own threads so slow memory operations cannot starve the default executor. Searches
+# and stores get separate pools: a store runs an LLM extraction lasting seconds, and
+# searches queued behind a few of them would spend their latency budget waiting for
+# a thread.
+_mem0_search_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("MEM0_SEARCH_WORKERS", "4")), thread_name_prefix="mem0-search"
+)
+_mem0_store_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("MEM0_STORE_WORKERS", "2")), thread_name_prefix="mem0-store"
+)
+
+# Queued by cleanup() so the store worker finishes what it holds and exits.
+_FLUSH_AND_STOP = object()
+
+# Only the conversation itself is ingested; system prompts and injected memories are not
+_INGESTED_ROLES = ("user", "assistant")
+
+
+def _message_text(message: Dict[str, Any]) -> Optional[str]:
+    """The text of a message whose content is a string or a list of parts."""
+    content = message.get("content")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list) and content:
+        first = content[0]
+        if isinstance(first, dict):
+            return first.get("text")
+    return None
+
+
+class Mem0MemoryMetrics(BaseModel):
+    retrievals: int = 0
+    cached_retrievals: int = 0
+    skipped_retrievals: int = 0
+    retrieval_timeouts: int = 0
+    stores: int = 0
+    failed_stores: int = 0
+    dropped_stores: int = 0
+    ingested_messages: int = 0
+    # Retrieved memories left out as duplicates or over the token budget
+    dropped_memories: int = 0
+    # Estimated tokens of the memory message currently in the context
+    memory_tokens: int = 0
+    # Estimated tokens sent to Mem0 for extraction over the session
+    ingested_tokens: int = 0
+
+
 class Mem0MemoryService(FrameProcessor):
     """A standalone memory service that integrates with Mem0.
 
     This service intercepts message frames in the pipeline, stores them in Mem0,
     and enhances context with relevant memories before passing them downstream.
     Supports both local and cloud-based Mem0 configurations.
+
+    Mem0 calls never run on the event loop. Retrieval runs on a search thread, never
+    queued behind stores, with a latency budget, and the frame goes on without memories when the budget runs out.
+    Stores are queued and written by a background task in order, so the frame is
+    forwarded without waiting for them; whatever is still queued is written on
+    cleanup.
+
+    Only messages added since the last store are ingested: the service keeps a
+    high-water mark into the context and sends the new user and assistant messages,
+    every `ingest_every_n_turns` user turns and once more at cleanup.
+
+    Retrieved memories occupy a single ephemeral message at `position`, replaced on
+    each new query instead of appended, so the prompt stays the same size however
+    long the session runs. It is never persisted nor ingested.
     """
 
     class InputParams(BaseModel):
@@ -50,7 +119,19 @@ class Mem0MemoryService(FrameProcessor):
             api_version: API version to use for Mem0 client operations.
             system_prompt: Prefix text for memory context messages.
             add_as_system_message: Whether to add memories as system messages.
-            position: Position to insert memory messages in context.
+            position: Index of the memory message in the context; negative counts from
+                the end, -1 placing it right before the latest message.
+            retrieval_timeout_secs: Latency budget for retrieval. On timeout the frame is
+                forwarded without memories.
+            max_pending_stores: Bound on queued stores. While the queue is full, new
+                messages wait to be sent with the next batch.
+            store_flush_timeout_secs: How long cleanup waits for queued stores.
+            min_query_chars: Utterances shorter than this (once normalized) and common
+                fillers such as "okay" or "嗯" are not searched for.
+            ingest_every_n_turns: Send new messages to Mem0 every this many user turns.
+                What is left is sent at cleanup.
+            max_memory_tokens: Token budget for the injected memories; the most relevant
+                ones that fit are kept. None for no limit.
         """
 
         search_limit: int = Field(default=10, ge=1)
@@ -59,26 +140,38 @@ class Mem0MemoryService(FrameProcessor):
         system_prompt: str = Field(default="Based on previous conversations, I recall: \n\n")
         add_as_system_message: bool = Field(default=True)
         position: int = Field(default=1)
+        retrieval_timeout_secs: float = Field(default=1.0, gt=0.0)
+        max_pending_stores: int = Field(default=16, ge=1)
+        store_flush_timeout_secs: float = Field(default=10.0, ge=0.0)
+        min_query_chars: int = Field(default=2, ge=0)
+        ingest_every_n_turns: int = Field(default=1, ge=1)
+        max_memory_tokens: Optional[int] = Field(default=300, ge=1)
 
     def __init__(
         self,
         *,
         api_key: Optional[str] = None,
         local_config: Optional[Dict[str, Any]] = None,
+        memory: Optional[Any] = None,
         user_id: Optional[str] = None,
         agent_id: Optional[str] = None,
         run_id: Optional[str] = None,
         params: Optional[InputParams] = None,
+        cache: Optional[MemoryCache] = default_memory_cache,
     ):
         """Initialize the Mem0 memory service.
 
         Args:
             api_key: The API key for accessing Mem0's cloud API.
             local_config: Local configuration for Mem0 client (alternative to cloud API).
+            memory: A ready memory with the interface of Mem0's `Memory`, such as
+                `LocalMemory` (alternative to both).
             user_id: The user ID to associate with memories in Mem0.
             agent_id: The agent ID to associate with memories in Mem0.
             run_id: The run ID to associate with memories in Mem0.
             params: Configuration parameters for memory retrieval and storage.
+            cache: Embedding and search result cache, shared by the services of a
+                process by default. None disables caching.
 
         Raises:
             ValueError: If none of user_id, agent_id, or run_id are provided.
@@ -89,7 +182,9 @@ class Mem0MemoryService(FrameProcessor):
         local_config = local_config or {}
         params = params or Mem0MemoryService.InputParams()
 
-        if local_config:
+        if memory is not None:
+            self.memory_client = memory
+        elif local_config:
             self.memory_client = Memory.from_config(local_config)
         else:
             self.memory_client = MemoryClient(api_key=api_key)
@@ -106,21 +201,34 @@ class Mem0MemoryService(FrameProcessor):
         self.system_prompt = params.system_prompt
         self.add_as_system_message = params.add_as_system_message
         self.position = params.position
+        self.retrieval_timeout_secs = params.retrieval_timeout_secs
+        self.store_flush_timeout_secs = params.store_flush_timeout_secs
+        self.min_query_chars = params.min_query_chars
+        self.ingest_every_n_turns = params.ingest_every_n_turns
+        self.max_memory_tokens = params.max_memory_tokens
         self.last_query = None
+        self._cache = cache
+        if cache is not None and not isinstance(self.memory_client, MemoryClient):
+            cache.install(self.memory_client)
+        self.metrics = Mem0MemoryMetrics()
+        self._store_queue: asyncio.Queue = asyncio.Queue(maxsize=params.max_pending_stores)
+        self._store_task: Optional[asyncio.Task] = None
+        # Ingestion high-water mark into the context's messages
+        self._ingested_count = 0
+        self._pending_ingest: List[Dict[str, str]] = []
+        self._pending_turns = 0
+        self._last_messages: Optional[List[Dict[str, Any]]] = None
         logger.info(f"Initialized Mem0MemoryService with {user_id=}, {agent_id=}, {run_id=}")
 
-    def _store_messages(self, messages: List[Dict[str, Any]]):
+    def _store_messages(self, messages: List[Dict[str, Any]]) -> bool:
         """Store messages in Mem0.
 
         Args:
             messages: List of message dictionaries to store in memory.
+
+        Returns:
+            Whether they were stored.
         """
-        # 预处理，将 content 为 list 且含有 text 字段的，提取 text 替换 content
-        for msg in messages:
-            if isinstance(msg.get("content"), list) and msg["content"]:
-                first = msg["content"][0]
-                if isinstance(first, dict) and "text" in first:
-                    msg["content"] = first["text"]
         try:
             logger.debug(f"Storing {len(messages)} messages in Mem0")
             params = {
@@ -132,12 +240,111 @@ class Mem0MemoryService(FrameProcessor):
                 if getattr(self, id):
                     params[id] = getattr(self, id)
 
-            if isinstance(self.memory_client, Memory):
+            if not isinstance(self.memory_client, MemoryClient):
                 del params["output_format"]
-            # Note: You can run this in background to avoid blocking the conversation
             self.memory_client.add(**params)
+            return True
         except Exception as e:
             logger.error(f"Error storing messages in Mem0: {e}")
+            return False
+
+    @staticmethod
+    async def _run_blocking(executor: ThreadPoolExecutor, func: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+    def _collect_new_messages(self, messages: List[Dict[str, Any]]):
+        """Move the messages past the high-water mark to the pending batch.
+
+        Pending messages are plain-text copies, so the context itself is never changed.
+        """
+        self._last_messages = messages
+        # The memory message moves around and is not part of the conversation
+        messages = [message for message in messages if not isinstance(message, EphemeralMessage)]
+        if len(messages) < self._ingested_count:
+            # The context was trimmed or replaced; only what is added from now on is new
+            logger.debug("Context shrank below the ingestion mark, resetting it")
+            self._ingested_count = len(messages)
+        for message in messages[self._ingested_count :]:
+            text = _message_text(message)
+            if message.get("role") in _INGESTED_ROLES and text:
+                self._pending_ingest.append({"role": message["role"], "content": text})
+        self._ingested_count = len(messages)
+
+    def _ingest(self, messages: List[Dict[str, Any]]):
+        """Queue the messages added since the last store once enough turns have passed."""
+        self._collect_new_messages(messages)
+        self._pending_turns += 1
+        if self._pending_turns < self.ingest_every_n_turns or not self._pending_ingest:
+            return
+        if self._store_queue.full():
+            # Nothing is lost: the messages go out with the next batch
+            logger.warning(
+                f"Mem0 store queue full ({self._store_queue.maxsize}), deferring "
+                f"{len(self._pending_ingest)} messages"
+            )
+            return
+        self._ensure_store_worker()
+        self._store_queue.put_nowait(self._take_pending())
+
+    def _take_pending(self) -> List[Dict[str, str]]:
+        batch, self._pending_ingest = self._pending_ingest, []
+        self._pending_turns = 0
+        return batch
+
+    def _ensure_store_worker(self):
+        if self._store_task is None or self._store_task.done():
+            self._store_task = asyncio.create_task(self._store_worker())
+
+    async def _store_worker(self):
+        while True:
+            item = await self._store_queue.get()
+            try:
+                if item is _FLUSH_AND_STOP:
+                    return
+                if await self._run_blocking(_mem0_store_executor, self._store_messages, item):
+                    self.metrics.stores += 1
+                    self.metrics.ingested_messages += len(item)
+                    self.metrics.ingested_tokens += sum(
+                        estimate_tokens(message["content"]) for message in item
+                    )
+                    if self._cache is not None:
+                        self._cache.invalidate(self._scope)
+                else:
+                    self.metrics.failed_stores += 1
+            finally:
+                self._store_queue.task_done()
+
+    @property
+    def _scope(self):
+        return (self.user_id, self.agent_id, self.run_id)
+
+    async def _retrieve_memories_async(self, query: str) -> List[Dict[str, Any]]:
+        """Retrieve memories on a worker thread within the latency budget.
+
+        Results are reused from the cache until they expire or memories are written.
+        """
+        key = (normalize_query(query), self.search_limit, self.search_threshold)
+        if self._cache is not None:
+            cached = self._cache.get_search(self._scope, key)
+            if cached is not None:
+                self.metrics.cached_retrievals += 1
+                return cached
+        self.metrics.retrievals += 1
+        try:
+            results = await asyncio.wait_for(
+                self._run_blocking(_mem0_search_executor, self._retrieve_memories, query),
+                self.retrieval_timeout_secs,
+            )
+            if self._cache is not None and results:
+                self._cache.put_search(self._scope, key, results)
+            return results
+        except asyncio.TimeoutError:
+            # The search keeps its worker thread until it finishes; only its result is dropped
+            self.metrics.retrieval_timeouts += 1
+            logger.warning(
+                f"Mem0 retrieval exceeded {self.retrieval_timeout_secs}s, continuing without memories"
+            )
+            return []
 
     def _retrieve_memories(self, query: str) -> List[Dict[str, Any]]:
         """Retrieve relevant memories from Mem0.
@@ -150,13 +357,14 @@ class Mem0MemoryService(FrameProcessor):
         """
         try:
             logger.debug(f"Retrieving memories for query: {query}")
-            if isinstance(self.memory_client, Memory):
+            if not isinstance(self.memory_client, MemoryClient):
                 params = {
                     "query": query,
                     "user_id": self.user_id,
                     "agent_id": self.agent_id,
                     "run_id": self.run_id,
                     "limit": self.search_limit,
+                    "threshold": self.search_threshold,
                 }
                 params = {k: v for k, v in params.items() if v is not None}
                 results = self.memory_client.search(**params)
@@ -183,7 +391,7 @@ class Mem0MemoryService(FrameProcessor):
             logger.error(f"Error retrieving memories from Mem0: {e}")
             return []
 
-    def _enhance_context_with_memories(self, context: OpenAILLMContext, query: str):
+    async def _enhance_context_with_memories(self, context: OpenAILLMContext, query: str):
         """Enhance the LLM context with relevant memories.
 
         Args:
@@ -196,22 +404,50 @@ class Mem0MemoryService(FrameProcessor):
 
         self.last_query = query
 
-        memories = self._retrieve_memories(query)
-        if not memories:
+        if is_trivial_query(query, min_chars=self.min_query_chars):
+            self.metrics.skipped_retrievals += 1
+            logger.debug(f"Skipping memory retrieval for trivial query: {query}")
             return
 
-        # Format memories as a message
-        memory_text = self.system_prompt
-        for i, memory in enumerate(memories["results"], 1):
-            memory_text += f"{i}. {memory.get('memory', '')}\n\n"
-
-        # Add memories as a system message or user message based on configuration
-        if self.add_as_system_message:
-            context.add_message({"role": "system", "content": memory_text})
-        else:
-            # Add as a user message that provides context
-            context.add_message({"role": "user", "content": memory_text})
-        logger.debug(f"Enhanced context with {len(memories)} memories")
+        memories = await self._retrieve_memories_async(query)
+        memory_text = self._format_memories(memories["results"] if memories else [])
+        # Memories found for an earlier query are replaced, or removed if none match now
+        self._set_memory_message(context, memory_text)
+
+    def _format_memories(self, results: List[Dict[str, Any]]) -> Optional[str]:
+        """Number the distinct memories, most relevant first, within the token budget."""
+        seen = set()
+        lines = []
+        tokens = estimate_tokens(self.system_prompt)
+        for memory in results:
+            text = (memory.get("memory") or "").strip()
+            key = normalize_query(text)
+            if not key or key in seen:
+                self.metrics.dropped_memories += 1
+                continue
+            line = f"{len(lines) + 1}. {text}\n\n"
+            if self.max_memory_tokens is not None and tokens + estimate_tokens(line) > self.max_memory_tokens:
+                self.metrics.dropped_memories += 1
+                continue
+            seen.add(key)
+            lines.append(line)
+            tokens += estimate_tokens(line)
+        if not lines:
+            return None
+        return self.system_prompt + "".join(lines)
+
+    def _set_memory_message(self, context: OpenAILLMContext, memory_text: Optional[str]):
+        """Put `memory_text` in the context's memory message, in place of the last one."""
+        messages = context.get_messages()
+        messages[:] = [message for message in messages if not isinstance(message, EphemeralMessage)]
+        if memory_text is None:
+            self.metrics.memory_tokens = 0
+            return
+        # Add memories as a system message or as a user message that provides context
+        role = "system" if self.add_as_system_message else "user"
+        messages.insert(self.position, EphemeralMessage(role=role, content=memory_text))
+        self.metrics.memory_tokens = estimate_tokens(memory_text)
+        logger.debug(f"Enhanced context with memories ({self.metrics.memory_tokens} tokens)")
 
     async def process_frame(self, frame: Frame, direction: FrameDirection):
         """Process incoming frames, intercept context frames for memory integration.
@@ -239,17 +475,14 @@ class Mem0MemoryService(FrameProcessor):
 
                 for message in reversed(context_messages):
                     if message.get("role") == "user":
-                        if isinstance(message.get("content"), str):
-                            latest_user_message = message.get("content")
-                        elif isinstance(message.get("content"), list):
-                            latest_user_message = message.get("content")[0].get("text")
+                        latest_user_message = _message_text(message)
                         break
                 logger.info(f"latest_user_message: {latest_user_message}")
                 if latest_user_message:
                     # Enhance context with memories before passing it downstream
-                    self._enhance_context_with_memories(context, latest_user_message)
-                    # Store the conversation in Mem0. Only call this when user message is detected
-                    self._store_messages(context_messages)
+                    await self._enhance_context_with_memories(context, latest_user_message)
+                    # Store the new part of the conversation in Mem0. Only call this when user message is detected
+                    self._ingest(context_messages)
 
                 # If we received an LLMMessagesFrame, create a new one with the enhanced messages
                 if messages is not None:
@@ -264,3 +497,33 @@ class Mem0MemoryService(FrameProcessor):
         else:
             # For non-context frames, just pass them through
             await self.push_frame(frame, direction)
+
+    async def cleanup(self):
+        """Send the rest of the conversation and write the stores still queued, within
+        `store_flush_timeout_secs`."""
+        await super().cleanup()
+        if self._last_messages is not None:
+            # Picks up what was added after the last user turn, e.g. the final reply
+            self._collect_new_messages(self._last_messages)
+        if self._pending_ingest:
+            self._ensure_store_worker()
+        if self._store_task is None or self._store_task.done():
+            return
+
+        async def flush():
+            if self._pending_ingest:
+                await self._store_queue.put(self._take_pending())
+            await self._store_queue.put(_FLUSH_AND_STOP)
+            await asyncio.shield(self._store_task)
+
+        try:
+            await asyncio.wait_for(flush(), self.store_flush_timeout_secs)
+        except asyncio.TimeoutError:
+            dropped = self._store_queue.qsize() + (1 if self._pending_ingest else 0)
+            self.metrics.dropped_stores += dropped
+            logger.warning(
+                f"Mem0 stores not written within {self.store_flush_timeout_secs}s, "
+                f"dropping {dropped}"
+            )
+            self._store_task.cancel()
+        logger.debug(f"Mem0MemoryService closed: {self.metrics.model_dump()}")
@@ -0,0 +1,55 @@
+"""Audio helpers for the MiniMax TTS services."""
+
+import binascii
+from typing import List
+
+
+class PCMChunker:
+    """Decodes hex-encoded PCM and cuts it into frames of a fixed duration.
+
+    MiniMax sends audio as one hex string per event, with event sizes unrelated to
+    what the output transport plays per tick. Each event is decoded with a single
+    `binascii.unhexlify` call and split on `frame_ms` boundaries; the tail that does
+    not fill a frame is carried over to the next event.
+    """
+
+    def __init__(
+        self, sample_rate: int, *, num_channels: int = 1, frame_ms: int = 20, sample_width: int = 2
+    ):
+        self._frame_bytes = max(1, sample_rate * frame_ms // 1000) * num_channels * sample_width
+        self._sample_bytes = num_channels * sample_width
+        self._remainder = b""
+
+    @property
+    def frame_bytes(self) -> int:
+        return self._frame_bytes
+
+    def feed_hex(self, hex_audio: str) -> List[bytes]:
+        """Decode one event's audio and return the complete frames it yields.
+
+        Args:
+            hex_audio: The hex string from the event.
+
+        Returns:
+            Frames of exactly `frame_bytes` each; possibly empty.
+
+        Raises:
+            ValueError: If `hex_audio` is not valid hex.
+        """
+        data = binascii.unhexlify(hex_audio)
+        if self._remainder:
+            data = self._remainder + data
+        size = self._frame_bytes
+        end = len(data) - len(data) % size
+        self._remainder = data[end:]
+        return [data[i : i + size] for i in range(0, end, size)]
+
+    def flush(self) -> bytes:
+        """Return the buffered tail, trimmed to whole samples, and reset."""
+        tail = self._remainder
+        self._remainder = b""
+        return tail[: len(tail) - len(tail) % self._sample_bytes]
+
+    def reset(self):
+        """Drop the buffered tail, e.g. after an interruption."""
+        self._remainder = b""
@@ -0,0 +1,125 @@
+"""Benchmark for the MiniMax HTTP TTS stream parser.
+
+Replays recorded `text/event-stream` response bodies through `SSEParser` and through
+the buffer-slicing loop `MiniMaxHttpTTSService.run_tts` used before, in fixed-size
+network chunks, and reports throughput and how many events were only emitted after
+data of the following event had been read.
+
+    python -m bots.minimax.bench_sse recorded_response.txt [more.txt ...]
+
+Without arguments a synthetic multi-megabyte response is generated.
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Callable, Iterator, List, Tuple
+
+from bots.minimax.sse import SSEParser
+
+
+def synthetic_response(events: int = 200, audio_bytes: int = 16000) -> bytes:
+    """Build a response shaped like MiniMax's: audio events, then a final extra_info."""
+    audio = os.urandom(audio_bytes).hex()
+    body = [
+        b"data: " + json.dumps({"data": {"audio": audio, "status": 1}}).encode() + b"\n\n"
+        for _ in range(events)
+    ]
+    body.append(b"data: " + json.dumps({"data": {"audio": ""}, "extra_info": {}}).encode() + b"\n\n")
+    return b"".join(body)
+
+
+def event_ends(body: bytes) -> List[int]:
+    ends = []
+    pos = body.find(b"\n\n")
+    while pos != -1:
+        ends.append(pos + 2)
+        pos = body.find(b"\n\n", pos + 2)
+    return ends
+
+
+def iter_chunks(body: bytes, chunk_size: int) -> Iterator[bytes]:
+    """Split like the network would: the server flushes each event, so reads never span two."""
+    start = 0
+    for end in event_ends(body) + [len(body)]:
+        for i in range(start, end, chunk_size):
+            yield body[i : min(i + chunk_size, end)]
+        start = end
+
+
+def parse_legacy(chunks: Iterator[bytes], on_event: Callable[[bytes], None]):
+    """The previous loop: waits for the next `data:` and re-slices the buffer per event."""
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer.extend(chunk)
+        while b"data:" in buffer:
+            start = buffer.find(b"data:")
+            next_start = buffer.find(b"data:", start + 5)
+            if next_start == -1:
+                if start > 0:
+                    buffer = buffer[start:]
+                break
+            data_block = buffer[start:next_start]
+            buffer = buffer[next_start:]
+            on_event(bytes(data_block[5:]))
+
+
+def parse_incremental(chunks: Iterator[bytes], on_event: Callable[[bytes], None]):
+    parser = SSEParser()
+    for chunk in chunks:
+        for event in parser.feed(chunk):
+            on_event(event)
+    for event in parser.close():
+        on_event(event)
+
+
+def run(parse, body: bytes, chunk_size: int) -> Tuple[float, int, int]:
+    """Returns (seconds, events, events only emitted once bytes of the next event arrived)."""
+    ends = event_ends(body)
+
+    read = 0
+    held = 0
+    emitted = 0
+
+    def chunks():
+        nonlocal read
+        for chunk in iter_chunks(body, chunk_size):
+            read += len(chunk)
+            yield chunk
+
+    def on_event(_event: bytes):
+        nonlocal held, emitted
+        # Live, those bytes arrive only once the server has synthesized the next chunk
+        if emitted < len(ends) and read > ends[emitted]:
+            held += 1
+        emitted += 1
+
+    start = time.perf_counter()
+    parse(chunks(), on_event)
+    elapsed = time.perf_counter() - start
+    return elapsed, emitted, held
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*", help="Recorded SSE response bodies")
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    bodies = [(path, open(path, "rb").read()) for path in args.files]
+    if not bodies:
+        bodies = [("synthetic", synthetic_response())]
+
+    for name, body in bodies:
+        print(f"{name}: {len(body) / 1e6:.1f} MB in {args.chunk_size}-byte chunks")
+        for label, parse in (("legacy", parse_legacy), ("incremental", parse_incremental)):
+            elapsed, events, held = run(parse, body, args.chunk_size)
+            print(
+                f"  {label:<12} {elapsed * 1000:8.1f} ms  {len(body) / 1e6 / elapsed:8.1f} MB/s  "
+                f"{events} events, {held} held back until the next one"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Incremental parser for Server-Sent Events streams.
+
+MiniMax's streaming HTTP API answers with `text/event-stream`, where every event is
+one or more `data:` lines terminated by a blank line. Audio events carry a large
+hex string, so a single event can span many network chunks.
+"""
+
+from typing import List
+
+
+class SSEParser:
+    """Turns raw SSE bytes into event payloads as soon as each event is complete.
+
+    Bytes are appended to one buffer and consumed through an offset cursor. Lines are
+    sliced from a memoryview, so only the `data:` value of a finished event is copied.
+    The scan position is remembered between `feed` calls, so a long line arriving in
+    many small chunks is searched once rather than once per chunk.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        # Start of the first line that has not been consumed yet
+        self._pos = 0
+        # Everything between `_pos` and `_scan` is known not to contain a newline
+        self._scan = 0
+        self._data: List[bytes] = []
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """Add `chunk` to the stream.
+
+        Args:
+            chunk: The next bytes read from the response body.
+
+        Returns:
+            The `data` payloads of every event completed by this chunk, in order.
+        """
+        self._buffer.extend(chunk)
+        events = []
+        with memoryview(self._buffer) as view:
+            while True:
+                end = self._buffer.find(b"\n", self._scan)
+                if end == -1:
+                    self._scan = len(self._buffer)
+                    break
+                line_end = end - 1 if end > self._pos and view[end - 1] == 0x0D else end
+                self._take_line(view[self._pos : line_end], events)
+                self._pos = self._scan = end + 1
+
+        # Dropping the consumed prefix of a bytearray is cheap: CPython just moves the
+        # start of the buffer instead of copying what is left.
+        if self._pos:
+            del self._buffer[: self._pos]
+            self._scan -= self._pos
+            self._pos = 0
+        return events
+
+    def close(self) -> List[bytes]:
+        """Flush an event whose terminating blank line never arrived."""
+        events = []
+        if self._buffer:
+            with memoryview(self._buffer) as view:
+                self._take_line(view[self._pos :], events)
+            self._buffer.clear()
+            self._pos = self._scan = 0
+        self._take_line(b"", events)
+        return events
+
+    def _take_line(self, line, events: List[bytes]):
+        if not line:
+            # Blank line: dispatch the event collected so far
+            if self._data:
+                events.append(self._data[0] if len(self._data) == 1 else b"\n".join(self._data))
+                self._data = []
+            return
+        if line[:5] != b"data:":
+            # Comments (":") and the event/id/retry fields are not used by MiniMax
+            return
+        start = 6 if line[5:6] == b" " else 5
+        self._data.append(bytes(line[start:]))
@@ -11,7 +11,8 @@ for streaming text-to-speech synthesis.
 """
 
 import json
-from typing import AsyncGenerator, Optional
+from collections import OrderedDict, deque
+from typing import AsyncGenerator, Deque, List, Optional, Tuple
 
 import aiohttp
 from loguru import logger
@@ -43,6 +44,9 @@ from pipecat.services.tts_service import (
 from pipecat.transcriptions.language import Language
 from pipecat.utils.tracing.service_decorators import traced_tts
 
+from bots.minimax.audio import PCMChunker
+from bots.minimax.sse import SSEParser
+
 import ssl
 import websockets
 from io import BytesIO
@@ -142,6 +146,7 @@ class MiniMaxHttpTTSService(TTSService):
         voice_id: str = "Calm_Woman",
         aiohttp_session: Optional[aiohttp.ClientSession] = None,
         sample_rate: Optional[int] = None,
+        audio_frame_ms: int = 20,
         params: Optional[InputParams] = None,
         **kwargs,
     ):
@@ -155,6 +160,8 @@ class MiniMaxHttpTTSService(TTSService):
             voice_id: Voice identifier. Defaults to "Calm_Woman".
             aiohttp_session: aiohttp.ClientSession for API communication. If None, a new session will be created.
             sample_rate: Output audio sample rate in Hz. If None, uses pipeline default.
+            audio_frame_ms: Duration of each audio frame pushed downstream, in milliseconds.
+                Should match the output transport's chunk size (typically 10 or 20).
             params: Additional configuration parameters.
             **kwargs: Additional arguments passed to parent TTSService.
         """
@@ -172,6 +179,7 @@ class MiniMaxHttpTTSService(TTSService):
             self._session = aiohttp_session
         self._model_name = model
         self._voice_id = voice_id
+        self._audio_frame_ms = audio_frame_ms
 
         # Create voice settings
         self._settings = {
@@ -278,6 +286,52 @@ class MiniMaxHttpTTSService(TTSService):
             return emotion, clean_text
         return None, text
 
+    async def _handle_sse_event(self, event: bytes, chunker: PCMChunker) -> AsyncGenerator[Frame, None]:
+        """Turn one `data:` payload of the streaming response into audio frames.
+
+        Args:
+            event: The JSON payload of a single server-sent event.
+            chunker: Decoder that carries partial frames over between events.
+
+        Yields:
+            Frame: Audio frames decoded from the event.
+        """
+        try:
+            data = json.loads(event)
+        except json.JSONDecodeError as e:
+            logger.error(f"Error decoding JSON: {e}, data: {event[:100]}")
+            return
+
+        # Skip data blocks containing extra_info
+        if "extra_info" in data:
+            logger.debug("Received final chunk with extra info")
+            return
+
+        chunk_data = data.get("data", {})
+        if not chunk_data:
+            return
+
+        audio_data = chunk_data.get("audio")
+        if not audio_data:
+            return
+
+        try:
+            frames = chunker.feed_hex(audio_data)
+        except ValueError as e:
+            logger.error(f"Error converting hex to binary: {e}")
+            return
+
+        for audio_chunk in frames:
+            await self.stop_ttfb_metrics()
+            yield self._audio_frame(audio_chunk)
+
+    def _audio_frame(self, audio: bytes) -> TTSAudioRawFrame:
+        return TTSAudioRawFrame(
+            audio=audio,
+            sample_rate=self._settings["audio_setting"]["sample_rate"],
+            num_channels=self._settings["audio_setting"]["channel"],
+        )
+
     @traced_tts
     async def run_tts(self, text: str) -> AsyncGenerator[Frame, None]:
         """Generate TTS audio from text using MiniMax's streaming API.
@@ -294,13 +348,12 @@ class MiniMaxHttpTTSService(TTSService):
         emotion, clean_text = self.extract_emotion_from_text(text)
         if emotion:
             # 只在检测到标签时临时覆盖
-            self._settings["voice_setting"]["emotion"] = emotion
             text = clean_text
             await self.push_frame(TransportMessageUrgentFrame(message={'label': 'rtvi-ai', 'type': 'server-message', 'data': {'emotion': emotion}}))
             await self.push_frame(TTSUpdateSettingsFrame(settings={"emotion": [emotion]}))
         else:
             # 恢复为params中的默认值
-            self._settings["voice_setting"]["emotion"] = getattr(self._params, "emotion", "neutral") or "neutral"
+            emotion = getattr(self._params, "emotion", "neutral") or "neutral"
 
         headers = {
             "accept": "application/json, text/plain, */*",
@@ -308,10 +361,14 @@ class MiniMaxHttpTTSService(TTSService):
             "Authorization": f"Bearer {self._api_key}",
         }
 
-        # Create payload from settings
-        payload = self._settings.copy()
-        payload["model"] = self._model_name
-        payload["text"] = text
+        # Create payload from settings; the emotion only applies to this request, so it
+        # goes into a per-request voice_setting instead of the shared settings
+        payload = {
+            **self._settings,
+            "voice_setting": {**self._settings["voice_setting"], "emotion": emotion},
+            "model": self._model_name,
+            "text": text,
+        }
 
         try:
             await self.start_ttfb_metrics()
@@ -329,71 +386,27 @@ class MiniMaxHttpTTSService(TTSService):
                 yield TTSStartedFrame()
 
                 # Process the streaming response
-                buffer = bytearray()
-                CHUNK_SIZE = 1024
-
-                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                parser = SSEParser()
+                chunker = PCMChunker(
+                    self._settings["audio_setting"]["sample_rate"],
+                    num_channels=self._settings["audio_setting"]["channel"],
+                    frame_ms=self._audio_frame_ms,
+                )
+
+                async for chunk in response.content.iter_any():
                     if not chunk:
                         continue
+                    for event in parser.feed(chunk):
+                        async for frame in self._handle_sse_event(event, chunker):
+                            yield frame
 
-                    buffer.extend(chunk)
-
-                    # Find complete data blocks
-                    while b"data:" in buffer:
-                        start = buffer.find(b"data:")
-                        next_start = buffer.find(b"data:", start + 5)
+                for event in parser.close():
+                    async for frame in self._handle_sse_event(event, chunker):
+                        yield frame
 
-                        if next_start == -1:
-                            # No next data block found, keep current data for next iteration
-                            if start > 0:
-                                buffer = buffer[start:]
-                            break
-
-                        # Extract a complete data block
-                        data_block = buffer[start:next_start]
-                        buffer = buffer[next_start:]
-
-                        try:
-                            data = json.loads(data_block[5:].decode("utf-8"))
-                            # Skip data blocks containing extra_info
-                            if "extra_info" in data:
-                                logger.debug("Received final chunk with extra info")
-                                continue
-
-                            chunk_data = data.get("data", {})
-                            if not chunk_data:
-                                continue
-
-                            audio_data = chunk_data.get("audio")
-                            if not audio_data:
-                                continue
-
-                            # Process audio data in chunks
-                            for i in range(0, len(audio_data), CHUNK_SIZE * 2):  # *2 for hex string
-                                # Split hex string
-                                hex_chunk = audio_data[i : i + CHUNK_SIZE * 2]
-                                if not hex_chunk:
-                                    continue
-
-                                try:
-                                    # Convert this chunk of data
-                                    audio_chunk = bytes.fromhex(hex_chunk)
-                                    if audio_chunk:
-                                        await self.stop_ttfb_metrics()
-                                        yield TTSAudioRawFrame(
-                                            audio=audio_chunk,
-                                            sample_rate=self._settings["audio_setting"][
-                                                "sample_rate"
-                                            ],
-                                            num_channels=self._settings["audio_setting"]["channel"],
-                                        )
-                                except ValueError as e:
-                                    logger.error(f"Error converting hex to binary: {e}")
-                                    continue
-
-                        except json.JSONDecodeError as e:
-                            logger.error(f"Error decoding JSON: {e}, data: {data_block[:100]}")
-                            continue
+                tail = chunker.flush()
+                if tail:
+                    yield self._audio_frame(tail)
 
         
         except Exception as e:
@@ -404,8 +417,49 @@ class MiniMaxHttpTTSService(TTSService):
             yield TTSStoppedFrame()
 
 
+class _MiniMaxSession:
+    """A MiniMax WebSocket with a started task.
+
+    Voice settings are fixed by `task_start`, so each combination of settings needs
+    its own session.
+    """
+
+    def __init__(self, key: tuple, websocket):
+        self.key = key
+        self.websocket = websocket
+        # Non-pipelined mode: a request was sent and its is_final has not been read yet
+        self.in_flight = False
+        # Pipelined mode: requests sent but not yet answered with is_final, oldest first
+        self.pending: Deque[Tuple[asyncio.Queue, PCMChunker]] = deque()
+        self.receive_task = None
+
+    @property
+    def open(self) -> bool:
+        return self.websocket is not None and not self.websocket.closed
+
+    def abort_pending(self):
+        """End every request still waiting for audio; their queues get no more frames."""
+        while self.pending:
+            queue, _ = self.pending.popleft()
+            queue.put_nowait(None)
+
+
 class MiniMaxTTSService(WordTTSService):
-    """基于 MiniMax WebSocket 的 TTS 服务实现，支持连接复用，风格对齐 ElevenLabsTTSService。"""
+    """基于 MiniMax WebSocket 的 TTS 服务实现，支持连接复用，风格对齐 ElevenLabsTTSService。
+
+    Voice settings, including the emotion picked by `[emotion]` tags, can only be set
+    by `task_start`. Instead of reconnecting whenever they change, the service keeps a
+    small pool of started sessions keyed by settings: the default one and any in
+    `prewarm_emotions` are opened on start, others are opened on first use and kept
+    for reuse, evicting the least recently used beyond `max_sessions`.
+
+    With `pipelined=True`, `run_tts` only sends the text and returns, so the next
+    sentence is sent while audio for the previous one is still streaming. MiniMax
+    answers `task_continue` requests in order, each ending with `is_final`, so a
+    receive task per session routes incoming audio to the oldest unfinished request's
+    queue and a playback task pushes the queues downstream one request at a time. An
+    interruption drops the sessions that still owe audio and everything queued.
+    """
     class InputParams(MiniMaxHttpTTSService.InputParams):
         pass
 
@@ -417,11 +471,20 @@ class MiniMaxTTSService(WordTTSService):
         model: str = "speech-02-turbo",
         voice_id: str = "Calm_Woman",
         sample_rate: int = 32000,
+        audio_frame_ms: int = 20,
+        pipelined: bool = False,
+        max_sessions: int = 3,
+        prewarm_emotions: Optional[List[str]] = None,
         params: Optional[MiniMaxHttpTTSService.InputParams] = None,
         **kwargs,
     ):
         super().__init__(sample_rate=sample_rate, **kwargs)
         params = params or MiniMaxTTSService.InputParams()
+        self._audio_frame_ms = audio_frame_ms
+        self._pipelined = pipelined
+        self._prewarm_emotions = prewarm_emotions or []
+        # Pre-warmed sessions must not evict each other
+        self._max_sessions = max(max_sessions, 1 + len(self._prewarm_emotions))
         self._api_key = api_key
         self._group_id = group_id
         self._model_name = model
@@ -434,7 +497,6 @@ class MiniMaxTTSService(WordTTSService):
                 "speed": params.speed,
                 "vol": params.volume,
                 "pitch": params.pitch,
-                "emotion": params.emotion or "neutral",
             },
             "audio_setting": {
                 "sample_rate": sample_rate,
@@ -449,20 +511,23 @@ class MiniMaxTTSService(WordTTSService):
                 self._settings["language_boost"] = lang
         if params.english_normalization is not None:
             self._settings["english_normalization"] = params.english_normalization
-        self._websocket = None
         self._ssl_context = ssl.create_default_context()
         self._ssl_context.check_hostname = False
         self._ssl_context.verify_mode = ssl.CERT_NONE
         self._url = "wss://api.minimaxi.com/ws/v1/t2a_v2"
         self._lock = asyncio.Lock()  # 保证串行
-        self._current_settings = (model, voice_id, sample_rate, json.dumps(self._settings, sort_keys=True))
+        # Bumped whenever the shared settings change; sessions keyed by an older
+        # version are closed once they have no audio left to deliver
+        self._settings_version = 0
+        self._sessions: "OrderedDict[tuple, _MiniMaxSession]" = OrderedDict()
 
-        self._started = False  # 标记是否已发送 task_start
-        self._context_id = None
         self._request_id = 0
-        # self._receive_task = None
         self._keepalive_task = None
 
+        # Pipelined mode: per-request frame queues in playback order
+        self._playback_queue: asyncio.Queue = asyncio.Queue()
+        self._playback_task = None
+
     def language_to_service_language(self, language: Language) -> Optional[str]:
         return language_to_minimax_language(language)
 
@@ -471,118 +536,146 @@ class MiniMaxTTSService(WordTTSService):
 
     def set_model_name(self, model: str):
         self._model_name = model
+        self._settings_version += 1
+
+    def set_voice(self, voice: str):
+        self._voice_id = voice
+        self._settings["voice_setting"]["voice_id"] = voice
+        self._settings_version += 1
+
+    async def _update_settings(self, settings):
+        await super()._update_settings(settings)
+        self._settings_version += 1
 
     async def start(self, frame: StartFrame):
         await super().start(frame)
         await self._connect()
+        if self._pipelined:
+            self._playback_task = self.create_task(self._playback_task_handler())
 
     async def stop(self, frame: EndFrame):
         await super().stop(frame)
+        if self._pipelined:
+            # Let queued audio play out before the EndFrame goes downstream
+            await self._playback_queue.join()
+            await self._stop_playback()
         await self._disconnect()
 
     async def cancel(self, frame: CancelFrame):
         await super().cancel(frame)
+        await self._stop_playback()
         await self._disconnect()
 
     async def flush_audio(self):
         pass
 
-    async def push_frame(self, frame: Frame, direction: FrameDirection = FrameDirection.DOWNSTREAM):
-        await super().push_frame(frame, direction)
-        if isinstance(frame, (TTSStoppedFrame, StartInterruptionFrame)):
-            self._started = False
-
     async def _disconnect(self):
-        # if self._receive_task:
-        #     await self.cancel_task(self._receive_task)
-        #     self._receive_task = None
-
         if self._keepalive_task:
             await self.cancel_task(self._keepalive_task)
             self._keepalive_task = None
 
-        await self._disconnect_websocket()
+        for session in list(self._sessions.values()):
+            await self._close_session(session)
 
     async def _connect(self):
-        await self._connect_websocket()
-
-        # if self._websocket and not self._receive_task:
-        #     self._receive_task = self.create_task(self._receive_task_handler(self._report_error))
+        emotions = [self._default_emotion()] + self._prewarm_emotions
+        results = await asyncio.gather(
+            *(self._get_session(emotion) for emotion in dict.fromkeys(emotions)),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"MiniMaxTTSService: 预热连接失败: {result}")
 
-        if self._websocket and not self._keepalive_task:
+        if self._sessions and not self._keepalive_task:
             self._keepalive_task = self.create_task(self._keepalive_task_handler())
 
-    def set_voice(self, voice: str):
-        self._voice_id = voice
-        self._settings["voice_setting"]["voice_id"] = voice
+    def _default_emotion(self) -> str:
+        return getattr(self._params, "emotion", "neutral") or "neutral"
+
+    def _session_key(self, emotion: str) -> tuple:
+        return (self._settings_version, emotion)
 
-    async def _connect_websocket(self):
+    def _task_start_message(self, emotion: str) -> dict:
+        return {
+            "event": "task_start",
+            "model": self._model_name,
+            **self._settings,
+            "voice_setting": {**self._settings["voice_setting"], "emotion": emotion},
+        }
+
+    async def _start_websocket(self, start_msg: dict):
         """建立连接，先等待 connected_success，再发送一次 task_start"""
         headers = {"Authorization": f"Bearer {self._api_key}"}
-        self._websocket = await websockets.connect(
+        websocket = await websockets.connect(
             self._url, extra_headers=headers, ssl=self._ssl_context
         )
         # 先收到 connected_success
-        response = json.loads(await self._websocket.recv())
+        response = json.loads(await websocket.recv())
         if response.get("event") != "connected_success":
-            await self._websocket.close()
-            self._websocket = None
-            self._started = False
+            await websocket.close()
             raise Exception(f"MiniMaxTTSService: 连接失败: {response}")
-        self._context_id = response.get("session_id")
+        logger.debug(f"MiniMaxTTSService: 连接成功, session_id: {response.get('session_id')}")
         # 再发送 task_start
-        start_msg = {
-            "event": "task_start",
-            "model": self._model_name,
-            **self._settings,
-        }
-        await self._websocket.send(json.dumps(start_msg))
-        response = json.loads(await self._websocket.recv())
+        await websocket.send(json.dumps(start_msg))
+        response = json.loads(await websocket.recv())
         if response.get("event") != "task_started":
-            await self._websocket.close()
-            self._websocket = None
-            self._started = False
+            await websocket.close()
             raise Exception(f"MiniMaxTTSService: 任务启动失败: {response}")
-        self._started = True
-        # await self.create_audio_context(self._context_id)
-        self._current_settings = (
-            self._model_name,
-            self._voice_id,
-            self._sample_rate,
-            json.dumps(self._settings, sort_keys=True),
-        )
-        logger.debug(f"MiniMaxTTSService: 连接成功, context_id: {self._context_id}")
-
-    async def _disconnect_websocket(self):
+        return websocket
+
+    async def _open_session(self, key: tuple, emotion: str) -> _MiniMaxSession:
+        start_msg = self._task_start_message(emotion)
+        websocket = await self._start_websocket(start_msg)
+        session = _MiniMaxSession(key, websocket)
+        if self._pipelined:
+            session.receive_task = self.create_task(self._receive_task_handler(session))
+        return session
+
+    async def _close_session(self, session: _MiniMaxSession):
+        if self._sessions.get(session.key) is session:
+            del self._sessions[session.key]
+        if session.receive_task:
+            await self.cancel_task(session.receive_task)
+            session.receive_task = None
+        session.abort_pending()
         try:
-            if self._websocket:
+            if session.open:
                 try:
-                    await self._websocket.send(json.dumps({"event": "task_finish"}))
+                    await session.websocket.send(json.dumps({"event": "task_finish"}))
                 except Exception:
                     pass
-                await self._websocket.close()
+                await session.websocket.close()
         except Exception as e:
             logger.warning(f"MiniMaxTTSService: 关闭连接异常: {e}")
-        finally:
-            self._websocket = None
-            self._started = False
-
-    async def _ensure_connection(self):
-        # 检查参数是否变更，变更则重连
-        settings_tuple = (
-            self._model_name,
-            self._voice_id,
-            self._sample_rate,
-            json.dumps(self._settings, sort_keys=True),
-        )
-        if (
-            not self._websocket
-            or self._websocket.closed
-            or not self._started
-            or settings_tuple != self._current_settings
-        ):
-            await self._disconnect_websocket()
-            await self._connect_websocket()
+
+    async def _get_session(self, emotion: str) -> _MiniMaxSession:
+        """Return a started session for the current settings and `emotion`."""
+        key = self._session_key(emotion)
+        session = self._sessions.get(key)
+        # A non-pipelined request that was abandoned mid-stream leaves its audio unread
+        if session and session.open and not session.in_flight:
+            self._sessions.move_to_end(key)
+            return session
+        if session:
+            await self._close_session(session)
+
+        session = await self._open_session(key, emotion)
+        self._sessions[key] = session
+        await self._evict_sessions()
+        return session
+
+    async def _evict_sessions(self):
+        current = self._settings_version
+        for session in list(self._sessions.values()):
+            if session.key[0] != current and not session.pending:
+                await self._close_session(session)
+        # Least recently used first; sessions still owed audio are kept until drained
+        for session in list(self._sessions.values()):
+            if len(self._sessions) <= self._max_sessions:
+                break
+            if not session.pending:
+                await self._close_session(session)
 
     def split_sentences(self, text: str):
         """
@@ -597,38 +690,129 @@ class MiniMaxTTSService(WordTTSService):
     def _reset_state(self):
         """Reset internal state variables."""
         self._cumulative_time = 0
-        self._started = False
         self._previous_text = ""
         logger.debug(f"{self}: Reset internal state")
 
     async def _handle_interruption(self, frame: StartInterruptionFrame, direction: FrameDirection):
         await super()._handle_interruption(frame, direction)
-        # Close the current context when interrupted without closing the websocket
-        if self._context_id and self._websocket:
-            logger.trace(f"Closing context {self._context_id} due to interruption")
-            try:
-               # TODO
-               self._request_id += 1  # 递增，标记新一轮请求
-            except Exception as e:
-                logger.error(f"Error closing context on interruption: {e}")
-            # self._context_id = None
-            # self._started = False
+        if self._pipelined:
+            # Stop playback first so nothing queued is pushed after the interruption,
+            # then drop the sessions still synthesizing what was sent ahead. Idle
+            # sessions stay warm.
+            await self._stop_playback()
+            for session in list(self._sessions.values()):
+                if session.pending:
+                    await self._close_session(session)
+            self._playback_task = self.create_task(self._playback_task_handler())
+            return
+        # 递增，标记新一轮请求；未读完的会话在下次使用时重连
+        self._request_id += 1
 
     async def _receive_messages(self):
         pass
 
+    async def _stop_playback(self):
+        if self._playback_task:
+            await self.cancel_task(self._playback_task)
+            self._playback_task = None
+        while not self._playback_queue.empty():
+            self._playback_queue.get_nowait()
+            self._playback_queue.task_done()
+
+    async def _receive_task_handler(self, session: _MiniMaxSession):
+        """Route audio from `session` to the oldest request that is still streaming."""
+        try:
+            async for message in session.websocket:
+                resp = json.loads(message)
+                if not session.pending:
+                    # Keepalive replies, or late audio for a request that was aborted
+                    continue
+                queue, chunker = session.pending[0]
+                if resp.get("event") == "task_failed":
+                    queue.put_nowait(ErrorFrame(error=f"MiniMaxTTSService: {resp}"))
+                    break
+                if "data" in resp and "audio" in resp["data"]:
+                    try:
+                        for audio_bytes in chunker.feed_hex(resp["data"]["audio"]):
+                            queue.put_nowait(
+                                TTSAudioRawFrame(audio=audio_bytes, sample_rate=self._sample_rate, num_channels=1)
+                            )
+                    except ValueError as e:
+                        logger.error(f"MiniMaxTTSService: 音频解码失败: {e}")
+                if resp.get("is_final"):
+                    tail = chunker.flush()
+                    if tail:
+                        queue.put_nowait(
+                            TTSAudioRawFrame(audio=tail, sample_rate=self._sample_rate, num_channels=1)
+                        )
+                    queue.put_nowait(None)
+                    session.pending.popleft()
+        except websockets.ConnectionClosed as e:
+            logger.warning(f"{self} connection closed: {e}")
+        # The connection ended or the task failed (cancellation skips this and leaves
+        # the connection to _close_session): whatever is still owed will never arrive
+        session.abort_pending()
+        if self._sessions.get(session.key) is session:
+            del self._sessions[session.key]
+        if session.open:
+            await session.websocket.close()
+
+    async def _playback_task_handler(self):
+        """Push each request's frames downstream, in the order the requests were sent."""
+        while True:
+            queue = await self._playback_queue.get()
+            try:
+                await self.push_frame(TTSStartedFrame())
+                while (frame := await queue.get()) is not None:
+                    if isinstance(frame, ErrorFrame):
+                        await self.push_error(frame)
+                        continue
+                    await self.stop_ttfb_metrics()
+                    await self.push_frame(frame)
+                await self.push_frame(TTSStoppedFrame())
+            finally:
+                self._playback_queue.task_done()
+
+    async def _run_tts_pipelined(self, text: str) -> AsyncGenerator[Frame, None]:
+        queue: asyncio.Queue = asyncio.Queue()
+        session = None
+        async with self._lock:
+            try:
+                emotion, clean_text = self.extract_emotion_from_text(text)
+                if emotion:
+                    text = clean_text
+                    # Queued with the audio so the client sees it when this sentence plays
+                    queue.put_nowait(TransportMessageUrgentFrame(message={'label': 'rtvi-ai', 'type': 'server-message', 'data': {'emotion': emotion}}))
+                    queue.put_nowait(TTSUpdateSettingsFrame(settings={"emotion": [emotion]}))
+                else:
+                    emotion = self._default_emotion()
+                session = await self._get_session(emotion)
+                await self.start_ttfb_metrics()
+                await self.start_tts_usage_metrics(text)
+                session.pending.append((queue, PCMChunker(self._sample_rate, frame_ms=self._audio_frame_ms)))
+                await self._playback_queue.put(queue)
+                await session.websocket.send(json.dumps({"event": "task_continue", "text": text}))
+            except Exception as e:
+                logger.exception(f"MiniMaxTTSService: 生成 TTS 失败: {e}")
+                # The session is unusable; release this and any earlier request on it
+                if session:
+                    await self._close_session(session)
+                yield ErrorFrame(error=f"MiniMaxTTSService: {str(e)}")
+                return
+        yield None
+
     async def _keepalive_task_handler(self):
 
         while True:
             await asyncio.sleep(10)
-            try:
-                # Send an empty message to keep the connection alive
-                if self._websocket and self._websocket.open:
-                    await self._websocket.send(json.dumps({}))
-            except websockets.ConnectionClosed as e:
-                logger.warning(f"{self} keepalive error: {e}")
-                break 
-   
+            for session in list(self._sessions.values()):
+                try:
+                    # Send an empty message to keep the connection alive
+                    if session.open:
+                        await session.websocket.send(json.dumps({}))
+                except websockets.ConnectionClosed as e:
+                    logger.warning(f"{self} keepalive error: {e}")
+                    await self._close_session(session)
 
     def extract_emotion_from_text(self, text: str) -> (str, str):
         """
@@ -643,46 +827,61 @@ class MiniMaxTTSService(WordTTSService):
         
     @traced_tts
     async def run_tts(self, text: str) -> AsyncGenerator[Frame, None]:
+        if self._pipelined:
+            async for frame in self._run_tts_pipelined(text):
+                yield frame
+            return
         async with self._lock:
+            session = None
             try:
                 self._request_id += 1
-                current_id = self._request_id   
-                await self._ensure_connection()
+                current_id = self._request_id
                 emotion, clean_text = self.extract_emotion_from_text(text)
                 if emotion:
-                    # 只在检测到标签时临时覆盖
-                    self._settings["voice_setting"]["emotion"] = emotion
+                    # 只在检测到标签时使用对应情感的会话
                     text = clean_text
                     await self.push_frame(TransportMessageUrgentFrame(message={'label': 'rtvi-ai', 'type': 'server-message', 'data': {'emotion': emotion}}))
                     await self.push_frame(TTSUpdateSettingsFrame(settings={"emotion": [emotion]}))
                 else:
                     # 恢复为params中的默认值
-                    self._settings["voice_setting"]["emotion"] = getattr(self._params, "emotion", "neutral") or "neutral"
+                    emotion = self._default_emotion()
+                session = await self._get_session(emotion)
                 await self.start_ttfb_metrics()
                 await self.start_tts_usage_metrics(text)
                 yield TTSStartedFrame()
-                await self._websocket.send(json.dumps({"event": "task_continue", "text": text}))
+                await session.websocket.send(json.dumps({"event": "task_continue", "text": text}))
+                session.in_flight = True
+                chunker = PCMChunker(self._sample_rate, frame_ms=self._audio_frame_ms)
                 while True:
-                    resp = json.loads(await self._websocket.recv())
+                    resp = json.loads(await session.websocket.recv())
                     if current_id != self._request_id:
+                        # 被打断，丢弃未播放的尾部
+                        chunker.reset()
                         break
                     if "data" in resp and "audio" in resp["data"]:
-                        audio_hex = resp["data"]["audio"]
                         try:
-                            audio_bytes = bytes.fromhex(audio_hex)
+                            frames = chunker.feed_hex(resp["data"]["audio"])
+                        except ValueError as e:
+                            logger.error(f"MiniMaxTTSService: 音频解码失败: {e}")
+                            frames = []
+                        for audio_bytes in frames:
                             await self.stop_ttfb_metrics()
                             yield TTSAudioRawFrame(
                                 audio=audio_bytes,
                                 sample_rate=self._sample_rate,
                                 num_channels=1,
                             )
-                        except Exception as e:
-                            logger.error(f"MiniMaxTTSService: 音频解码失败: {e}")
                     if resp.get("is_final"):
+                        session.in_flight = False
                         break
+                tail = chunker.flush()
+                if tail:
+                    yield TTSAudioRawFrame(audio=tail, sample_rate=self._sample_rate, num_channels=1)
             except Exception as e:
                 logger.exception(f"MiniMaxTTSService: 生成 TTS 失败: {e}")
+                if session:
+                    await self._close_session(session)
                 yield ErrorFrame(error=f"MiniMaxTTSService: {str(e)}")
             finally:
                 await self.stop_ttfb_metrics()
-                yield TTSStoppedFrame()
\ No newline at end of file
+                yield TTSStoppedFrame()
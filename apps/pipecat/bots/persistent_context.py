@@ -1,14 +1,31 @@
 import asyncio
+import time
 from typing import Any, Callable, Coroutine, List, Optional
 
 from loguru import logger
 from pydantic import BaseModel
 
-from pipecat.frames.frames import EndFrame, Frame, TransportMessageUrgentFrame
+from pipecat.frames.frames import CancelFrame, EndFrame, Frame, TransportMessageUrgentFrame
 from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
 from pipecat.processors.aggregators.openai_llm_context import OpenAILLMContext, OpenAILLMContextFrame
 
 
+class EphemeralMessage(dict):
+    """A context message meant for the next LLM calls only.
+
+    Processors that inject derived content, such as retrieved memories, use it so the
+    content can be replaced turn after turn. `PersistentContext` never stores it.
+    """
+
+
+def _persistent_messages(context: OpenAILLMContext) -> List[Any]:
+    return [
+        message
+        for message in context.get_messages_for_persistent_storage()
+        if not isinstance(message, EphemeralMessage)
+    ]
+
+
 class RTVIItemStoredMessageData(BaseModel):
     # action: Literal["append", "replace"]
     items: List[Any]
@@ -46,7 +63,8 @@ class PersistentContextProcessor(FrameProcessor):
             id, items = await self._storage.save(frame.context)
             if items is not None:
                 await self._push_transport_save_message(id, items)
-        elif isinstance(frame, EndFrame):
+        elif isinstance(frame, (EndFrame, CancelFrame)):
+            # A cancelled session still writes the turns the worker is holding
             await self._call_event_handler("endframe")
 
         await self.push_frame(frame, direction)
@@ -60,12 +78,49 @@ class PersistentContextProcessor(FrameProcessor):
         await self.push_frame(frame, self._push_transport_message_direction)
 
 
+class PersistentContextMetrics(BaseModel):
+    enqueued_slices: int = 0
+    flushed_batches: int = 0
+    flushed_messages: int = 0
+    failed_batches: int = 0
+    max_queue_depth: int = 0
+    backpressure_waits: int = 0
+    backpressure_wait_secs: float = 0.0
+
+
+# Queued by close() so the worker flushes whatever it holds and exits.
+_FLUSH_AND_STOP = object()
+
+
 class PersistentContext:
-    def __init__(self, *, context: OpenAILLMContext):
+    def __init__(
+        self,
+        *,
+        context: OpenAILLMContext,
+        batch_window_secs: float = 0.0,
+        batch_max_items: int = 1,
+        max_queue_size: int = 0,
+    ):
+        """Queue appended context messages and hand them to the storage handler.
+
+        Args:
+            context: The context whose appended messages should be persisted.
+            batch_window_secs: How long the worker waits for more slices before flushing.
+                0 (the default) hands every slice to the handler on its own.
+            batch_max_items: Flush as soon as this many slices have been coalesced.
+            max_queue_size: Bound on queued slices. When full, `save` waits for the worker
+                (backpressure). 0 means unbounded.
+        """
         self._context_handler: Optional[Callable[[List[Any]], Coroutine[Any, Any, None]]] = None
 
-        self._messages_count = len(context.get_messages_for_persistent_storage())
-        self._queue = asyncio.Queue()
+        self._batch_window_secs = batch_window_secs
+        self._batch_max_items = max(batch_max_items, 1)
+        self.metrics = PersistentContextMetrics()
+
+        self._messages_count = len(_persistent_messages(context))
+        # Messages taken off the queue but not handed to the handler yet
+        self._pending: List[Any] = []
+        self._queue = asyncio.Queue(maxsize=max_queue_size)
         self._worker_task = asyncio.create_task(self._worker())
         self._running = True
 
@@ -90,7 +145,7 @@ class PersistentContext:
         if not self._running:
             return ("0", None)
 
-        messages = context.get_messages_for_persistent_storage()
+        messages = _persistent_messages(context)
 
         # Currently we only support storing appended messages. If the context changes out from
         # under us in any way other than new messages being appended, behavior is undefined.
@@ -98,38 +153,108 @@ class PersistentContext:
             return ("", None)
 
         items = messages[self._messages_count :]
-
-        await self._queue.put(items)
         self._messages_count = len(messages)
 
+        await self._enqueue(items)
+
         return (str(self._messages_count), items)
 
+    async def _enqueue(self, item):
+        if self._queue.full():
+            self.metrics.backpressure_waits += 1
+            started = time.monotonic()
+            await self._queue.put(item)
+            self.metrics.backpressure_wait_secs += time.monotonic() - started
+            logger.warning(f"PersistentContext queue full ({self._queue.maxsize}), waited for worker")
+        else:
+            self._queue.put_nowait(item)
+        if item is not _FLUSH_AND_STOP:
+            self.metrics.enqueued_slices += 1
+        self.metrics.max_queue_depth = max(self.metrics.max_queue_depth, self._queue.qsize())
+
+    async def _next_batch(self) -> bool:
+        """Wait for a slice, then coalesce more into `_pending` until the window closes
+        or the batch is full.
+
+        Returns whether the worker was asked to stop.
+        """
+        item = await self._queue.get()
+        self._queue.task_done()
+        if item is _FLUSH_AND_STOP:
+            return True
+
+        self._pending.extend(item)
+        slices = 1
+        deadline = asyncio.get_running_loop().time() + self._batch_window_secs
+        while slices < self._batch_max_items:
+            timeout = deadline - asyncio.get_running_loop().time()
+            try:
+                if timeout > 0:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                else:
+                    # Window closed: only take what is already queued.
+                    item = self._queue.get_nowait()
+            except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                break
+            self._queue.task_done()
+            if item is _FLUSH_AND_STOP:
+                return True
+            self._pending.extend(item)
+            slices += 1
+        return False
+
+    def _drain_queue(self):
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            self._queue.task_done()
+            if item is not _FLUSH_AND_STOP:
+                self._pending.extend(item)
+
+    async def _flush(self):
+        messages, self._pending = self._pending, []
+        if not messages:
+            return
+        try:
+            await self._context_handler(messages)
+            self.metrics.flushed_batches += 1
+            self.metrics.flushed_messages += len(messages)
+        except Exception as e:
+            self.metrics.failed_batches += 1
+            logger.error(f"Persist operation failed: {e}")
+
     async def _worker(self):
         if self._context_handler is None:
             logger.error("on_context_message handler not defined for PersistentContext")
-            await self.close()
+            self._running = False
             raise RuntimeError("No on_context_message handler defined")
 
-        while self._running:
+        stopping = False
+        while not stopping:
             try:
-                messages = await self._queue.get()
-                try:
-                    await self._context_handler(messages)
-                except Exception as e:
-                    logger.error(f"Persist operation failed: {e}")
-                finally:
-                    self._queue.task_done()
+                stopping = await self._next_batch()
+                await self._flush()
             except asyncio.CancelledError:
-                break
+                # Cancelled with the session (or the event loop): write what is held and
+                # queued rather than dropping up to a batch window of turns.
+                self._running = False
+                self._drain_queue()
+                if self._pending:
+                    logger.debug(f"PersistentContext cancelled, flushing {len(self._pending)} messages")
+                    await self._flush()
+                raise
             except Exception as e:
                 logger.error(f"Unexpected error in worker: {e}")
 
     async def close(self, processor=None):
+        if not self._running:
+            return
         logger.debug("Closing PersistentContext...")
         self._running = False
-        await self._queue.join()
-        self._worker_task.cancel()
+        if not self._worker_task.done():
+            # Everything queued ahead of the marker is flushed before the worker exits.
+            await self._enqueue(_FLUSH_AND_STOP)
         try:
             await self._worker_task
-        except asyncio.CancelledError:
+        except (asyncio.CancelledError, RuntimeError):
             pass
+        logger.debug(f"PersistentContext closed: {self.metrics.model_dump()}")
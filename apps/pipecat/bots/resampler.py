@@ -0,0 +1,153 @@
+"""Streaming PCM resampling.
+
+TTS providers stream audio in snippets whose rate does not always match the
+pipeline's. Resampling every snippet on its own restarts the filter at each snippet
+boundary, which is audible as clicks, and redesigns the filter every time.
+`StreamingResampler` designs its polyphase filter once and carries the filter
+history from one chunk to the next, so a stream resampled in pieces is identical to
+the stream resampled in one go.
+"""
+
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def _design_filter(up: int, down: int, zero_crossings: int, rolloff: float, beta: float):
+    """Kaiser-windowed sinc lowpass for the upsampled rate, split into `up` phases.
+
+    Returns:
+        The phases as an (up, taps_per_phase) float32 array, each row reversed so it
+        can be applied with a dot product against the input in natural order, and
+        the filter delay in upsampled samples.
+    """
+    factor = max(up, down)
+    cutoff = rolloff * 0.5 / factor
+    num_taps = 2 * zero_crossings * factor + 1
+    taps_per_phase = -(-num_taps // up)
+    center = (num_taps - 1) / 2
+    n = np.arange(num_taps) - center
+    h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(num_taps, beta) * up
+    h = np.concatenate([h, np.zeros(taps_per_phase * up - num_taps)])
+    # phases[p, l] = h[p + l * up]
+    phases = h.reshape(taps_per_phase, up).T[:, ::-1]
+    return np.ascontiguousarray(phases, dtype=np.float32), center
+
+
+class StreamingResampler:
+    """Resamples a mono int16 PCM stream chunk by chunk.
+
+    The ratio is reduced to `up/down`. Each output sample is the dot product of one
+    phase of the polyphase filter with the input window ending at it, computed for
+    the whole chunk at once. Integer downsampling (48k to 24k or 16k) has a single
+    phase and becomes one matrix-vector product over strided windows; equal rates
+    pass the audio through untouched.
+
+    Args:
+        from_rate: Sample rate of the input.
+        to_rate: Sample rate of the output.
+        zero_crossings: Half-length of the filter in zero crossings of the sinc; more
+            gives a sharper cutoff for more CPU.
+        rolloff: Cutoff as a fraction of the lower Nyquist frequency.
+    """
+
+    def __init__(
+        self,
+        from_rate: int,
+        to_rate: int,
+        *,
+        zero_crossings: int = 16,
+        rolloff: float = 0.92,
+        kaiser_beta: float = 8.6,
+    ):
+        g = math.gcd(from_rate, to_rate)
+        self.from_rate = from_rate
+        self.to_rate = to_rate
+        self._up = to_rate // g
+        self._down = from_rate // g
+        self._passthrough = self._up == self._down
+        self._pending = b""
+        self._samples_in = 0
+        self._samples_out = 0
+        if self._passthrough:
+            return
+
+        self._phases, delay = _design_filter(
+            self._up, self._down, zero_crossings, rolloff, kaiser_beta
+        )
+        self._taps = self._phases.shape[1]
+        # Input history the next window needs, starting as silence
+        self._history = np.zeros(self._taps - 1, dtype=np.float32)
+        # Global index of the first sample of the history
+        self._base = -(self._taps - 1)
+        # Skip the filter delay so the output lines up with the input
+        self._next_out = int(round(delay / self._down))
+        self._first_out = self._next_out
+
+    def process(self, pcm: bytes) -> bytes:
+        """Resample the next chunk of the stream.
+
+        The output lags the input by the filter delay; call `flush` at the end of the
+        stream for the rest. Odd trailing bytes are kept for the next chunk.
+        """
+        if self._pending:
+            pcm = self._pending + pcm
+        usable = len(pcm) - len(pcm) % 2
+        self._pending = pcm[usable:]
+        if self._passthrough:
+            return pcm[:usable]
+        samples = np.frombuffer(pcm, dtype=np.int16, count=usable // 2)
+        self._samples_in += len(samples)
+        return self._to_pcm(self._resample(samples.astype(np.float32)))
+
+    def flush(self) -> bytes:
+        """Return the output still held back by the filter delay and reset the stream."""
+        if self._passthrough:
+            self._pending = b""
+            return b""
+        remaining = -(-self._samples_in * self._up // self._down) - self._samples_out
+        tail = self._resample(np.zeros(self._taps, dtype=np.float32))[: max(0, remaining)]
+        self.reset()
+        return self._to_pcm(tail)
+
+    def reset(self):
+        """Forget the stream, e.g. after an interruption."""
+        self._pending = b""
+        self._samples_in = 0
+        self._samples_out = 0
+        if self._passthrough:
+            return
+        self._history[:] = 0
+        self._base = -(self._taps - 1)
+        self._next_out = self._first_out
+
+    def _resample(self, samples: np.ndarray) -> np.ndarray:
+        buffer = np.concatenate([self._history, samples])
+        last = self._base + len(buffer) - 1
+        # Outputs whose newest input sample has arrived: position // up <= last
+        end_out = ((last + 1) * self._up - 1) // self._down + 1
+        if end_out <= self._next_out:
+            out = np.zeros(0, dtype=np.float32)
+        else:
+            positions = np.arange(self._next_out, end_out, dtype=np.int64) * self._down
+            newest = positions // self._up - self._base
+            windows = sliding_window_view(buffer, self._taps)
+            starts = newest - (self._taps - 1)
+            if self._up == 1:
+                step = self._down
+                out = windows[starts[0] : starts[-1] + 1 : step] @ self._phases[0]
+            else:
+                out = np.einsum(
+                    "ij,ij->i", windows[starts], self._phases[positions % self._up]
+                )
+            self._next_out = end_out
+        self._history = buffer[len(buffer) - (self._taps - 1) :].copy()
+        self._base = last - (self._taps - 2)
+        self._samples_out += len(out)
+        return out
+
+    @staticmethod
+    def _to_pcm(samples: np.ndarray) -> bytes:
+        return np.clip(np.rint(samples), -32768, 32767).astype(np.int16).tobytes()
+
@@ -1,99 +1,238 @@
-from typing import Dict, List, Optional
+"""Conversation titles.
+
+A title is a few words, so it is one direct chat completion against Gemini's
+OpenAI-compatible endpoint, on a client shared by the process, with only the end of
+the transcript. Titles requested while serving a conversation never mix
+conversations, which may belong to different users. The offline backfill of untitled
+conversations (`sesame titles`) goes through `summarize_many`, several per completion.
+"""
+
+import asyncio
+import json
+import os
+from typing import Any, Dict, List, Optional, Set
 
 from common.config import SERVICE_API_KEYS
-from common.models import Conversation
+from common.database import DatabaseSessionFactory, default_session_factory
+from common.models import Conversation, Message
+from dotenv import load_dotenv
 from loguru import logger
+from openai import AsyncOpenAI
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from pipecat.frames.frames import EndFrame
-from pipecat.pipeline.pipeline import Pipeline
-from pipecat.pipeline.runner import PipelineRunner
-from pipecat.pipeline.task import PipelineTask
-from pipecat.processors.aggregators.openai_llm_context import OpenAILLMContextFrame
-from pipecat.services.ai_services import OpenAILLMContext
-from pipecat.services.google import GoogleLLMContext, GoogleLLMService
+from bots.tokens import estimate_tokens
 
+load_dotenv()
 
-async def generate_summary_with_llm(messages: List[Dict[str, str]]) -> Optional[str]:
-    """
-    Generate summary using the LLM service with message validation
+GEMINI_OPENAI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai/"
 
-    Args:
-        messages: List of message dictionaries with 'role' and 'content'
-        llm: Initialized LLM service instance
+TITLE_PROMPT = (
+    "Summarize our conversation into just a few words. It will be used as a label for "
+    "this conversation. Avoid using any special characters."
+)
 
-    Returns:
-        Optional[str]: Generated summary or None if generation fails
+BATCH_TITLE_PROMPT = (
+    "Below are {count} conversations, each starting with '### Conversation <number>'. "
+    "Summarize each of them into just a few words, to be used as its label, avoiding any "
+    "special characters. Answer with a JSON array of {count} objects of the form "
+    '{{"conversation": <number>, "title": "<label>"}}, one per conversation, and nothing else.'
+)
 
-    Raises:
-        ValueError: If LLM response is empty or invalid
-    """
-    llm_api_key = SERVICE_API_KEYS["gemini"]
+# Messages read for a title; the transcript is cut to the token budget after that
+_TITLE_MAX_MESSAGES = 40
 
-    if llm_api_key is None:
-        return None
+# Title of conversations that have not been summarized yet
+UNTITLED = "New conversation"
+# Conversations with fewer messages are not worth a title yet
+TITLE_MIN_MESSAGES = 4
 
-    llm = GoogleLLMService(
-        api_key=str(SERVICE_API_KEYS["gemini"]),
-        model="gemini-2.0-flash-exp",
-    )
 
-    try:
-        messages.append(
-            {
-                "role": "user",
-                "content": "Summarize our conversation into just a few words. It will be used as a label for this conversation. Avoid using any special characters.",
-            }
+def _content_text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(
+            part.get("text", "") for part in content if isinstance(part, dict) and part.get("type") == "text"
         )
+    return ""
+
+
+def format_transcript(messages: List[Dict[str, Any]], max_tokens: int) -> str:
+    """The latest user and assistant turns of `messages` that fit in `max_tokens`."""
+    lines: List[str] = []
+    tokens = 0
+    for message in reversed(messages):
+        if message.get("role") not in ("user", "assistant"):
+            continue
+        text = " ".join(_content_text(message.get("content")).split())
+        if not text:
+            continue
+        line = f"{message['role']}: {text}"
+        cost = estimate_tokens(line)
+        if tokens + cost > max_tokens:
+            if not lines:
+                # A single long message: keep its beginning
+                lines.append(line[: len(line) * max_tokens // cost])
+            break
+        lines.append(line)
+        tokens += cost
+    return "\n".join(reversed(lines))
+
+
+def _clean_title(text: Optional[str]) -> Optional[str]:
+    title = " ".join((text or "").split()).strip(" \"'`*#.。")
+    return title[:255] or None
+
+
+def _parse_titles(content: Optional[str], count: int) -> Optional[List[Optional[str]]]:
+    """Titles in conversation order, or None unless each number 1..count is answered once.
+
+    Titles are matched by the number the model echoes back, never by position.
+    """
+    text = (content or "").strip()
+    if text.startswith("```"):
+        # Models like to fence JSON even when asked not to
+        text = text.strip("`").removeprefix("json").strip()
+    try:
+        answers = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(answers, list) or len(answers) != count:
+        return None
+    titles: Dict[int, Optional[str]] = {}
+    for answer in answers:
+        if not isinstance(answer, dict):
+            return None
+        number, title = answer.get("conversation"), answer.get("title")
+        if type(number) is not int or not 1 <= number <= count or number in titles:
+            return None
+        titles[number] = _clean_title(title) if isinstance(title, str) else None
+    return [titles[number] for number in range(1, count + 1)]
 
-        ctx = OpenAILLMContext(messages)
 
-        sys_ctx_aggregator = llm.create_context_aggregator(
-            # ctx, assistant_expect_stripped_words=False
-            ctx
-        )
-        ctx_frame = OpenAILLMContextFrame(ctx)
-        if isinstance(llm, GoogleLLMService):
-            GoogleLLMContext.upgrade_to_google(ctx)
+class TitleSummarizer:
+    """Generates conversation titles with direct completions.
 
-        pipeline = Pipeline([llm, sys_ctx_aggregator.assistant()])
-        runner = PipelineRunner(handle_sigint=False)
-        task = PipelineTask(pipeline)
+    Args:
+        api_key: Gemini API key; without one no titles are generated.
+        model: Model used for the completions.
+        base_url: OpenAI-compatible endpoint.
+        max_transcript_tokens: Estimated tokens of transcript sent per conversation,
+            taken from its end.
+        max_batch_size: Conversations per completion in `summarize_many`.
+    """
 
-        await task.queue_frames([ctx_frame, EndFrame()])
-        await runner.run(task)
+    def __init__(
+        self,
+        *,
+        api_key: Optional[str],
+        model: str = "gemini-2.0-flash-exp",
+        base_url: str = GEMINI_OPENAI_BASE_URL,
+        max_transcript_tokens: int = 1500,
+        max_batch_size: int = 8,
+        timeout_secs: float = 30.0,
+    ):
+        self._api_key = api_key
+        self._model = model
+        self._base_url = base_url
+        self._max_transcript_tokens = max_transcript_tokens
+        self._max_batch_size = max(max_batch_size, 1)
+        self._timeout_secs = timeout_secs
+        self._client: Optional[AsyncOpenAI] = None
+
+    def _get_client(self) -> AsyncOpenAI:
+        if self._client is None:
+            self._client = AsyncOpenAI(
+                api_key=self._api_key, base_url=self._base_url, timeout=self._timeout_secs
+            )
+        return self._client
+
+    async def summarize(self, messages: List[Dict[str, Any]]) -> Optional[str]:
+        """Title one conversation with a completion of its own.
+
+        Returns:
+            The title, or None if there is nothing to summarize or generation failed.
+        """
+        if not self._api_key:
+            logger.warning("No Gemini API key, not generating a title")
+            return None
+        transcript = format_transcript(messages, self._max_transcript_tokens)
+        if not transcript:
+            return None
+        try:
+            return (await self._titles([transcript]))[0]
+        except Exception as e:
+            logger.exception(f"Failed to generate title: {e}")
+            return None
+
+    async def summarize_many(self, conversations: List[List[Dict[str, Any]]]) -> List[Optional[str]]:
+        """Title several conversations, `max_batch_size` per completion."""
+        titles: List[Optional[str]] = [None] * len(conversations)
+        if not self._api_key:
+            return titles
+        transcripts = [format_transcript(messages, self._max_transcript_tokens) for messages in conversations]
+        indices = [i for i, transcript in enumerate(transcripts) if transcript]
+        for start in range(0, len(indices), self._max_batch_size):
+            chunk = indices[start : start + self._max_batch_size]
+            try:
+                results = await self._titles([transcripts[i] for i in chunk])
+            except Exception as e:
+                logger.exception(f"Failed to generate titles: {e}")
+                continue
+            for i, title in zip(chunk, results):
+                titles[i] = title
+        return titles
+
+    async def _titles(self, transcripts: List[str]) -> List[Optional[str]]:
+        if len(transcripts) == 1:
+            return [_clean_title(await self._complete(TITLE_PROMPT, transcripts[0], 1))]
+        numbered = "\n\n".join(
+            f"### Conversation {i}\n{transcript}" for i, transcript in enumerate(transcripts, 1)
+        )
+        prompt = BATCH_TITLE_PROMPT.format(count=len(transcripts))
+        titles = _parse_titles(await self._complete(prompt, numbered, len(transcripts)), len(transcripts))
+        if titles is None:
+            logger.warning(f"Unusable answer for {len(transcripts)} titles, asking one at a time")
+            single = await asyncio.gather(*(self._titles([transcript]) for transcript in transcripts))
+            return [titles[0] for titles in single]
+        return titles
+
+    async def _complete(self, instruction: str, transcript: str, count: int) -> Optional[str]:
+        response = await self._get_client().chat.completions.create(
+            model=self._model,
+            messages=[
+                {"role": "system", "content": instruction},
+                {"role": "user", "content": transcript},
+            ],
+            temperature=0.2,
+            max_tokens=48 * count + 16,
+        )
+        return response.choices[0].message.content if response.choices else None
 
-        # Validate LLM response
-        response_messages = ctx.get_messages_for_persistent_storage()
-        if not response_messages:
-            raise ValueError("No response received from LLM")
 
-        if len(response_messages) == 0:
-            raise ValueError("Empty response from LLM")
+# Create a default summarizer for convenience
+default_title_summarizer = TitleSummarizer(
+    api_key=SERVICE_API_KEYS["gemini"],
+    model=os.getenv("SUMMARY_MODEL", "gemini-2.0-flash-exp"),
+    max_transcript_tokens=int(os.getenv("SUMMARY_MAX_TRANSCRIPT_TOKENS", "1500")),
+)
 
-        summary = response_messages[-1].get("content")
-        summary = summary[0].get("text")
 
-        if not summary:
-            raise ValueError("No content in LLM response")
+async def generate_summary_with_llm(messages: List[Dict[str, Any]]) -> Optional[str]:
+    """
+    Generate a title for the conversation made of `messages`
 
-        # Optionally validate summary content
-        summary = summary.strip()
-        if len(summary) == 0:
-            raise ValueError("Empty summary content from LLM")
+    Args:
+        messages: List of message dictionaries with 'role' and 'content'
 
+    Returns:
+        Optional[str]: Generated summary or None if generation fails
+    """
+    summary = await default_title_summarizer.summarize(messages)
+    if summary:
         logger.info(f"Generated summary: {summary}")
-        return summary
-
-    except ValueError as ve:
-        # Log specific validation errors
-        logger.error(f"Validation error in LLM response: {str(ve)}")
-        return None
-    except Exception as e:
-        # Log unexpected errors
-        logger.exception(f"Failed to generate summary: {str(e)}")
-        return None
+    return summary
 
 
 async def update_conversation_title(db: AsyncSession, conversation_id: str, new_title: str) -> bool:
@@ -122,23 +261,82 @@ async def update_conversation_title(db: AsyncSession, conversation_id: str, new_
         return False
 
 
-async def generate_conversation_summary(conversation_id: str, db) -> Optional[Conversation]:
+async def _latest_messages(db: AsyncSession, conversation_id: str) -> List[Dict[str, Any]]:
+    result = await db.execute(
+        select(Message.content)
+        .where(Message.conversation_id == conversation_id)
+        .order_by(Message.message_number.desc())
+        .limit(_TITLE_MAX_MESSAGES)
+    )
+    return list(reversed(result.scalars().all()))
+
+
+async def backfill_conversation_titles(
+    session_factory: DatabaseSessionFactory = default_session_factory,
+    *,
+    limit: int = 100,
+    summarizer: TitleSummarizer = default_title_summarizer,
+) -> int:
+    """
+    Title up to `limit` untitled conversations, most recently updated first
+
+    Meant for offline runs: conversations are titled several per completion, mixing
+    conversations of different users in one request.
+
+    Returns:
+        int: The number of conversations titled
+    """
+    async with session_factory() as db:
+        result = await db.execute(
+            select(Conversation.conversation_id)
+            .where(Conversation.title == UNTITLED)
+            .order_by(Conversation.updated_at.desc())
+            .limit(limit)
+        )
+        conversation_ids = []
+        conversations = []
+        for conversation_id in result.scalars().all():
+            messages = await _latest_messages(db, conversation_id)
+            if len(messages) >= TITLE_MIN_MESSAGES:
+                conversation_ids.append(conversation_id)
+                conversations.append(messages)
+    if not conversations:
+        return 0
+
+    titles = await summarizer.summarize_many(conversations)
+    titled = 0
+    async with session_factory() as db:
+        for conversation_id, title in zip(conversation_ids, titles):
+            if title and await update_conversation_title(db, conversation_id, title):
+                titled += 1
+    logger.info(f"Titled {titled} of {len(conversations)} untitled conversations")
+    return titled
+
+
+# Conversations being titled; reading several pages in a row asks more than once
+_titling: Set[str] = set()
+
+
+async def generate_conversation_summary(
+    conversation_id: str, session_factory: DatabaseSessionFactory = default_session_factory
+) -> Optional[str]:
     """
-    Background task to process conversation summary with comprehensive error handling
+    Background task to title a conversation from its latest messages
+
+    Runs after the response is sent, so it opens its own sessions rather than using the
+    request's.
     """
+    if conversation_id in _titling:
+        return None
+    _titling.add(conversation_id)
     logger.info(f"Starting summary generation for conversation {conversation_id}")
 
     try:
-        # Get conversation and validate
-        conversation = await Conversation.get_conversation_by_id(conversation_id, db)
-        if not conversation:
-            logger.error(f"Conversation {conversation_id} not found")
-            return
-
-        messages = [getattr(msg, "content") for msg in conversation.messages]
+        async with session_factory() as db:
+            messages = await _latest_messages(db, conversation_id)
         if not messages:
             logger.info(f"No messages found in conversation {conversation_id}")
-            return
+            return None
 
         logger.info(f"Processing {len(messages)} messages")
 
@@ -146,20 +344,21 @@ async def generate_conversation_summary(conversation_id: str, db) -> Optional[Co
         summary = await generate_summary_with_llm(messages)
         if not summary:
             logger.error("Failed to generate summary")
-            return
+            return None
 
         # Update conversation title
-        success = await update_conversation_title(db, conversation_id, summary)
+        async with session_factory() as db:
+            success = await update_conversation_title(db, conversation_id, summary)
         if not success:
             logger.error("Failed to update conversation title")
-            return
+            return None
 
         logger.info(f"Successfully completed summary generation for conversation {conversation_id}")
+        return summary
 
     except Exception as e:
         logger.exception(f"Unexpected error in summary generation: {str(e)}")
         raise e
     finally:
+        _titling.discard(conversation_id)
         logger.info(f"Finished processing conversation {conversation_id}")
-
-    return conversation
@@ -0,0 +1,4 @@
+def estimate_tokens(text: str) -> int:
+    """Rough token count: about four characters per token, one per CJK character."""
+    wide = sum(1 for char in text if ord(char) >= 0x2E80)
+    return wide + (len(text) - wide + 3) // 4
@@ -1,20 +1,15 @@
 import asyncio
-import datetime
-import io
-import wave
-import aiofiles
 from typing import Any, AsyncGenerator, List, Tuple
 import os
 import json
-from pipecat.frames.frames import EndFrame, TTSSpeakFrame, Frame, TTSAudioRawFrame, TTSStoppedFrame, TransportMessageUrgentFrame, StartFrame, CancelFrame
+from pipecat.frames.frames import EndFrame, TTSSpeakFrame, Frame, TTSAudioRawFrame, TTSStartedFrame, TTSStoppedFrame, TransportMessageUrgentFrame, StartFrame, CancelFrame
 from bots.http.frame_serializer import BotFrameSerializer
 from bots.persistent_context import PersistentContext
-from common.publisher import PublisherFactory
+from common.publisher import get_publisher
 from bots.rtvi import create_rtvi_processor
 from bots.types import BotConfig, BotParams
 from common.config import SERVICE_API_KEYS
 from common.models import Attachment, Message
-from common.publisher import default_publisher_factory
 from fastapi import HTTPException, status
 from loguru import logger
 from openai._types import NOT_GIVEN
@@ -24,7 +19,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from pipecat.services.cartesia.tts import CartesiaTTSService
 from pipecat.pipeline.pipeline import Pipeline
 from pipecat.pipeline.runner import PipelineRunner
+from bots.connection_pool import get_tts_pool
 from bots.minimax.tts import MiniMaxHttpTTSService
+from bots.tts_cache import default_tts_cache, with_tts_cache
+from bots.wav_writer import StreamingWavWriter
+from common.recordings import default_recording_store
 from pipecat.pipeline.task import PipelineTask
 from pipecat.processors.async_generator import AsyncGeneratorProcessor
 from pipecat.transcriptions.language import Language
@@ -38,53 +37,53 @@ from pipecat.services.ai_services import OpenAILLMContext
 from pipecat.services.google import GoogleLLMContext, GoogleLLMService
 from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
 
-os.makedirs("recordings", exist_ok=True)
-
-
-async def save_audio(audio: bytes, sample_rate: int, num_channels: int, name: str):
-    if len(audio) > 0:
-        filename = os.path.join(
-            "recordings",
-            f"{name}_conversation_recording.wav",
-        )
-        with io.BytesIO() as buffer:
-            with wave.open(buffer, "wb") as wf:
-                wf.setsampwidth(2)
-                wf.setnchannels(num_channels)
-                wf.setframerate(sample_rate)
-                wf.writeframes(audio)
-            async with aiofiles.open(filename, "wb") as file:
-                await file.write(buffer.getvalue())
-        print(f"Merged audio saved to {filename}")
-    else:
-        print("No audio data to save")
-
-
 class AudioBufferProcessor(FrameProcessor):
+    """Records the synthesized speech straight to a WAV file as it is produced."""
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self._audio_buffer = []
+        self._writer = None
+        self._recording_id = None
         self._sample_rate = 24000
         self._num_channels = 1
     async def process_frame(self, frame: Frame, direction: FrameDirection):
         await super().process_frame(frame, direction)
-        if isinstance(frame, TTSSpeakFrame):
-            self._audio_buffer = []
+        if isinstance(frame, TTSStartedFrame):
+            await self._start_recording()
         elif isinstance(frame, TTSAudioRawFrame):
-            self._audio_buffer.append(frame.audio)
+            if self._writer is None:
+                await self._start_recording()
+            self._writer.set_format(frame.sample_rate, frame.num_channels)
+            self._writer.write(frame.audio)
         elif isinstance(frame, TTSStoppedFrame):
-            if self._audio_buffer:
-                await save_audio(
-                    b"".join(self._audio_buffer),
-                    self._sample_rate,
-                    self._num_channels,
-                    f"tts_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            writer, self._writer = self._writer, None
+            if writer and writer.has_audio:
+                await writer.close()
+                await default_recording_store.save(
+                    self._recording_id,
+                    kind="tts",
+                    duration_secs=writer.duration_secs,
+                    sample_rate=writer.sample_rate,
+                    num_channels=writer.num_channels,
                 )
-                await self.push_frame(TransportMessageUrgentFrame(message={'label': 'rtvi-ai', 'type': 'server-message', 'data': {'fileUrl': f"tts_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"}}), direction)
+                await self.push_frame(TransportMessageUrgentFrame(message={'label': 'rtvi-ai', 'type': 'server-message', 'data': {'fileUrl': self._recording_id}}), direction)
                 await self.push_frame(EndFrame(), direction)
                 # await self.push_frame(CancelFrame(), direction)
+            elif writer:
+                await writer.discard()
         await self.push_frame(frame, direction)
 
+    async def _start_recording(self):
+        if self._writer:
+            await self._writer.discard()
+        self._recording_id = default_recording_store.new_id()
+        self._writer = StreamingWavWriter(
+            default_recording_store.path_for(self._recording_id),
+            sample_rate=self._sample_rate,
+            num_channels=self._num_channels,
+        )
+        await self._writer.open()
+
 
 
 
@@ -101,8 +100,11 @@ async def tts_bot_pipeline(
         model="speech-01-turbo",
         voice_id="Boyan_new_platform",
         sample_rate=24000,
+        aiohttp_session=get_tts_pool().http_session("minimax"),
         params=MiniMaxHttpTTSService.InputParams(language=Language.ZH, speed=1)
     )
+    # The same sentences are requested over and over; the output is a file, so no pacing
+    tts = with_tts_cache(tts, default_tts_cache, realtime=False)
     audiobuffer = AudioBufferProcessor()
     processors = [
         rtvi,
@@ -0,0 +1,354 @@
+"""Disk cache for synthesized speech.
+
+Lesson sentences are synthesized identically for every learner and the voice bots
+repeat fixed prompts, so the same (voice, settings, text) is paid for over and over.
+`with_tts_cache` wraps a TTS service so that a repeated utterance is replayed from
+disk as a normal frame stream instead of going to the provider.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+import unicodedata
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Callable, List, Optional, Tuple
+
+import aiofiles
+import aiofiles.os
+from dotenv import load_dotenv
+from loguru import logger
+
+from pipecat.frames.frames import (
+    ErrorFrame,
+    Frame,
+    StartInterruptionFrame,
+    TTSAudioRawFrame,
+    TTSStartedFrame,
+    TTSStoppedFrame,
+)
+from pipecat.services.tts_service import TTSService
+
+load_dotenv()
+
+# Pseudo-words some services queue to drive their word timestamp task
+_CONTROL_WORDS = {"Reset", "TTSStoppedFrame", "LLMFullResponseEndFrame"}
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so that trivially different spellings share a cache entry."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+@dataclass
+class CachedSpeech:
+    audio: bytes
+    sample_rate: int
+    num_channels: int
+    # (word, seconds from the start of the audio)
+    words: List[Tuple[str, float]] = field(default_factory=list)
+
+
+class TTSCache:
+    """LRU cache of PCM audio and word timestamps, stored on disk.
+
+    Each entry is `<root>/<key[:2]>/<key>.pcm` plus a `.json` sidecar with the audio
+    format and word timestamps. The index of entries and their sizes is built from
+    the directory on first use (oldest modification time first) and entries are
+    evicted least recently used first once the total exceeds `max_bytes`.
+    """
+
+    def __init__(self, root: str, *, max_bytes: int = 512 * 1024 * 1024):
+        self._root = root
+        self._max_bytes = max_bytes
+        self._index: Optional["OrderedDict[str, int]"] = None
+        self._size = 0
+        self._lock = asyncio.Lock()
+        self._writes = set()
+
+    @staticmethod
+    def key_for(service: TTSService, text: str) -> str:
+        """Key on everything that changes the audio: provider, model, voice, settings
+        (speed, emotion, language...), sample rate and the normalized text."""
+        settings = getattr(service, "_settings", {}) or {}
+        parts = [
+            type(service).__name__,
+            getattr(service, "model_name", None) or getattr(service, "_model_name", None),
+            getattr(service, "_voice_id", None),
+            settings,
+            # MiniMax applies its default emotion per request instead of through _settings
+            getattr(getattr(service, "_params", None), "emotion", None),
+            service.sample_rate,
+            normalize_text(text),
+        ]
+        encoded = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self._root, key[:2], f"{key}{suffix}")
+
+    async def _load_index(self):
+        if self._index is not None:
+            return
+
+        def scan():
+            entries = []
+            if os.path.isdir(self._root):
+                for dirpath, _, filenames in os.walk(self._root):
+                    for name in filenames:
+                        if name.endswith(".pcm"):
+                            stat = os.stat(os.path.join(dirpath, name))
+                            entries.append((stat.st_mtime, name[:-4], stat.st_size))
+            entries.sort()
+            return entries
+
+        entries = await asyncio.to_thread(scan)
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._size = sum(self._index.values())
+
+    async def get(self, key: str) -> Optional[CachedSpeech]:
+        async with self._lock:
+            await self._load_index()
+            if key not in self._index:
+                return None
+            self._index.move_to_end(key)
+        try:
+            async with aiofiles.open(self._path(key, ".json"), "r", encoding="utf-8") as f:
+                meta = json.loads(await f.read())
+            async with aiofiles.open(self._path(key, ".pcm"), "rb") as f:
+                audio = await f.read()
+            # Recency survives restarts through the modification time
+            await asyncio.to_thread(os.utime, self._path(key, ".pcm"))
+        except (OSError, ValueError) as e:
+            # Evicted by another process, or a partial entry
+            logger.debug(f"TTS cache entry {key} unreadable: {e}")
+            async with self._lock:
+                self._size -= self._index.pop(key, 0)
+            return None
+        return CachedSpeech(
+            audio=audio,
+            sample_rate=meta["sample_rate"],
+            num_channels=meta["num_channels"],
+            words=[tuple(w) for w in meta.get("words", [])],
+        )
+
+    async def put(self, key: str, speech: CachedSpeech, text: str = ""):
+        if not speech.audio or len(speech.audio) > self._max_bytes:
+            return
+        meta = {
+            "sample_rate": speech.sample_rate,
+            "num_channels": speech.num_channels,
+            "words": speech.words,
+            "text": text,
+        }
+        await aiofiles.os.makedirs(os.path.dirname(self._path(key, ".pcm")), exist_ok=True)
+        # The sidecar goes first and the audio is renamed into place last, so an
+        # entry is only indexed once it is complete
+        for suffix, data, mode in (
+            (".json", json.dumps(meta, ensure_ascii=False).encode("utf-8"), "wb"),
+            (".pcm", speech.audio, "wb"),
+        ):
+            tmp_path = f"{self._path(key, suffix)}.{uuid.uuid4().hex}.tmp"
+            async with aiofiles.open(tmp_path, mode) as f:
+                await f.write(data)
+            await aiofiles.os.replace(tmp_path, self._path(key, suffix))
+
+        async with self._lock:
+            await self._load_index()
+            self._size -= self._index.pop(key, 0)
+            self._index[key] = len(speech.audio)
+            self._size += len(speech.audio)
+            evicted = []
+            while self._size > self._max_bytes and len(self._index) > 1:
+                old_key, old_size = self._index.popitem(last=False)
+                self._size -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            for suffix in (".pcm", ".json"):
+                try:
+                    await aiofiles.os.remove(self._path(old_key, suffix))
+                except FileNotFoundError:
+                    pass
+        if evicted:
+            logger.debug(f"TTS cache evicted {len(evicted)} entries")
+
+    def put_later(self, key: str, speech: CachedSpeech, text: str = ""):
+        """Write an entry in the background so the pipeline does not wait on disk."""
+        task = asyncio.create_task(self.put(key, speech, text))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+
+class _Recorder:
+    """Collects what a service pushes for one utterance on a cache miss."""
+
+    def __init__(self, key: str, text: str):
+        self.key = key
+        self.text = text
+        self.chunks: List[bytes] = []
+        self.sample_rate = 0
+        self.num_channels = 1
+        self.words: List[Tuple[str, float]] = []
+        self.failed = False
+
+
+def with_tts_cache(
+    service: TTSService,
+    cache: TTSCache,
+    *,
+    only: Optional[Callable[[str], bool]] = None,
+    realtime: bool = True,
+    frame_ms: int = 20,
+    lead_secs: float = 0.5,
+) -> TTSService:
+    """Serve repeated utterances of `service` from `cache`.
+
+    Works with any TTS service by wrapping the instance's `run_tts`, `push_frame` and
+    `add_word_timestamps`: a miss is synthesized as usual while the audio and word
+    timestamps it pushes are recorded, and stored once its TTSStoppedFrame goes by. An
+    utterance is only recorded when it is the only one in flight, so services that
+    stream several sentences at once never mix up audio. Services with a `_context_id`
+    (Cartesia, ElevenLabs...) stream every utterance of a context under a single
+    TTSStoppedFrame, so for them what is in flight is counted per context rather than
+    per utterance. A hit yields the cached audio in `frame_ms` frames and replays the
+    word timestamps.
+
+    Args:
+        service: The TTS service to wrap. It is modified in place and returned.
+        cache: Where entries are stored.
+        only: If given, only texts for which it returns True are cached.
+        realtime: Pace replayed audio to real time after the first `lead_secs`, as a
+            provider would. Disable when the output is a file rather than a speaker.
+        frame_ms: Duration of each replayed audio frame.
+        lead_secs: Audio sent ahead of real time when pacing.
+
+    Returns:
+        The same service.
+    """
+    original_run_tts = service.run_tts
+    original_push_frame = service.push_frame
+    original_add_word_timestamps = getattr(service, "add_word_timestamps", None)
+    uses_contexts = hasattr(service, "_context_id")
+    # in_flight counts utterances of services without contexts; contexts is an ordered
+    # set of the context ids still owed a TTSStoppedFrame
+    state = {"recorder": None, "in_flight": 0, "contexts": {}, "replaying": False}
+
+    def busy() -> bool:
+        return state["in_flight"] > 0 or bool(state["contexts"])
+
+    def add_context():
+        context_id = getattr(service, "_context_id", None)
+        if context_id is not None:
+            state["contexts"][context_id] = None
+
+    async def replay(speech: CachedSpeech) -> AsyncGenerator[Frame, None]:
+        frame_bytes = max(1, speech.sample_rate * frame_ms // 1000) * speech.num_channels * 2
+        bytes_per_sec = speech.sample_rate * speech.num_channels * 2
+        state["replaying"] = True
+        try:
+            yield TTSStartedFrame()
+            start = time.monotonic()
+            for offset in range(0, len(speech.audio), frame_bytes):
+                if offset == 0 and hasattr(service, "start_word_timestamps"):
+                    service.start_word_timestamps()
+                    if speech.words and original_add_word_timestamps:
+                        await original_add_word_timestamps(speech.words)
+                if realtime:
+                    ahead = offset / bytes_per_sec - (time.monotonic() - start) - lead_secs
+                    if ahead > 0:
+                        await asyncio.sleep(ahead)
+                yield TTSAudioRawFrame(
+                    audio=speech.audio[offset : offset + frame_bytes],
+                    sample_rate=speech.sample_rate,
+                    num_channels=speech.num_channels,
+                )
+            if original_add_word_timestamps and hasattr(service, "start_word_timestamps"):
+                await original_add_word_timestamps([("Reset", 0)])
+            yield TTSStoppedFrame()
+        finally:
+            state["replaying"] = False
+
+    async def run_tts(text: str) -> AsyncGenerator[Frame, None]:
+        if only is None or only(text):
+            key = cache.key_for(service, text)
+            speech = await cache.get(key)
+            if speech:
+                logger.debug(f"{service}: TTS cache hit [{text}]")
+                async for frame in replay(speech):
+                    yield frame
+                return
+            recorder = _Recorder(key, text) if not busy() else None
+        else:
+            recorder = None
+        # A second utterance in flight makes attribution ambiguous; drop the recording
+        state["recorder"] = recorder
+        if not uses_contexts:
+            state["in_flight"] += 1
+            async for frame in original_run_tts(text):
+                yield frame
+            return
+        # The service opens its context, if it has none yet, inside run_tts
+        added = False
+        async for frame in original_run_tts(text):
+            if not added:
+                add_context()
+                added = True
+            yield frame
+        if not added:
+            add_context()
+
+    async def push_frame(frame: Frame, *args, **kwargs):
+        await original_push_frame(frame, *args, **kwargs)
+        if state["replaying"]:
+            return
+        recorder = state["recorder"]
+        if isinstance(frame, TTSAudioRawFrame):
+            if recorder:
+                recorder.chunks.append(frame.audio)
+                recorder.sample_rate = frame.sample_rate
+                recorder.num_channels = frame.num_channels
+        elif isinstance(frame, ErrorFrame):
+            if recorder:
+                recorder.failed = True
+        elif isinstance(frame, StartInterruptionFrame):
+            state["recorder"] = None
+            state["in_flight"] = 0
+            state["contexts"].clear()
+        elif isinstance(frame, TTSStoppedFrame):
+            if state["contexts"]:
+                # One stop ends the oldest context, however many utterances it merged
+                del state["contexts"][next(iter(state["contexts"]))]
+            else:
+                state["in_flight"] = max(0, state["in_flight"] - 1)
+            if recorder and not busy():
+                state["recorder"] = None
+                if recorder.chunks and not recorder.failed:
+                    speech = CachedSpeech(
+                        audio=b"".join(recorder.chunks),
+                        sample_rate=recorder.sample_rate,
+                        num_channels=recorder.num_channels,
+                        words=recorder.words,
+                    )
+                    cache.put_later(recorder.key, speech, recorder.text)
+
+    async def add_word_timestamps(word_times: List[Tuple[str, float]]):
+        recorder = state["recorder"]
+        if recorder and not state["replaying"]:
+            recorder.words.extend((w, t) for w, t in word_times if w not in _CONTROL_WORDS)
+        await original_add_word_timestamps(word_times)
+
+    service.run_tts = run_tts
+    service.push_frame = push_frame
+    if original_add_word_timestamps:
+        service.add_word_timestamps = add_word_timestamps
+    return service
+
+
+# Create a default cache for convenience
+default_tts_cache = TTSCache(
+    os.getenv("TTS_CACHE_PATH", "./tts_cache"),
+    max_bytes=int(os.getenv("TTS_CACHE_MAX_MB", "512")) * 1024 * 1024,
+)
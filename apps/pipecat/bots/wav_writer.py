@@ -0,0 +1,106 @@
+import asyncio
+import os
+import wave
+from typing import List, Optional
+
+from loguru import logger
+
+
+class StreamingWavWriter:
+    """Writes PCM to a WAV file as it arrives instead of buffering the whole utterance.
+
+    `write` only queues the chunk; a background task appends everything queued since
+    its last pass to the file from a worker thread. The `wave` module writes the
+    header on the first write and patches the sizes in it on `close`, so memory use
+    stays flat however long the recording is.
+    """
+
+    def __init__(self, path: str, *, sample_rate: int, num_channels: int = 1, sample_width: int = 2):
+        self.path = path
+        self.bytes_written = 0
+        self._sample_rate = sample_rate
+        self._num_channels = num_channels
+        self._sample_width = sample_width
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._wave: Optional[wave.Wave_write] = None
+        self._task: Optional[asyncio.Task] = None
+        self._format_fixed = False
+
+    @property
+    def sample_rate(self) -> int:
+        return self._sample_rate
+
+    @property
+    def num_channels(self) -> int:
+        return self._num_channels
+
+    @property
+    def has_audio(self) -> bool:
+        return self._format_fixed
+
+    @property
+    def duration_secs(self) -> float:
+        return self.bytes_written / (self._sample_rate * self._num_channels * self._sample_width)
+
+    async def open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._wave = await asyncio.to_thread(wave.open, self.path, "wb")
+        self._task = asyncio.create_task(self._writer())
+
+    def set_format(self, sample_rate: int, num_channels: int):
+        """Adopt the format of the audio actually received. Ignored after the first write."""
+        if not self._format_fixed:
+            self._sample_rate = sample_rate
+            self._num_channels = num_channels
+
+    def write(self, audio: bytes):
+        if self._task is None:
+            raise RuntimeError("StreamingWavWriter is not open")
+        if audio:
+            self._format_fixed = True
+            self._queue.put_nowait(audio)
+
+    async def close(self):
+        """Flush queued audio, patch the header and close the file."""
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+        await asyncio.to_thread(self._close_wave)
+        logger.debug(f"Saved {self.duration_secs:.1f}s of audio to {self.path}")
+
+    async def discard(self):
+        """Close and delete the file, e.g. when nothing was recorded."""
+        await self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _set_params(self):
+        self._wave.setsampwidth(self._sample_width)
+        self._wave.setnchannels(self._num_channels)
+        self._wave.setframerate(self._sample_rate)
+
+    def _write_batch(self, batch: List[bytes]):
+        if self.bytes_written == 0:
+            self._set_params()
+        self._wave.writeframesraw(b"".join(batch))
+
+    def _close_wave(self):
+        if self.bytes_written == 0:
+            # The header of an empty file still needs a format
+            self._set_params()
+        self._wave.close()
+
+    async def _writer(self):
+        done = False
+        while not done:
+            batch = [await self._queue.get()]
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            if batch[-1] is None:
+                batch.pop()
+                done = True
+            if batch:
+                await asyncio.to_thread(self._write_batch, batch)
+                self.bytes_written += sum(len(chunk) for chunk in batch)
@@ -6,6 +6,7 @@ from typing import Awaitable, Callable
 
 import aiohttp
 from pipecat.audio.interruptions.min_words_interruption_strategy import MinWordsInterruptionStrategy
+from bots.connection_pool import MINIMAX_HTTP_URL, close_tts_pool, get_tts_pool
 from bots.types import BotCallbacks, BotConfig, BotParams
 from bots.webrtc.bot_error_pipeline import bot_error_pipeline_task
 from bots.webrtc.bot_pipeline import bot_pipeline
@@ -81,6 +82,9 @@ async def _bot_main(
     room_token: str,
 ):
     subprocess_session_factory = DatabaseSessionFactory()
+    # This process has its own pool: connect while the transport joins the room
+    if os.getenv("MINIMAX_API_KEY"):
+        get_tts_pool().keep_warm("minimax", MINIMAX_HTTP_URL)
     async with subprocess_session_factory() as db:
         bot_runner = BotPipelineRunner()
         try:
@@ -96,6 +100,7 @@ async def _bot_main(
         await _cleanup(room_url, config)
 
         logger.info("Bot has finished. Bye!")
+    await close_tts_pool()
     await subprocess_session_factory.engine.dispose()
 
 
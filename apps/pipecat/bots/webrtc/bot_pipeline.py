@@ -43,6 +43,7 @@ from pipecat.transports.services.daily import DailyParams, DailyTransport
 from pipecat.services.deepseek.llm import DeepSeekLLMService
 from pipecat.services.deepgram.stt import DeepgramSTTService
 from pipecat.services.deepgram.tts import DeepgramTTSService
+from bots.connection_pool import get_tts_pool
 from bots.minimax.tts import MiniMaxHttpTTSService, MiniMaxTTSService
 # from pipecat.services.cartesia.tts import CartesiaTTSService
 from bots.cartesia.tts import CartesiaTTSEmotionService
@@ -52,7 +53,12 @@ from bots.fish.tts import FishAudioTTSService
 from bots.hume.tts.HumeTTSService import HumeTTSService
 from bots.intake_processor import IntakeProcessor
 from bots.emotion_processor import EmotionProcessor
-import aiohttp
+from bots.tts_cache import default_tts_cache, normalize_text, with_tts_cache
+
+IDLE_GOODBYE_PROMPT = "It seems like you're busy right now. Have a nice day!"
+# Texts the bot speaks verbatim, as opposed to LLM output
+IDLE_PROMPTS = {normalize_text(IDLE_GOODBYE_PROMPT)}
+
 
 def extract_role_and_text(msg):
     role = getattr(msg, "role", "")
@@ -136,14 +142,27 @@ def get_main_service(params: BotParams, minimax_session=None):
             voice_id="Aoede",
             params=InputParams(modalities=GeminiMultimodalModalities.TEXT),
         )
-        tts = MiniMaxHttpTTSService(
-            api_key=os.getenv("MINIMAX_API_KEY"),
-            group_id=os.getenv("MINIMAX_GROUP_ID"),
-            model="speech-01-turbo",
-            voice_id="Chinese (Mandarin)_Cute_Spirit",
-            sample_rate=24000,
-            params=MiniMaxHttpTTSService.InputParams(language=Language.ZH),
-        )
+        if bool(int(os.getenv("MINIMAX_TTS_PIPELINED", "0"))):
+            # WebSocket sessions: the next sentence is sent while the previous one plays
+            tts = MiniMaxTTSService(
+                api_key=os.getenv("MINIMAX_API_KEY"),
+                group_id=os.getenv("MINIMAX_GROUP_ID"),
+                model="speech-01-turbo",
+                voice_id="Chinese (Mandarin)_Cute_Spirit",
+                sample_rate=24000,
+                pipelined=True,
+                params=MiniMaxTTSService.InputParams(language=Language.ZH),
+            )
+        else:
+            tts = MiniMaxHttpTTSService(
+                api_key=os.getenv("MINIMAX_API_KEY"),
+                group_id=os.getenv("MINIMAX_GROUP_ID"),
+                model="speech-01-turbo",
+                voice_id="Chinese (Mandarin)_Cute_Spirit",
+                sample_rate=24000,
+                aiohttp_session=minimax_session,
+                params=MiniMaxHttpTTSService.InputParams(language=Language.ZH),
+            )
     elif model == "gemini2_fish":
         llm_rt = GeminiMultimodalLiveLLMService(
             api_key=str(SERVICE_API_KEYS["gemini"]),
@@ -236,15 +255,16 @@ async def bot_pipeline(
     messages = [getattr(msg, "content") for msg in conversation.messages]
 
     if params.bot_model == "gemini2_minimax":
-        async with aiohttp.ClientSession() as minimax_session:
-            stt, llm_rt, tts = get_main_service(params, minimax_session)
-            return await _bot_pipeline_inner(params, config, callbacks, transport, stt, llm_rt, tts, db, messages)
+        stt, llm_rt, tts = get_main_service(params, get_tts_pool().http_session("minimax"))
     else:
         stt, llm_rt, tts = get_main_service(params)
-        return await _bot_pipeline_inner(params, config, callbacks, transport, stt, llm_rt, tts, db, messages)
+    return await _bot_pipeline_inner(params, config, callbacks, transport, stt, llm_rt, tts, db, messages)
 
 async def _bot_pipeline_inner(params, config, callbacks, transport, stt, llm_rt, tts, db, messages):
     tools = NOT_GIVEN  # todo: implement tools in and set here
+    if tts:
+        # Fixed prompts sound the same every time; only those are worth caching
+        tts = with_tts_cache(tts, default_tts_cache, only=lambda text: normalize_text(text) in IDLE_PROMPTS)
     context_rt = OpenAILLMContext(messages, tools)
 
     context_aggregator_rt = llm_rt.create_context_aggregator(context_rt)
@@ -253,7 +273,14 @@ async def _bot_pipeline_inner(params, config, callbacks, transport, stt, llm_rt,
 
     assistant_aggregator = context_aggregator_rt.assistant()
 
-    storage = PersistentContext(context=context_rt)
+    # Voice sessions append a slice per turn; coalesce them so a session commits a
+    # handful of times instead of once per turn.
+    storage = PersistentContext(
+        context=context_rt,
+        batch_window_secs=float(os.getenv("BOT_PERSIST_BATCH_SECS", "5")),
+        batch_max_items=int(os.getenv("BOT_PERSIST_BATCH_MAX_ITEMS", "20")),
+        max_queue_size=int(os.getenv("BOT_PERSIST_MAX_QUEUE_SIZE", "100")),
+    )
 
     intake = IntakeProcessor(context_rt)
     llm_rt.register_function("greet_and_ask_mood", intake.greet_and_ask_mood)
@@ -294,7 +321,7 @@ async def _bot_pipeline_inner(params, config, callbacks, transport, stt, llm_rt,
         else:
             # Third attempt: End the conversation
             await user_idle.push_frame(
-                TTSSpeakFrame("It seems like you're busy right now. Have a nice day!")
+                TTSSpeakFrame(IDLE_GOODBYE_PROMPT)
             )
             # await task.queue_frame(EndFrame())
             return False
@@ -12,6 +12,7 @@ from pipecat.frames.frames import (
 from pipecat.serializers.protobuf import ProtobufFrameSerializer
 from pipecat.processors.frameworks.rtvi import RTVIConfig, RTVIObserver, RTVIProcessor
 from pipecat.services.ai_services import OpenAILLMContext
+from bots.connection_pool import get_tts_pool
 from bots.minimax.tts import MiniMaxHttpTTSService, MiniMaxTTSService
 from pipecat.services.deepseek.llm import DeepSeekLLMService
 from pipecat.transcriptions.language import Language
@@ -53,6 +54,7 @@ async def ws_bot_pipeline(websocket_client):
         model="speech-01-turbo",
         voice_id="Chinese (Mandarin)_Cute_Spirit",
         sample_rate=24000,
+        aiohttp_session=get_tts_pool().http_session("minimax"),
         params=MiniMaxHttpTTSService.InputParams(language=Language.ZH),
     )
     rtvi = RTVIProcessor(config=RTVIConfig(config=[]))
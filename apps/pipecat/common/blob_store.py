@@ -0,0 +1,150 @@
+import asyncio
+import base64
+import hashlib
+import os
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+import aiofiles
+import aiofiles.os
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+
+
+class BlobTooLargeError(Exception):
+    pass
+
+
+@dataclass
+class BlobInfo:
+    digest: str
+    size: int
+
+
+class BlobStore(ABC):
+    """Content-addressed storage for binary payloads, keyed by SHA-256 hex digest."""
+
+    @abstractmethod
+    async def put_stream(
+        self, chunks: AsyncIterator[bytes], max_size: Optional[int] = None
+    ) -> BlobInfo:
+        pass
+
+    @abstractmethod
+    async def get(self, digest: str) -> bytes:
+        pass
+
+    @abstractmethod
+    async def exists(self, digest: str) -> bool:
+        pass
+
+    @abstractmethod
+    async def delete(self, digest: str):
+        pass
+
+    async def put(self, data: bytes) -> BlobInfo:
+        """Store a payload that is already in memory."""
+
+        async def once():
+            yield data
+
+        return await self.put_stream(once())
+
+
+class LocalBlobStore(BlobStore):
+    """Blob store backed by a local directory.
+
+    Blobs live at `<root>/<digest[:2]>/<digest[2:4]>/<digest>`. Uploads stream into a
+    temporary file while being hashed and are renamed into place once complete, so a
+    blob that already exists is simply not written again.
+    """
+
+    def __init__(self, root: str, *, data_url_cache_bytes: int = 64 * 1024 * 1024):
+        self._root = root
+        # base64 payloads are only built when a pipeline asks for a data URL, and the
+        # most recently used ones are kept so a multi-turn session doesn't re-encode.
+        self._data_url_cache: "OrderedDict[str, str]" = OrderedDict()
+        self._data_url_cache_bytes = data_url_cache_bytes
+        self._data_url_cache_size = 0
+
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self._root, digest[:2], digest[2:4], digest)
+
+    async def put_stream(
+        self, chunks: AsyncIterator[bytes], max_size: Optional[int] = None
+    ) -> BlobInfo:
+        tmp_dir = os.path.join(self._root, "tmp")
+        await aiofiles.os.makedirs(tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+
+        sha256 = hashlib.sha256()
+        size = 0
+        try:
+            async with aiofiles.open(tmp_path, "wb") as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if max_size is not None and size > max_size:
+                        raise BlobTooLargeError(f"Blob exceeds {max_size} bytes")
+                    sha256.update(chunk)
+                    await f.write(chunk)
+
+            digest = sha256.hexdigest()
+            path = self.path_for(digest)
+            if await aiofiles.os.path.exists(path):
+                logger.debug(f"Blob {digest} already stored, skipping write")
+                await aiofiles.os.remove(tmp_path)
+            else:
+                await aiofiles.os.makedirs(os.path.dirname(path), exist_ok=True)
+                await aiofiles.os.replace(tmp_path, path)
+            return BlobInfo(digest=digest, size=size)
+        except BaseException:
+            if await aiofiles.os.path.exists(tmp_path):
+                await aiofiles.os.remove(tmp_path)
+            raise
+
+    async def get(self, digest: str) -> bytes:
+        async with aiofiles.open(self.path_for(digest), "rb") as f:
+            return await f.read()
+
+    async def exists(self, digest: str) -> bool:
+        return await aiofiles.os.path.exists(self.path_for(digest))
+
+    async def delete(self, digest: str):
+        self._data_url_cache.pop(digest, None)
+        if await self.exists(digest):
+            await aiofiles.os.remove(self.path_for(digest))
+
+    async def data_url(self, digest: str, mime_type: str) -> str:
+        """Return the blob as a `data:` URL, encoding it on first use."""
+        encoded = self._data_url_cache.get(digest)
+        if encoded is None:
+            data = await self.get(digest)
+            encoded = await asyncio.to_thread(lambda: base64.b64encode(data).decode("ascii"))
+            self._cache_data_url(digest, encoded)
+        else:
+            self._data_url_cache.move_to_end(digest)
+        return f"data:{mime_type};base64,{encoded}"
+
+    def _cache_data_url(self, digest: str, encoded: str):
+        if len(encoded) > self._data_url_cache_bytes:
+            return
+        self._data_url_cache[digest] = encoded
+        self._data_url_cache_size += len(encoded)
+        while self._data_url_cache_size > self._data_url_cache_bytes:
+            _, evicted = self._data_url_cache.popitem(last=False)
+            self._data_url_cache_size -= len(evicted)
+
+
+async def iter_upload(file, chunk_size: int = 1024 * 1024) -> AsyncIterator[bytes]:
+    """Read a FastAPI `UploadFile` in chunks instead of loading it into memory."""
+    while chunk := await file.read(chunk_size):
+        yield chunk
+
+
+# Create a default blob store for convenience
+default_blob_store = LocalBlobStore(os.getenv("BLOB_STORE_PATH", "./attachments"))
@@ -1,15 +1,89 @@
+import base64
 import os
 from contextlib import asynccontextmanager
 
-from common.models import Base
+from common.blob_store import BlobStore, default_blob_store
+from common.models import Attachment, Base
 from dotenv import load_dotenv
 from loguru import logger
+from sqlalchemy import inspect, text
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, async_sessionmaker, create_async_engine
 
 load_dotenv()
 
 
+def _table_columns(conn, table_name: str) -> set:
+    inspector = inspect(conn)
+    if not inspector.has_table(table_name):
+        return set()
+    return {column["name"] for column in inspector.get_columns(table_name)}
+
+
+def _add_missing_columns(conn):
+    """Add model columns that tables created by an older version lack.
+
+    `create_all` only creates missing tables. SQLite can only add a column without a
+    NOT NULL constraint, so columns added this way are nullable and the models treat
+    NULL as "written before the column existed".
+    """
+    for table in Base.metadata.sorted_tables:
+        existing = _table_columns(conn, table.name)
+        if not existing:
+            continue
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+            logger.info(f"Added column {table.name}.{column.name}")
+
+
+async def _migrate_legacy_attachments(conn: AsyncConnection, blob_store: BlobStore):
+    """Move attachments stored inline as base64 `file_data` into the blob store.
+
+    The table is rebuilt rather than altered because SQLite cannot drop the legacy
+    NOT NULL `file_data` column, which new rows no longer fill. Blobs are
+    content-addressed, so a migration that fails half way is simply run again.
+    """
+    if "file_data" not in await conn.run_sync(_table_columns, "attachments"):
+        return
+
+    result = await conn.execute(
+        text("SELECT attachment_id, message_id, file_data, file_type, created_at FROM attachments")
+    )
+    rows = []
+    for attachment_id, message_id, file_data, file_type, created_at in result.all():
+        blob = await blob_store.put(base64.b64decode(file_data or ""))
+        rows.append(
+            {
+                "attachment_id": attachment_id,
+                "message_id": message_id,
+                "digest": blob.digest,
+                "file_size": blob.size,
+                "file_type": file_type,
+                "created_at": created_at,
+            }
+        )
+
+    await conn.execute(text("ALTER TABLE attachments RENAME TO attachments_legacy"))
+    # Index names are global in SQLite and would clash with the new table's
+    await conn.execute(text("DROP INDEX IF EXISTS idx_attachments_message_id"))
+    await conn.run_sync(Attachment.__table__.create)
+    if rows:
+        # Raw SQL keeps created_at as the text the legacy table stored
+        await conn.execute(
+            text(
+                "INSERT INTO attachments "
+                "(attachment_id, message_id, digest, file_size, file_type, created_at) "
+                "VALUES (:attachment_id, :message_id, :digest, :file_size, :file_type, :created_at)"
+            ),
+            rows,
+        )
+    await conn.execute(text("DROP TABLE attachments_legacy"))
+    logger.info(f"Moved {len(rows)} inline attachments to the blob store")
+
+
 class DatabaseSessionFactory:
     _instance: "DatabaseSessionFactory | None" = None
     _engine: AsyncEngine | None = None
@@ -40,10 +114,13 @@ class DatabaseSessionFactory:
             raise RuntimeError("Engine not initialized")
         return self._engine
 
-    async def initialize_schema(self):
-        """Initialize the database schema from SQLAlchemy models"""
+    async def initialize_schema(self, blob_store: BlobStore = default_blob_store):
+        """Initialize the database schema from SQLAlchemy models, upgrading tables
+        created by older versions"""
         async with self.engine.begin() as conn:
+            await _migrate_legacy_attachments(conn, blob_store)
             await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(_add_missing_columns)
             logger.debug("SQLite schema applied")
 
     @asynccontextmanager
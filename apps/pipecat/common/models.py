@@ -1,3 +1,4 @@
+import json
 import uuid
 from datetime import datetime
 from typing import Any, List, Optional
@@ -9,20 +10,22 @@ from sqlalchemy import (
     TIMESTAMP,
     Boolean,
     Column,
+    Float,
     ForeignKey,
     Index,
     Integer,
     String,
     func,
     select,
+    update,
 )
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import (
     Mapped,
     declarative_base,
-    joinedload,
     mapped_column,
     relationship,
+    selectinload,
 )
 
 Base = declarative_base()
@@ -38,6 +41,10 @@ class Conversation(Base):
     conversation_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     title: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
     archived = Column(Boolean, default=False)
+    # Next message_number to hand out. Bumped atomically by Message.allocate_message_numbers so
+    # concurrent writers never race on idx_messages_conversation_number. NULL on rows created
+    # before the column existed; those are reconciled from max(message_number) on first use.
+    next_message_number = Column(Integer, nullable=True, default=1)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.datetime("now"))
     updated_at = Column(
         TIMESTAMP(timezone=True),
@@ -45,13 +52,24 @@ class Conversation(Base):
         onupdate=func.datetime("now"),
     )
 
-    messages: Mapped[List["Message"]] = relationship("Message", back_populates="conversation")
+    messages: Mapped[List["Message"]] = relationship(
+        "Message", back_populates="conversation", order_by="Message.message_number"
+    )
+
+    __table_args__ = (
+        Index(
+            "idx_conversations_archived_updated",
+            "archived",
+            "updated_at",
+            "conversation_id",
+        ),
+    )
 
     @classmethod
     async def get_conversation_by_id(cls, conversation_id: str, db: AsyncSession):
         result = await db.execute(
             select(Conversation)
-            .options(joinedload(Conversation.messages))
+            .options(selectinload(Conversation.messages))
             .where(Conversation.conversation_id == conversation_id)
         )
         return result.scalars().first()
@@ -100,6 +118,37 @@ class Message(Base):
         )
         return max_message_number_result.scalar_one()
 
+    @staticmethod
+    async def allocate_message_numbers(
+        db_session: AsyncSession, conversation_id: str, count: int = 1
+    ) -> int:
+        """Reserve `count` consecutive message numbers and return the first one.
+
+        The counter lives on the conversation row and is bumped with a single
+        UPDATE ... RETURNING, so the row lock serializes concurrent writers instead of
+        letting them collide on the unique (conversation_id, message_number) index.
+        Allocating is bookkeeping, not an edit: `updated_at` is left as it was, so the
+        conversation list keeps its order.
+        """
+        current = func.coalesce(
+            Conversation.next_message_number,
+            select(func.coalesce(func.max(Message.message_number), 0) + 1)
+            .where(Message.conversation_id == conversation_id)
+            .scalar_subquery(),
+        )
+        result = await db_session.execute(
+            update(Conversation)
+            .where(Conversation.conversation_id == conversation_id)
+            # Written explicitly so the column's onupdate does not fire
+            .values(next_message_number=current + count, updated_at=Conversation.updated_at)
+            .returning(Conversation.next_message_number)
+            .execution_options(synchronize_session=False)
+        )
+        next_message_number = result.scalar_one_or_none()
+        if next_message_number is None:
+            raise ValueError(f"Conversation {conversation_id} not found")
+        return next_message_number - count
+
     @staticmethod
     async def create_message(
         db_session: AsyncSession,
@@ -107,22 +156,22 @@ class Message(Base):
         content: dict,
         extra_metadata: Optional[dict] = None,
     ):
-        # Get the current maximum message_number for the conversation
-        max_message_number = await Message.get_max_message_number(db_session, conversation_id)
-
-        # Increment the message number
-        new_message_number = max_message_number + 1
+        message_number = await Message.allocate_message_numbers(db_session, conversation_id)
 
         # Create the new message
         new_message = Message(
             conversation_id=conversation_id,
             content=content,
-            message_number=new_message_number,
+            message_number=message_number,
             extra_metadata=extra_metadata,
         )
 
-        db_session.add(new_message)
-        await db_session.commit()
+        try:
+            db_session.add(new_message)
+            await db_session.commit()
+        except Exception as e:
+            await db_session.rollback()
+            raise e
         await db_session.refresh(new_message)
 
         return new_message
@@ -135,19 +184,22 @@ class Message(Base):
         messages: List[Any],
         language_code: str = "english",
     ):
+        if not messages:
+            return
         ms = []
-        # Get the current maximum message_number for the conversation (note: we increment
-        # this for each message, vs querying the DB each time.)
-        max_message_number = await Message.get_max_message_number(db_session, conversation_id)
-        for i, message_data in enumerate(messages, start=1):
-            m = Message(
-                conversation_id=conversation_id,
-                content=message_data,
-                language_code=language_code,
-                message_number=max_message_number + i,
-            )
-            ms.append(m)
         try:
+            # Reserve the whole range up front; the counter bump and the inserts commit together.
+            first_message_number = await Message.allocate_message_numbers(
+                db_session, conversation_id, len(messages)
+            )
+            for i, message_data in enumerate(messages):
+                m = Message(
+                    conversation_id=conversation_id,
+                    content=message_data,
+                    language_code=language_code,
+                    message_number=first_message_number + i,
+                )
+                ms.append(m)
             db_session.add_all(ms)
             await db_session.commit()
         except Exception as e:
@@ -164,13 +216,18 @@ class Attachment(Base):
         ForeignKey("messages.message_id", ondelete="CASCADE"),
         nullable=True,
     )
-    file_data = Column(String, nullable=False)
+    # The payload itself lives in the blob store (common/blob_store.py), keyed by digest.
+    digest = Column(String(64), nullable=False)
+    file_size = Column(Integer, nullable=False)
     file_type = Column(String(50), nullable=False)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.datetime("now"))
 
     message: Mapped["Message"] = relationship("Message", back_populates="attachments")
 
-    __table_args__ = (Index("idx_attachments_message_id", "message_id"),)
+    __table_args__ = (
+        Index("idx_attachments_message_id", "message_id"),
+        Index("idx_attachments_digest", "digest"),
+    )
 
     @classmethod
     async def get_attachments_by_ids(cls, db_session: AsyncSession, attachment_ids: List[str]):
@@ -181,6 +238,69 @@ class Attachment(Base):
         return result.scalars().all()
 
 
+class OutboxEvent(Base):
+    """Event waiting to be shipped to the message broker by common.outbox.OutboxDrainer."""
+
+    __tablename__ = "outbox_events"
+
+    event_id = Column(Integer, primary_key=True, autoincrement=True)
+    payload = Column(String, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.datetime("now"))
+
+    @classmethod
+    def add_event(cls, db_session: AsyncSession, payload: dict) -> "OutboxEvent":
+        """Stage an event in the session; it is stored when the caller commits, together
+        with whatever else was written in the same transaction."""
+        event = OutboxEvent(payload=json.dumps(payload))
+        db_session.add(event)
+        return event
+
+
+class Recording(Base):
+    """Index of synthesized speech recordings stored by common.recordings.RecordingStore."""
+
+    __tablename__ = "recordings"
+
+    recording_id = Column(String(32), primary_key=True)
+    # Path of the file relative to the recordings directory
+    path = Column(String, nullable=False)
+    kind = Column(String(20), nullable=False)
+    user_id = Column(String, nullable=True)
+    duration_secs = Column(Float, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    sample_rate = Column(Integer, nullable=False)
+    num_channels = Column(Integer, nullable=False, default=1)
+    # Full downloads, used by common.retention to keep popular recordings
+    download_count = Column(Integer, nullable=False, default=0)
+    last_accessed_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.datetime("now"))
+
+    __table_args__ = (
+        Index("idx_recordings_created_at", "created_at"),
+        Index("idx_recordings_user_id", "user_id"),
+    )
+
+    @classmethod
+    async def get_recording_by_id(cls, recording_id: str, db_session: AsyncSession):
+        result = await db_session.execute(
+            select(Recording).where(Recording.recording_id == recording_id)
+        )
+        return result.scalars().first()
+
+    @classmethod
+    async def record_download(cls, recording_id: str, db_session: AsyncSession):
+        await db_session.execute(
+            update(Recording)
+            .where(Recording.recording_id == recording_id)
+            .values(
+                download_count=Recording.download_count + 1,
+                last_accessed_at=func.datetime("now"),
+            )
+        )
+        await db_session.commit()
+
+
 # ==========================
 # Pydantic Models
 # ==========================
@@ -215,7 +335,8 @@ class ConversationUpdateModel(BaseModel):
 class AttachmentModel(BaseModel):
     attachment_id: uuid.UUID
     message_id: Optional[uuid.UUID] = None
-    file_data: str
+    digest: str
+    file_size: int
     file_type: str
     created_at: datetime
 
@@ -224,6 +345,8 @@ class AttachmentModel(BaseModel):
 
 class AttachmentUploadResponse(BaseModel):
     attachment_id: uuid.UUID
+    digest: str
+    file_size: int
     file_type: str
 
     model_config = {"from_attributes": True}
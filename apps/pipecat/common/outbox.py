@@ -0,0 +1,148 @@
+import asyncio
+from typing import Dict, Optional
+
+from common.database import DatabaseSessionFactory, default_session_factory
+from common.models import OutboxEvent
+from common.publisher import get_publisher
+from loguru import logger
+from sqlalchemy import delete, select, update
+
+
+class OutboxDrainer:
+    """Ships events from the `outbox_events` table to the broker.
+
+    Events are deleted only after the broker confirmed them, so delivery is
+    at-least-once: a crash between publishing and deleting re-sends the batch on the
+    next run. Call `notify()` after committing new events to drain immediately instead
+    of waiting for the next poll.
+
+    A publish that outlives `publish_timeout_secs` is not abandoned: its event stays in
+    flight, is left out of later batches so it is not published twice, and is settled
+    by whichever drain finds it finished.
+    """
+
+    def __init__(
+        self,
+        session_factory: DatabaseSessionFactory = default_session_factory,
+        *,
+        batch_size: int = 100,
+        poll_interval_secs: float = 2.0,
+        publish_timeout_secs: float = 10.0,
+    ):
+        self._session_factory = session_factory
+        self._batch_size = batch_size
+        self._poll_interval_secs = poll_interval_secs
+        self._publish_timeout_secs = publish_timeout_secs
+        self._wakeup = asyncio.Event()
+        # event_id -> publish still owned by the publisher
+        self._in_flight: Dict[int, asyncio.Future] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def notify(self):
+        self._wakeup.set()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Last attempt to hand over what is left; anything undelivered stays in the table
+        try:
+            await self.drain_once()
+        except Exception as e:
+            logger.warning(f"Final outbox drain failed: {e}")
+
+    async def drain_once(self) -> int:
+        """Publish one batch of pending events. Returns how many were delivered."""
+        async with self._session_factory() as db:
+            query = select(OutboxEvent.event_id, OutboxEvent.payload)
+            if self._in_flight:
+                query = query.where(OutboxEvent.event_id.notin_(list(self._in_flight)))
+            result = await db.execute(query.order_by(OutboxEvent.event_id).limit(self._batch_size))
+            events = result.all()
+
+        if events:
+            # No session is held while waiting on the broker, so writers are never blocked
+            publisher = get_publisher()
+            futures = []
+            for e in events:
+                future = asyncio.wrap_future(publisher.publish(e.payload))
+                self._in_flight[e.event_id] = future
+                futures.append(future)
+            # Unlike wait_for, wait does not cancel what is still pending at the timeout
+            _, pending = await asyncio.wait(futures, timeout=self._publish_timeout_secs)
+            if pending:
+                logger.warning(f"{len(pending)} outbox event(s) still waiting on the broker")
+        return await self._settle()
+
+    async def _settle(self) -> int:
+        """Delete the delivered in-flight events and count failed attempts on the others."""
+        done = {event_id: f for event_id, f in self._in_flight.items() if f.done()}
+        if not done:
+            return 0
+        for event_id in done:
+            del self._in_flight[event_id]
+        succeeded = {event_id: not f.cancelled() and f.exception() is None for event_id, f in done.items()}
+        delivered = [event_id for event_id, ok in succeeded.items() if ok]
+        failed = [event_id for event_id, ok in succeeded.items() if not ok]
+
+        async with self._session_factory() as db:
+            if delivered:
+                await db.execute(delete(OutboxEvent).where(OutboxEvent.event_id.in_(delivered)))
+            if failed:
+                logger.warning(f"{len(failed)} outbox event(s) not delivered, will retry")
+                await db.execute(
+                    update(OutboxEvent)
+                    .where(OutboxEvent.event_id.in_(failed))
+                    .values(attempts=OutboxEvent.attempts + 1)
+                )
+            await db.commit()
+        return len(delivered)
+
+    async def _run(self):
+        while True:
+            try:
+                delivered = await self.drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox drain failed: {e}")
+                delivered = 0
+
+            # A fully delivered batch means there is probably more waiting
+            if delivered >= self._batch_size:
+                continue
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._poll_interval_secs)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+async def publish_via_outbox(payload: dict, db=None):
+    """Store `payload` in the outbox and wake the drainer.
+
+    With `db`, the event is only staged: the caller commits it together with the rows it
+    describes and then calls `default_outbox_drainer.notify()`. Without it, the event is
+    committed in its own session.
+    """
+    if db is not None:
+        OutboxEvent.add_event(db, payload)
+    else:
+        async with default_session_factory() as session:
+            OutboxEvent.add_event(session, payload)
+            await session.commit()
+        default_outbox_drainer.notify()
+
+
+# Create a default drainer for convenience; started by the FastAPI lifespan
+default_outbox_drainer = OutboxDrainer()
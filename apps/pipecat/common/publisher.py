@@ -1,58 +1,329 @@
 # publisher.py
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+from typing import Deque, List, Optional, Tuple
+
 import pika
+from dotenv import load_dotenv
+from loguru import logger
+from pika.exceptions import AMQPError, NackError, UnroutableError
+
+load_dotenv()
+
+DEFAULT_BROKER_URL = "amqp://115.159.95.166"
+DEFAULT_QUEUE_NAME = "pipecat"
+
+
+class PublisherOverflowError(Exception):
+    pass
+
+
+class PublisherClosedError(Exception):
+    pass
+
+
+def _set_result(future: Future):
+    try:
+        future.set_result(None)
+    except InvalidStateError:
+        # Cancelled by the caller meanwhile; nobody is waiting for it
+        pass
+
+
+def _set_exception(future: Future, exc: BaseException):
+    try:
+        future.set_exception(exc)
+    except InvalidStateError:
+        pass
+
 
 class PublisherFactory:
-    _instance = None
-    _connection = None
-    _channel = None
-    _initialized = False
-
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(PublisherFactory, cls).__new__(cls)
-        return cls._instance
-
-    def __init__(self):
-        if self._initialized:
-            return
-        self._connection = pika.BlockingConnection(pika.ConnectionParameters("115.159.95.166"))
-        self._channel = self._connection.channel()
-        self._channel.queue_declare(queue="pipecat", durable=True)
-        self._initialized = True
+    """Publishes messages to RabbitMQ from a dedicated thread.
+
+    `publish` only appends to an in-memory buffer and returns a `Future` that resolves
+    once the broker confirms the message, so callers on the event loop never block on
+    the network. The publisher thread owns the pika connection and reconnects with
+    exponential backoff when the broker goes away. It takes up to `batch_size`
+    messages off the buffer at a time, but publishes them one by one, each waiting for
+    its own confirm, so every message still costs a broker round trip.
+
+    While the broker is unreachable, the messages taken are appended to `spool_path` (if
+    set) and their futures resolve; the spool is replayed ahead of new messages once a
+    connection is established again.
+
+    Nothing touches the network until the first message is published. Use
+    `get_publisher()` rather than constructing this directly.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        *,
+        queue: str = DEFAULT_QUEUE_NAME,
+        spool_path: Optional[str] = None,
+        max_buffer: int = 10000,
+        batch_size: int = 100,
+        max_backoff_secs: float = 30.0,
+    ):
+        self._url = url
+        self._queue = queue
+        self._spool_path = spool_path
+        self._max_buffer = max_buffer
+        self._batch_size = batch_size
+        self._max_backoff_secs = max_backoff_secs
+
+        self._buffer: Deque[Tuple[str, Future]] = deque()
+        self._cond = threading.Condition()
+        self._closing = False
+
+        self._connection = None
+        self._channel = None
+
+        self._thread = threading.Thread(target=self._run, name="publisher", daemon=True)
+        self._started = False
 
     @property
     def channel(self):
         return self._channel
 
-    def _ensure_connection(self):
-        if self._connection is None or self._connection.is_closed:
-            self._connection = pika.BlockingConnection(pika.ConnectionParameters("115.159.95.166"))
-        if self._channel is None or self._channel.is_closed:
-            self._channel = self._connection.channel()
-            self._channel.queue_declare(queue="pipecat", durable=True)
+    def publish(self, body: str) -> Future:
+        """Queue `body` for delivery. Never blocks on the broker.
+
+        If the buffer is full the oldest pending message is dropped and its future fails
+        with `PublisherOverflowError`.
+        """
+        future: Future = Future()
+        with self._cond:
+            if self._closing:
+                future.set_exception(PublisherClosedError("Publisher is closed"))
+                return future
+            if not self._started:
+                self._thread.start()
+                self._started = True
+            if len(self._buffer) >= self._max_buffer:
+                _, dropped = self._buffer.popleft()
+                _set_exception(dropped, PublisherOverflowError("Publisher buffer is full"))
+                logger.warning(f"Publisher buffer full ({self._max_buffer}), dropped oldest message")
+            self._buffer.append((body, future))
+            self._cond.notify()
+        return future
+
+    def close(self, timeout: float = 5.0):
+        """Stop accepting messages, flush what is buffered, and close the connection."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        if self._started:
+            self._thread.join(timeout)
+        with self._cond:
+            while self._buffer:
+                _, future = self._buffer.popleft()
+                _set_exception(future, PublisherClosedError("Publisher closed before delivery"))
+
+    #
+    # Publisher thread
+    #
+
+    def _connect(self):
+        self._connection = pika.BlockingConnection(pika.URLParameters(self._url))
+        self._channel = self._connection.channel()
+        self._channel.queue_declare(queue=self._queue, durable=True)
+        # Each basic_publish now waits for the broker's ack (or raises on nack)
+        self._channel.confirm_delivery()
+
+    def _disconnect(self):
+        try:
+            if self._connection and self._connection.is_open:
+                self._connection.close()
+        except AMQPError:
+            pass
+        self._connection = None
+        self._channel = None
+
+    def _is_connected(self) -> bool:
+        return bool(
+            self._connection
+            and self._connection.is_open
+            and self._channel
+            and self._channel.is_open
+        )
+
+    def _next_batch(self) -> Optional[List[Tuple[str, Future]]]:
+        with self._cond:
+            while not self._buffer and not self._closing:
+                # Wake up regularly so pika can service heartbeats
+                self._cond.wait(timeout=1.0)
+                if not self._buffer and self._is_connected():
+                    try:
+                        self._connection.process_data_events(time_limit=0)
+                    except AMQPError as e:
+                        # _run reconnects when the next message arrives
+                        logger.warning(f"Publisher lost idle broker connection: {e}")
+                        self._disconnect()
+            if not self._buffer:
+                return None
+            batch = []
+            while self._buffer and len(batch) < self._batch_size:
+                body, future = self._buffer.popleft()
+                # A cancelled message was given up on by its caller, who may send it again
+                if not future.cancelled():
+                    batch.append((body, future))
+            return batch
 
-    def publish(self, body: str):
-        self._ensure_connection()
+    def _requeue(self, batch: List[Tuple[str, Future]]):
+        with self._cond:
+            self._buffer.extendleft(reversed(batch))
+
+    def _backoff(self, attempt: int):
+        deadline = time.monotonic() + min(self._max_backoff_secs, 0.5 * (2**attempt))
+        with self._cond:
+            # New messages also notify the condition; only closing cuts the wait short
+            while not self._closing and time.monotonic() < deadline:
+                self._cond.wait(timeout=deadline - time.monotonic())
+
+    def _basic_publish(self, body: str):
         self._channel.basic_publish(
             exchange="",
-            routing_key="pipecat",
+            routing_key=self._queue,
             body=body,
-            properties=pika.BasicProperties(delivery_mode=2)
+            properties=pika.BasicProperties(delivery_mode=2),
         )
 
-    def close(self):
-        if self._connection:
-            self._connection.close()
+    def _spool(self, batch: List[Tuple[str, Future]]):
+        try:
+            with open(self._spool_path, "a", encoding="utf-8") as f:
+                for body, _ in batch:
+                    # One message per line; bodies are JSON so embedded newlines are escaped
+                    f.write(body.replace("\n", " ") + "\n")
+        except OSError as e:
+            logger.error(f"Publisher could not spool to {self._spool_path}: {e}")
+            self._requeue(batch)
+            return
+        for _, future in batch:
+            _set_result(future)
+        logger.warning(f"Broker unreachable, spooled {len(batch)} message(s) to {self._spool_path}")
+
+    def _replay_spool(self):
+        if not self._spool_path or not os.path.exists(self._spool_path):
+            return
+        with open(self._spool_path, "r", encoding="utf-8") as f:
+            bodies = [line.rstrip("\n") for line in f if line.strip()]
+        for i, body in enumerate(bodies):
+            try:
+                self._basic_publish(body)
+            except (NackError, UnroutableError) as e:
+                logger.error(f"Broker rejected spooled message: {e}")
+            except AMQPError:
+                # Keep whatever has not been delivered yet for the next connection
+                with open(self._spool_path, "w", encoding="utf-8") as f:
+                    f.writelines(b + "\n" for b in bodies[i:])
+                raise
+        os.remove(self._spool_path)
+        logger.info(f"Replayed {len(bodies)} spooled message(s)")
+
+    def _run(self):
+        attempt = 0
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            if not batch:
+                continue
+
+            try:
+                if not self._is_connected():
+                    self._disconnect()
+                    self._connect()
+                    logger.debug(f"Publisher connected to {self._queue} queue")
+                    attempt = 0
+                    self._replay_spool()
+            except AMQPError as e:
+                logger.warning(f"Publisher could not connect to broker: {e}")
+                self._disconnect()
+                if self._spool_path:
+                    self._spool(batch)
+                else:
+                    self._requeue(batch)
+                if self._closing:
+                    break
+                self._backoff(attempt)
+                attempt += 1
+                continue
+
+            for i, (body, future) in enumerate(batch):
+                try:
+                    self._basic_publish(body)
+                    _set_result(future)
+                except (NackError, UnroutableError) as e:
+                    logger.error(f"Broker rejected message: {e}")
+                    _set_exception(future, e)
+                except AMQPError as e:
+                    logger.warning(f"Publisher lost broker connection: {e}")
+                    self._disconnect()
+                    self._requeue(batch[i:])
+                    break
+
+        self._disconnect()
+
+
+class InMemoryPublisher:
+    """Stand-in for `PublisherFactory` that keeps published bodies in a list.
+
+    Also used when publishing is disabled (empty BROKER_URL), so callers never need to
+    check whether a broker is configured.
+    """
+
+    def __init__(self, *, keep_messages: bool = True):
+        self.messages: List[str] = []
+        self._keep_messages = keep_messages
+
+    @property
+    def channel(self):
+        return None
+
+    def publish(self, body: str) -> Future:
+        if self._keep_messages:
+            self.messages.append(body)
+        future: Future = Future()
+        future.set_result(None)
+        return future
+
+    def close(self, timeout: float = 5.0):
+        pass
+
+
+_publisher = None
+_publisher_pid = None
+
+
+def get_publisher():
+    """Return the process-wide publisher, creating it on first use.
 
-# 创建一个默认的 publisher 工厂实例
-default_publisher_factory = PublisherFactory()
+    Configured by BROKER_URL (an amqp:// URL; empty disables publishing), BROKER_QUEUE
+    and PUBLISHER_SPOOL_PATH. Bot processes are forked from the web app, and the
+    publisher thread does not survive a fork, so a new publisher is created per process.
+    """
+    global _publisher, _publisher_pid
+    if _publisher is None or _publisher_pid != os.getpid():
+        url = os.getenv("BROKER_URL", DEFAULT_BROKER_URL)
+        if url:
+            _publisher = PublisherFactory(
+                url,
+                queue=os.getenv("BROKER_QUEUE", DEFAULT_QUEUE_NAME),
+                spool_path=os.getenv("PUBLISHER_SPOOL_PATH") or None,
+            )
+        else:
+            logger.info("BROKER_URL is empty, publishing is disabled")
+            _publisher = InMemoryPublisher(keep_messages=False)
+        _publisher_pid = os.getpid()
+    return _publisher
 
-# channel.basic_publish(
-#     exchange="",
-#     routing_key="pipecat",
-#     body="Hello from Python!",
-#     properties=pika.BasicProperties(delivery_mode=2)  # 持久化消息
-# )
 
-# print(" [x] Sent")
-# connection.close()
+def close_publisher(timeout: float = 5.0):
+    global _publisher
+    if _publisher is not None and _publisher_pid == os.getpid():
+        _publisher.close(timeout)
+    _publisher = None
@@ -0,0 +1,103 @@
+import os
+import uuid
+from typing import Optional
+
+import aiofiles.os
+from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from common.database import default_session_factory
+from common.models import Recording
+
+load_dotenv()
+
+
+class RecordingStore:
+    """Where synthesized speech recordings live on disk.
+
+    Each recording gets a random id and is stored at `<root>/<id[:2]>/<id>.wav`, so
+    concurrent requests never share a file and no directory grows without bound.
+    The `recordings` table indexes them with their format, duration and size.
+    Recordings made before ids existed were named after the second they were made
+    (`<root>/<name>_conversation_recording.wav`) and are still found by `resolve`.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def is_valid_name(name: str) -> bool:
+        """Whether `name` is safe to use as part of a path under the root."""
+        return bool(name) and os.path.basename(name) == name and not name.startswith(".")
+
+    def relative_path_for(self, recording_id: str) -> str:
+        return os.path.join(recording_id[:2], f"{recording_id}.wav")
+
+    def path_for(self, recording_id: str) -> str:
+        return os.path.join(self.root, self.relative_path_for(recording_id))
+
+    def absolute(self, relative_path: str) -> str:
+        return os.path.join(self.root, relative_path)
+
+    def legacy_path_for(self, name: str) -> str:
+        return os.path.join(self.root, f"{name}_conversation_recording.wav")
+
+    async def resolve(self, name: str, db: AsyncSession) -> Optional[str]:
+        """Return the path of the recording called `name`, or None if there is none.
+
+        Args:
+            name: A recording id, or the name of a recording from before ids existed.
+            db: Session used to look the recording up.
+        """
+        if not self.is_valid_name(name):
+            return None
+        recording = await Recording.get_recording_by_id(name, db)
+        if recording is not None:
+            path = self.absolute(recording.path)
+        else:
+            path = self.legacy_path_for(name)
+        return path if await aiofiles.os.path.exists(path) else None
+
+    async def save(
+        self,
+        recording_id: str,
+        *,
+        kind: str,
+        duration_secs: float,
+        sample_rate: int,
+        num_channels: int = 1,
+        user_id: Optional[str] = None,
+        db: Optional[AsyncSession] = None,
+    ) -> Recording:
+        """Index a recording written to `path_for(recording_id)`.
+
+        With `db`, the row is only staged and the caller commits it, e.g. together with
+        an outbox event announcing the recording. Without it, it is committed in its
+        own session.
+        """
+        relative_path = self.relative_path_for(recording_id)
+        recording = Recording(
+            recording_id=recording_id,
+            path=relative_path,
+            kind=kind,
+            user_id=user_id,
+            duration_secs=duration_secs,
+            size_bytes=await aiofiles.os.path.getsize(self.absolute(relative_path)),
+            sample_rate=sample_rate,
+            num_channels=num_channels,
+        )
+        if db is not None:
+            db.add(recording)
+        else:
+            async with default_session_factory() as session:
+                session.add(recording)
+                await session.commit()
+        return recording
+
+
+# Create a default store for convenience
+default_recording_store = RecordingStore(os.getenv("RECORDINGS_PATH", "./recordings"))
@@ -0,0 +1,382 @@
+"""Retention for the recordings directory.
+
+Every TTS request leaves a recording behind. `RetentionService` bounds what they
+cost on disk: recordings are deleted past an age limit or when a size quota is
+exceeded, popular ones being kept longest, and cold WAVs can be compacted to Opus.
+Runs periodically from the FastAPI lifespan, or once with `sesame.py retention`.
+"""
+
+import asyncio
+import glob
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional
+
+from dotenv import load_dotenv
+from loguru import logger
+from sqlalchemy import case, delete, func, select, update
+
+from common.database import DatabaseSessionFactory, default_session_factory
+from common.models import Recording
+from common.recordings import RecordingStore, default_recording_store
+from common.transcode import AUDIO_FORMATS, TranscodeError, ensure_encoded
+
+load_dotenv()
+
+
+@dataclass
+class RetentionPolicy:
+    # Recordings older than this are deleted, unless popular and used within that
+    # time; None keeps them
+    max_age_days: Optional[float] = 30
+    # Total size of the indexed recordings; the least valuable go first; None disables
+    max_total_bytes: Optional[int] = None
+    # Recordings downloaded at least this often are popular: they survive the age
+    # limit and are evicted after everything else
+    popular_min_downloads: int = 3
+    # Not accessed for this long, WAVs are replaced by Opus; None disables
+    compact_after_days: Optional[float] = None
+    # Encoded copies made for downloads are removed this long after being made
+    derived_ttl_days: float = 7
+    # Shard files no row refers to (interrupted writes) go after this long
+    untracked_grace_days: float = 1
+    # Upper bound on recordings deleted or compacted per run
+    batch_size: int = 500
+
+
+class _LegacyFile(NamedTuple):
+    """A recording from before ids, `<name>_conversation_recording.*` in the root."""
+
+    path: str
+    size_bytes: int
+    mtime: float
+
+
+@dataclass
+class RetentionReport:
+    deleted: int = 0
+    deleted_ids: List[str] = field(default_factory=list)
+    freed_bytes: int = 0
+    # Part of `freed_bytes` from recordings from before ids
+    legacy_freed_bytes: int = 0
+    compacted: int = 0
+    untracked_deleted: int = 0
+    errors: List[str] = field(default_factory=list)
+
+
+class RetentionService:
+    """Applies a `RetentionPolicy` to the recordings, once or every `interval_secs`.
+
+    Eviction order is cache-aware: recordings that are not popular go before popular
+    ones, and within each group the one accessed (or, never accessed, created) longest
+    ago goes first. Rows are deleted before their files, so a failed unlink leaves an
+    untracked file for a later run rather than a row pointing at nothing.
+
+    Recordings from before ids have no row but are still downloadable. They count
+    towards the age limit and the quota like the others, by modification time and as
+    never downloaded.
+    """
+
+    def __init__(
+        self,
+        policy: RetentionPolicy,
+        *,
+        store: RecordingStore = default_recording_store,
+        session_factory: DatabaseSessionFactory = default_session_factory,
+        interval_secs: float = 3600.0,
+    ):
+        self.policy = policy
+        self._store = store
+        self._session_factory = session_factory
+        self._interval_secs = interval_secs
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                report = await self.run_once()
+                if report.deleted or report.compacted or report.untracked_deleted:
+                    logger.info(
+                        f"Recordings retention: deleted {report.deleted} "
+                        f"({report.freed_bytes / 1e6:.1f} MB), compacted {report.compacted}, "
+                        f"removed {report.untracked_deleted} untracked files"
+                    )
+            except Exception as e:
+                logger.error(f"Recordings retention failed: {e}")
+            await asyncio.sleep(self._interval_secs)
+
+    async def run_once(self, *, dry_run: bool = False) -> RetentionReport:
+        """Apply the policy once.
+
+        Args:
+            dry_run: Only report what would be deleted; nothing is changed or compacted.
+        """
+        report = RetentionReport()
+        legacy = await asyncio.to_thread(self._list_legacy_files)
+        legacy = await self._expire(legacy, report, dry_run)
+        await self._enforce_quota(legacy, report, dry_run)
+        if not dry_run:
+            await self._compact(report)
+        await self._sweep_untracked(report, dry_run)
+        return report
+
+    @staticmethod
+    def _last_used():
+        return func.coalesce(Recording.last_accessed_at, Recording.created_at)
+
+    def _is_popular(self):
+        return Recording.download_count >= self.policy.popular_min_downloads
+
+    async def _expire(
+        self, legacy: List[_LegacyFile], report: RetentionReport, dry_run: bool
+    ) -> List[_LegacyFile]:
+        """Delete recordings past the age limit. Returns the legacy files left."""
+        if self.policy.max_age_days is None:
+            return legacy
+        expired_before = time.time() - self.policy.max_age_days * 86400
+        expired = [f for f in legacy if f.mtime < expired_before][: self.policy.batch_size]
+        await self._delete_legacy(expired, report, dry_run)
+
+        cutoff = _days_ago(self.policy.max_age_days)
+        async with self._session_factory() as db:
+            result = await db.execute(
+                select(Recording.recording_id, Recording.path, Recording.size_bytes)
+                .where(func.datetime(Recording.created_at) < cutoff)
+                .where(~(self._is_popular() & (func.datetime(self._last_used()) >= cutoff)))
+                .order_by(Recording.created_at)
+                .limit(self.policy.batch_size)
+            )
+            rows = result.all()
+        await self._delete(rows, report, dry_run)
+        return [f for f in legacy if f not in expired]
+
+    async def _enforce_quota(self, legacy: List[_LegacyFile], report: RetentionReport, dry_run: bool):
+        if self.policy.max_total_bytes is None:
+            return
+        async with self._session_factory() as db:
+            total = (await db.execute(select(func.coalesce(func.sum(Recording.size_bytes), 0)))).scalar()
+            total += sum(f.size_bytes for f in legacy)
+            if dry_run:
+                # Nothing was deleted by the previous steps; expired legacy files are
+                # already left out of `legacy`
+                total -= report.freed_bytes - report.legacy_freed_bytes
+            excess = total - self.policy.max_total_bytes
+            if excess <= 0:
+                return
+            result = await db.execute(
+                select(
+                    Recording.recording_id,
+                    Recording.path,
+                    Recording.size_bytes,
+                    self._is_popular().label("popular"),
+                    self._last_used().label("last_used"),
+                )
+                .order_by(case((self._is_popular(), 1), else_=0), self._last_used())
+                .limit(self.policy.batch_size + len(report.deleted_ids))
+            )
+            planned = set(report.deleted_ids)
+            candidates = [
+                (bool(row.popular), _as_timestamp(row.last_used), row)
+                for row in result.all()
+                if row.recording_id not in planned
+            ]
+        # Legacy files are never downloaded through the index, hence never popular
+        candidates += [(False, f.mtime, f) for f in legacy]
+        candidates.sort(key=lambda candidate: candidate[:2])
+
+        rows, files = [], []
+        for _, _, candidate in candidates[: self.policy.batch_size]:
+            if excess <= 0:
+                break
+            (files if isinstance(candidate, _LegacyFile) else rows).append(candidate)
+            excess -= candidate.size_bytes
+        await self._delete(rows, report, dry_run)
+        await self._delete_legacy(files, report, dry_run)
+
+    async def _delete_legacy(self, files: List[_LegacyFile], report: RetentionReport, dry_run: bool):
+        if not files:
+            return
+        if not dry_run:
+            for f in files:
+                try:
+                    await asyncio.to_thread(os.remove, f.path)
+                except OSError as e:
+                    report.errors.append(f"{f.path}: {e}")
+        report.deleted += len(files)
+        report.freed_bytes += sum(f.size_bytes for f in files)
+        report.legacy_freed_bytes += sum(f.size_bytes for f in files)
+
+    async def _delete(self, rows, report: RetentionReport, dry_run: bool):
+        if not rows:
+            return
+        if not dry_run:
+            async with self._session_factory() as db:
+                await db.execute(
+                    delete(Recording).where(Recording.recording_id.in_([row.recording_id for row in rows]))
+                )
+                await db.commit()
+            await asyncio.to_thread(self._unlink_recordings, [row.path for row in rows], report)
+        report.deleted += len(rows)
+        report.deleted_ids.extend(row.recording_id for row in rows)
+        report.freed_bytes += sum(row.size_bytes for row in rows)
+
+    def _unlink_recordings(self, paths: List[str], report: RetentionReport):
+        for path in paths:
+            # The recording and every encoded copy of it
+            stem = os.path.splitext(self._store.absolute(path))[0]
+            for file_path in glob.glob(f"{glob.escape(stem)}.*"):
+                try:
+                    os.remove(file_path)
+                except OSError as e:
+                    report.errors.append(f"{file_path}: {e}")
+
+    async def _compact(self, report: RetentionReport):
+        if self.policy.compact_after_days is None:
+            return
+        opus = AUDIO_FORMATS["opus"]
+        async with self._session_factory() as db:
+            result = await db.execute(
+                select(Recording.recording_id, Recording.path)
+                .where(Recording.path.like("%.wav"))
+                .where(func.datetime(self._last_used()) < _days_ago(self.policy.compact_after_days))
+                .order_by(self._last_used())
+                .limit(self.policy.batch_size)
+            )
+            rows = result.all()
+        for row in rows:
+            source = self._store.absolute(row.path)
+            try:
+                encoded = await ensure_encoded(source, opus)
+            except TranscodeError as e:
+                # Most likely ffmpeg is missing; the others would fail the same way
+                report.errors.append(str(e))
+                return
+            except FileNotFoundError as e:
+                report.errors.append(str(e))
+                continue
+            relative_path = os.path.relpath(encoded, self._store.root)
+            async with self._session_factory() as db:
+                await db.execute(
+                    update(Recording)
+                    .where(Recording.recording_id == row.recording_id)
+                    .values(path=relative_path, size_bytes=os.path.getsize(encoded))
+                )
+                await db.commit()
+            try:
+                await asyncio.to_thread(os.remove, source)
+            except OSError as e:
+                report.errors.append(f"{source}: {e}")
+            report.compacted += 1
+
+    async def _sweep_untracked(self, report: RetentionReport, dry_run: bool):
+        """Remove stale encoded copies and shard files that no row refers to."""
+        now = time.time()
+        untracked_before = now - self.policy.untracked_grace_days * 86400
+        derived_before = now - self.policy.derived_ttl_days * 86400
+        candidates = await asyncio.to_thread(
+            self._list_old_files, min(untracked_before, derived_before)
+        )
+        if not candidates:
+            return
+
+        tracked: Dict[str, str] = {}
+        ids = list({recording_id for recording_id, _, _ in candidates})
+        async with self._session_factory() as db:
+            for i in range(0, len(ids), 500):
+                result = await db.execute(
+                    select(Recording.recording_id, Recording.path).where(
+                        Recording.recording_id.in_(ids[i : i + 500])
+                    )
+                )
+                tracked.update((row.recording_id, self._store.absolute(row.path)) for row in result)
+
+        stale = []
+        for recording_id, path, mtime in candidates:
+            if recording_id in tracked:
+                if path != tracked[recording_id] and mtime < derived_before:
+                    stale.append(path)
+            elif mtime < untracked_before:
+                stale.append(path)
+        if not dry_run:
+            for path in stale:
+                try:
+                    await asyncio.to_thread(os.remove, path)
+                except OSError as e:
+                    report.errors.append(f"{path}: {e}")
+        report.untracked_deleted += len(stale)
+
+    def _list_old_files(self, before: float):
+        """(recording id, path, mtime) of the shard files older than `before`."""
+        files = []
+        if not os.path.isdir(self._store.root):
+            return files
+        for entry in os.scandir(self._store.root):
+            if entry.is_dir():
+                for shard_entry in os.scandir(entry.path):
+                    # Partial encodes (.tmp) count as copies of their recording
+                    if not shard_entry.is_file():
+                        continue
+                    mtime = shard_entry.stat().st_mtime
+                    if mtime < before:
+                        recording_id = shard_entry.name.split(".", 1)[0]
+                        files.append((recording_id, shard_entry.path, mtime))
+        return files
+
+    def _list_legacy_files(self) -> List[_LegacyFile]:
+        files = []
+        if not os.path.isdir(self._store.root):
+            return files
+        for entry in os.scandir(self._store.root):
+            if entry.is_file() and "_conversation_recording." in entry.name:
+                stat = entry.stat()
+                files.append(_LegacyFile(entry.path, stat.st_size, stat.st_mtime))
+        return files
+
+
+def _as_timestamp(value) -> float:
+    """Seconds since the epoch of a naive UTC datetime (or its string) from SQLite."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _days_ago(days: float):
+    return func.datetime("now", f"-{days * 86400:.0f} seconds")
+
+
+def _optional_float(name: str, default: Optional[str]) -> Optional[float]:
+    value = os.getenv(name, default)
+    return float(value) if value not in (None, "") else None
+
+
+def policy_from_env() -> RetentionPolicy:
+    max_total_mb = _optional_float("RECORDINGS_MAX_TOTAL_MB", None)
+    return RetentionPolicy(
+        max_age_days=_optional_float("RECORDINGS_MAX_AGE_DAYS", "30"),
+        max_total_bytes=int(max_total_mb * 1024 * 1024) if max_total_mb is not None else None,
+        popular_min_downloads=int(os.getenv("RECORDINGS_POPULAR_MIN_DOWNLOADS", "3")),
+        compact_after_days=_optional_float("RECORDINGS_COMPACT_AFTER_DAYS", None),
+    )
+
+
+# Create a default service for convenience; started by the FastAPI lifespan
+default_retention_service = RetentionService(
+    policy_from_env(),
+    interval_secs=float(os.getenv("RECORDINGS_RETENTION_INTERVAL_SECS", "3600")),
+)
@@ -0,0 +1,130 @@
+"""On-demand audio transcoding with ffmpeg.
+
+Recordings are stored as PCM WAV, which is about ten times larger than speech needs
+to be for playback. Encoded copies are produced the first time a format is asked for
+and kept next to the source, so each recording is only encoded once per format.
+"""
+
+import asyncio
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List
+
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+
+
+class TranscodeError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class AudioFormat:
+    extension: str
+    media_type: str
+    # ffmpeg output options
+    ffmpeg_args: List[str]
+
+
+AUDIO_FORMATS: Dict[str, AudioFormat] = {
+    # Only needed for recordings that were compacted to another format
+    "wav": AudioFormat("wav", "audio/wav", ["-c:a", "pcm_s16le"]),
+    "opus": AudioFormat(
+        "opus",
+        "audio/ogg; codecs=opus",
+        ["-c:a", "libopus", "-b:a", os.getenv("TRANSCODE_OPUS_BITRATE", "32k"), "-application", "voip"],
+    ),
+    "mp3": AudioFormat(
+        "mp3",
+        "audio/mpeg",
+        ["-c:a", "libmp3lame", "-b:a", os.getenv("TRANSCODE_MP3_BITRATE", "48k")],
+    ),
+}
+
+# One encode per output file at a time; concurrent requests wait for it
+_locks: Dict[str, asyncio.Lock] = {}
+
+
+def encoded_path(source: str, audio_format: AudioFormat) -> str:
+    """Where the encoded copy of `source` is kept."""
+    return f"{os.path.splitext(source)[0]}.{audio_format.extension}"
+
+
+def _is_fresh(path: str, source: str) -> bool:
+    try:
+        return os.stat(path).st_mtime_ns >= os.stat(source).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+async def ensure_encoded(source: str, audio_format: AudioFormat, *, timeout_secs: float = 60.0) -> str:
+    """Return the path of `source` in `audio_format`, encoding it on first use.
+
+    Args:
+        source: Path of the source audio file.
+        audio_format: The wanted format.
+        timeout_secs: How long ffmpeg may run before it is killed.
+
+    Returns:
+        The path of the encoded file, or `source` itself if it is in that format already.
+
+    Raises:
+        TranscodeError: If ffmpeg is missing, fails or times out.
+    """
+    if source.endswith(f".{audio_format.extension}"):
+        return source
+    target = encoded_path(source, audio_format)
+    if await asyncio.to_thread(_is_fresh, target, source):
+        return target
+
+    lock = _locks.setdefault(target, asyncio.Lock())
+    try:
+        async with lock:
+            if await asyncio.to_thread(_is_fresh, target, source):
+                return target
+            await _transcode(source, target, audio_format, timeout_secs)
+            return target
+    finally:
+        if not lock.locked():
+            _locks.pop(target, None)
+
+
+async def _transcode(source: str, target: str, audio_format: AudioFormat, timeout_secs: float):
+    # Encode next to the target and rename, so readers never see a partial file
+    tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+    command = [
+        FFMPEG_BINARY, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+        "-i", source, *audio_format.ffmpeg_args, "-f", _muxer(audio_format), tmp_path,
+    ]
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *command, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+        )
+    except FileNotFoundError as e:
+        raise TranscodeError(f"{FFMPEG_BINARY} is not installed") from e
+    try:
+        try:
+            _, stderr = await asyncio.wait_for(process.communicate(), timeout_secs)
+        except asyncio.TimeoutError as e:
+            process.kill()
+            await process.wait()
+            raise TranscodeError(f"Encoding {source} to {audio_format.extension} timed out") from e
+        if process.returncode != 0:
+            raise TranscodeError(
+                f"Encoding {source} to {audio_format.extension} failed: "
+                f"{stderr.decode(errors='replace').strip()}"
+            )
+        await asyncio.to_thread(os.replace, tmp_path, target)
+        logger.debug(f"Encoded {source} to {target}")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _muxer(audio_format: AudioFormat) -> str:
+    return "ogg" if audio_format.extension == "opus" else audio_format.extension
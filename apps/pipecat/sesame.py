@@ -7,7 +7,9 @@ from pathlib import Path
 from typing import Callable, Dict, Literal
 
 import typer
+from bots.summarize import backfill_conversation_titles
 from common.database import default_session_factory
+from common.retention import default_retention_service
 from dotenv import load_dotenv
 from rich.console import Console
 from rich.panel import Panel
@@ -311,6 +313,70 @@ def test_db(show_success_banner: bool = True):
         raise typer.Exit(1)
 
 
+# ========================
+# Recordings Retention
+# ========================
+@app.command()
+@require_env
+def retention(
+    dry_run: bool = typer.Option(False, "--dry-run", help="Only report what would be removed."),
+):
+    """Expire, evict and compact recordings according to the RECORDINGS_* settings."""
+    try:
+        load_dotenv(env_file)
+
+        async def _run_retention():
+            await default_session_factory.initialize_schema()
+            with console.status("[blue]Applying retention policy...", spinner="dots"):
+                report = await default_retention_service.run_once(dry_run=dry_run)
+            await default_session_factory.engine.dispose()
+            return report
+
+        report = asyncio.run(_run_retention())
+
+        table = Table(title="Recordings retention" + (" (dry run)" if dry_run else ""))
+        table.add_column("Action", style="blue")
+        table.add_column("Count", justify="right")
+        table.add_row("Deleted recordings", str(report.deleted))
+        table.add_row("Freed", f"{report.freed_bytes / 1e6:.1f} MB")
+        table.add_row("Compacted to Opus", str(report.compacted))
+        table.add_row("Removed untracked files", str(report.untracked_deleted))
+        console.print(table)
+        for error in report.errors:
+            console.print(f"  • {error}", style="yellow")
+
+    except Exception as e:
+        console.print(f"\n✗ Retention failed: {str(e)}", style="red bold")
+        raise typer.Exit(1)
+
+
+# ========================
+# Conversation Titles
+# ========================
+@app.command()
+@require_env
+def titles(
+    limit: int = typer.Option(100, "--limit", "-n", help="Maximum conversations to title."),
+):
+    """Title untitled conversations, several per LLM request."""
+    try:
+        load_dotenv(env_file)
+
+        async def _run_titles():
+            await default_session_factory.initialize_schema()
+            with console.status("[blue]Generating titles...", spinner="dots"):
+                titled = await backfill_conversation_titles(limit=limit)
+            await default_session_factory.engine.dispose()
+            return titled
+
+        titled = asyncio.run(_run_titles())
+        console.print(f"\n✓ Titled {titled} conversations", style="green bold")
+
+    except Exception as e:
+        console.print(f"\n✗ Titling failed: {str(e)}", style="red bold")
+        raise typer.Exit(1)
+
+
 # ========================
 # Run FastAPI App
 # ========================
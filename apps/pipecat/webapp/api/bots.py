@@ -1,4 +1,3 @@
-import os
 from typing import Any, Dict
 from bots.http.bot import http_bot_pipeline
 from bots.tts.tts_bot import tts_bot_pipeline
@@ -8,14 +7,16 @@ from bots.webrtc.bot import bot_create, bot_launch
 from bots.smallwebrtc.bot import smallwebrtc_bot_pipeline
 from common.config import DEFAULT_BOT_CONFIG, SERVICE_API_KEYS
 # from common.database import default_session_factory
-from common.models import Attachment, Conversation
+from common.models import Attachment, Conversation, Recording
+from common.recordings import default_recording_store
+from common.transcode import AUDIO_FORMATS, TranscodeError, ensure_encoded
 from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, Request, BackgroundTasks
-from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from loguru import logger
 from sqlalchemy.ext.asyncio import AsyncSession
 from webapp import get_db
+from webapp.media import media_file_response
 from bots.lesson.tts_bot import lesson_tts_bot_pipeline
-import aiohttp
 
 from pipecat.transports.network.webrtc_connection import IceServer, SmallWebRTCConnection
 
@@ -115,20 +116,60 @@ async def lesson_tts(
     params: BotParams,
 ) -> StreamingResponse:
     config = DEFAULT_BOT_CONFIG
-    session = aiohttp.ClientSession()
     async def generate():
-        gen, task = await lesson_tts_bot_pipeline(params, config, session)
+        gen, task = await lesson_tts_bot_pipeline(params, config)
         async for chunk in gen:
             yield chunk
         await task
     return StreamingResponse(generate(), media_type="text/event-stream")
 
-@router.get("/download")
-async def download_audio(filename: str):
-    file_path = os.path.join("recordings", f"{filename}_conversation_recording.wav")
-    if not os.path.exists(file_path):
+@router.api_route("/download", methods=["GET", "HEAD"])
+async def download_audio(
+    request: Request,
+    filename: str,
+    format: str = "wav",
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Download a TTS recording, optionally transcoded.
+
+    Args:
+        filename: The recording id sent to the client when synthesis finished, or the
+            name of a recording made before ids existed.
+        format: `wav` (the original), `opus` or `mp3`. Encoded copies are made on first
+            request and kept next to the recording.
+
+    Supports `Range` for seeking and `If-None-Match` against a content-hash ETag.
+    """
+    audio_format = AUDIO_FORMATS.get(format)
+    if audio_format is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported format {format}, expected one of {', '.join(AUDIO_FORMATS)}",
+        )
+    if not default_recording_store.is_valid_name(filename):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid filename")
+    file_path = await default_recording_store.resolve(filename, db)
+    if file_path is None:
         raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(file_path, media_type="audio/mpeg", filename=f"{filename}_conversation_recording.wav")
+    # Players fetch the rest of a file with further ranges; count each playback once
+    range_header = request.headers.get("range")
+    if request.method == "GET" and (not range_header or range_header.startswith("bytes=0-")):
+        await Recording.record_download(filename, db)
+    try:
+        file_path = await ensure_encoded(file_path, audio_format)
+    except TranscodeError as e:
+        logger.error(f"Could not transcode {filename}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"{format} is not available right now",
+        )
+    return await media_file_response(
+        request,
+        file_path,
+        audio_format.media_type,
+        filename=f"{filename}.{audio_format.extension}",
+    )
 
 @router.post("/connect", response_class=JSONResponse)
 async def connect(
@@ -1,7 +1,11 @@
 import base64
+import binascii
+import json
 import mimetypes
+from datetime import datetime
 
-from bots.summarize import generate_conversation_summary
+from bots.summarize import TITLE_MIN_MESSAGES, UNTITLED, generate_conversation_summary
+from common.blob_store import BlobTooLargeError, default_blob_store, iter_upload
 from common.config import DEFAULT_LLM_CONTEXT
 from common.models import (
     Attachment,
@@ -20,22 +24,62 @@ from fastapi import (
     Depends,
     File,
     HTTPException,
+    Response,
     UploadFile,
     status,
 )
 from pydantic import ValidationError
-from sqlalchemy import delete, select, update
+from sqlalchemy import delete, func, select, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
 from webapp import get_db
 
 router = APIRouter(prefix="/conversations")
 
 
+def _encode_cursor(*values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str, count: int) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != count:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def encode_conversation_cursor(conversation: Conversation) -> str:
+    return _encode_cursor(conversation.updated_at.isoformat(), conversation.conversation_id)
+
+
+def decode_conversation_cursor(cursor: str) -> tuple[datetime, str]:
+    updated_at, conversation_id = _decode_cursor(cursor, 2)
+    try:
+        return datetime.fromisoformat(updated_at), str(conversation_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def encode_message_cursor(conversation_id: str, message_number: int) -> str:
+    return _encode_cursor(conversation_id, message_number)
+
+
+def decode_message_cursor(cursor: str, conversation_id: str) -> int:
+    """The message_number of `cursor`, which must come from the same conversation."""
+    cursor_conversation_id, message_number = _decode_cursor(cursor, 2)
+    if cursor_conversation_id != conversation_id or type(message_number) is not int:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return message_number
+
+
 @router.get("", response_model=list[ConversationModel], name="Get Conversations")
 async def get_conversations(
+    response: Response,
     page: int = 1,
     per_page: int = 10,
+    cursor: str | None = None,
     archived: bool = False,
     q: str | None = None,
     db: AsyncSession = Depends(get_db),
@@ -43,9 +87,15 @@ async def get_conversations(
     """
     Retrieve a list of conversations with optional pagination and filtering.
 
+    Conversations are ordered by most recently updated. Pass the `X-Next-Cursor`
+    response header back as `cursor` to fetch the following page; this seeks on the
+    (archived, updated_at, conversation_id) index and stays fast however deep you page.
+    `page` is still honoured when no cursor is given.
+
     Args:
-        page (int): The page number for pagination. Defaults to 1.
+        page (int): The page number for offset pagination. Defaults to 1.
         per_page (int): The number of items per page for pagination. Defaults to 10.
+        cursor (str | None): Opaque cursor from a previous response's X-Next-Cursor header.
         archived (bool): Filter conversations by archived status. Defaults to False.
         q (str | None): Optional query parameter to search for a conversation by ID.
         db (AsyncSession): Database session dependency.
@@ -54,7 +104,7 @@ async def get_conversations(
         list[ConversationModel]: A list of conversation models.
 
     Raises:
-        HTTPException: If the page or per_page is less than 1.
+        HTTPException: If the page or per_page is less than 1, or the cursor is invalid.
         HTTPException: If a conversation with the specified ID is not found.
     """
     if page < 1:
@@ -71,19 +121,30 @@ async def get_conversations(
         else:
             raise HTTPException(status_code=404, detail="Conversation not found")
 
-    # Calculate offset
-    offset = (page - 1) * per_page
-
-    # Get paginated results
-    result = await db.execute(
+    query = (
         select(Conversation)
         .where(Conversation.archived == archived)
-        .order_by(Conversation.updated_at.desc())
-        .offset(offset)
-        .limit(per_page)
+        .order_by(Conversation.updated_at.desc(), Conversation.conversation_id.desc())
+        .limit(per_page + 1)
     )
+    if cursor:
+        updated_at, conversation_id = decode_conversation_cursor(cursor)
+        # datetime() normalizes the bound value to the "YYYY-MM-DD HH:MM:SS" text the
+        # column's server defaults store, so equal timestamps compare equal.
+        query = query.where(
+            tuple_(Conversation.updated_at, Conversation.conversation_id)
+            < tuple_(func.datetime(updated_at), conversation_id)
+        )
+    else:
+        query = query.offset((page - 1) * per_page)
+
+    result = await db.execute(query)
     conversations = result.scalars().all()
 
+    if len(conversations) > per_page:
+        conversations = conversations[:per_page]
+        response.headers["X-Next-Cursor"] = encode_conversation_cursor(conversations[-1])
+
     return [ConversationModel.model_validate(conv) for conv in conversations]
 
 
@@ -94,7 +155,7 @@ async def create_conversation(
 ):
     # Create new conversation
     new_convo = Conversation(
-        title=conversation.title or "New conversation",
+        title=conversation.title or UNTITLED,
     )
     db.add(new_convo)
 
@@ -183,31 +244,68 @@ async def update_conversation(
     return ConversationModel.model_validate(conversation)
 
 
+# Always returned with a field projection so clients can keep paging and ordering
+MESSAGE_INDEX_FIELDS = ("message_id", "message_number")
+
+
 @router.get(
     "/{conversation_id}/messages", response_model=dict, name="Get Conversation and Messages"
 )
 async def get_conversation_messages(
     conversation_id: str,
     background_tasks: BackgroundTasks,
+    limit: int | None = None,
+    before: str | None = None,
+    after: str | None = None,
+    fields: str | None = None,
     db: AsyncSession = Depends(get_db),
 ):
     """
     Retrieve a conversation and its associated messages by conversation ID.
 
+    Messages are returned in message_number order. Without `limit` the whole history is
+    returned. With `limit`, `before` returns the newest messages preceding a cursor
+    and `after` the oldest ones following it (the default is from the start);
+    `has_more` tells whether another page exists in that direction, and
+    `next_cursor`, passed back as the same parameter, fetches it.
+
     Args:
         conversation_id (str): The unique identifier of the conversation to retrieve.
+        limit (int | None): Maximum number of messages to return.
+        before (str | None): Opaque cursor from a previous `next_cursor`; only return
+            messages preceding it.
+        after (str | None): Opaque cursor from a previous `next_cursor`; only return
+            messages following it.
+        fields (str | None): Comma-separated message fields to return, e.g.
+            `message_number,created_at`. Only those columns are read, which skips the
+            `content`/`extra_metadata` JSON when the client just needs the index.
         db (AsyncSession): Database session dependency.
 
     Returns:
-        dict: A dictionary containing the conversation and a list of its messages.
+        dict: A dictionary containing the conversation, a list of its messages,
+            `has_more` and `next_cursor`.
 
     Raises:
         HTTPException: If the conversation with the specified ID is not found (404).
+        HTTPException: If limit is less than 1, fields names an unknown field or a
+            cursor is invalid (400).
     """
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="Limit must be greater than 0")
+
+    columns = None
+    if fields:
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in requested if f not in MessageModel.model_fields]
+        if unknown:
+            raise HTTPException(
+                status_code=400, detail=f"Unknown message fields: {', '.join(unknown)}"
+            )
+        names = list(MESSAGE_INDEX_FIELDS) + [f for f in requested if f not in MESSAGE_INDEX_FIELDS]
+        columns = [getattr(Message, name) for name in names]
+
     result = await db.execute(
-        select(Conversation)
-        .options(joinedload(Conversation.messages))
-        .where(Conversation.conversation_id == conversation_id)
+        select(Conversation).where(Conversation.conversation_id == conversation_id)
     )
 
     conversation = result.scalars().first()
@@ -215,22 +313,55 @@ async def get_conversation_messages(
     if not conversation:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
 
-    result = await db.execute(
-        select(Message)
-        .where(Message.conversation_id == conversation_id)
-        .order_by(Message.message_number)
-    )
+    query = select(*columns) if columns else select(Message)
+    query = query.where(Message.conversation_id == conversation_id)
+    if before is not None:
+        query = query.where(Message.message_number < decode_message_cursor(before, conversation_id))
+    if after is not None:
+        query = query.where(Message.message_number > decode_message_cursor(after, conversation_id))
+    # Paging backwards walks the index from the end and is flipped back afterwards
+    backwards = before is not None and after is None
+    if backwards:
+        query = query.order_by(Message.message_number.desc())
+    else:
+        query = query.order_by(Message.message_number)
+    if limit is not None:
+        query = query.limit(limit + 1)
 
-    messages = result.scalars().all()
+    result = await db.execute(query)
 
-    # Generate title summary if conversation has no title and has more than 3 messages
-    message_count = len(messages)
-    if conversation.title == "New conversation" and message_count > 3:
-        background_tasks.add_task(generate_conversation_summary, conversation_id, db)
+    if columns:
+        messages = [row._asdict() for row in result.all()]
+    else:
+        messages = [MessageModel.model_validate(msg) for msg in result.scalars().all()]
+
+    has_more = limit is not None and len(messages) > limit
+    if has_more:
+        messages = messages[:limit]
+    if backwards:
+        messages.reverse()
+
+    next_cursor = None
+    if has_more:
+        # The last message read in the paging direction
+        edge = messages[0] if backwards else messages[-1]
+        edge_number = edge["message_number"] if columns else edge.message_number
+        next_cursor = encode_message_cursor(conversation_id, edge_number)
+
+    # Generate title summary if conversation has no title and has more than 3 messages.
+    # The counter knows the size of the whole history even when only a page was read.
+    if conversation.next_message_number is not None:
+        message_count = conversation.next_message_number - 1
+    else:
+        message_count = len(messages)
+    if conversation.title == UNTITLED and message_count >= TITLE_MIN_MESSAGES:
+        background_tasks.add_task(generate_conversation_summary, conversation_id)
 
     return {
         "conversation": ConversationModel.model_validate(conversation),
-        "messages": [MessageModel.model_validate(msg) for msg in messages],
+        "messages": messages,
+        "has_more": has_more,
+        "next_cursor": next_cursor,
     }
 
 
@@ -274,17 +405,15 @@ async def create_message(
 @router.post("/upload", response_model=AttachmentUploadResponse)
 async def upload_file(file: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
     try:
-        # Read and validate file
-        content = await file.read()
-        if len(content) > 20 * 1024 * 1024:  # 20MB limit
-            raise HTTPException(status_code=400, detail="File is over 20MB")
-
-        # Convert to base64
-        base64_data = base64.b64encode(content).decode("utf-8")
+        # Stream the upload into the blob store; identical files are stored once
+        blob = await default_blob_store.put_stream(
+            iter_upload(file), max_size=20 * 1024 * 1024  # 20MB limit
+        )
 
         # Create attachment without message_id
         attachment = Attachment(
-            file_data=base64_data,
+            digest=blob.digest,
+            file_size=blob.size,
             file_type=file.content_type or mimetypes.guess_type(file.filename or "")[0],
         )
 
@@ -293,6 +422,8 @@ async def upload_file(file: UploadFile = File(...), db: AsyncSession = Depends(g
         await db.refresh(attachment)
 
         return AttachmentUploadResponse.model_validate(attachment)
+    except BlobTooLargeError:
+        raise HTTPException(status_code=400, detail="File is over 20MB")
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -3,7 +3,10 @@ import sys
 from contextlib import asynccontextmanager
 
 from common.database import DatabaseSessionFactory
-from common.publisher import PublisherFactory
+from bots.connection_pool import MINIMAX_HTTP_URL, close_tts_pool, get_tts_pool
+from common.outbox import default_outbox_drainer
+from common.retention import default_retention_service
+from common.publisher import close_publisher, get_publisher
 from common.models import Base
 from dotenv import load_dotenv
 from fastapi import FastAPI
@@ -20,7 +23,6 @@ logger.add(sys.stderr, level=os.getenv("WEBAPP_LOG_LEVEL", "DEBUG"))
 
 
 default_session_factory = DatabaseSessionFactory()
-default_publisher_factory = PublisherFactory()
 
 # ========================
 # FastAPI App
@@ -30,7 +32,8 @@ default_publisher_factory = PublisherFactory()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     app.state.db_factory = default_session_factory
-    app.state.publisher_factory = default_publisher_factory
+    # Creating the publisher does not connect; the broker is only contacted on first publish
+    app.state.publisher_factory = get_publisher()
     try:
         # Initialize schema from model definitions
         await default_session_factory.initialize_schema()
@@ -41,9 +44,20 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Database connection failed: {str(e)}")
         os._exit(1)
+    # Ship outbox events left over from a previous run and any new ones
+    default_outbox_drainer.start()
+    # Open the TTS connection ahead of the first request and keep it alive
+    if os.getenv("MINIMAX_API_KEY"):
+        get_tts_pool().keep_warm("minimax", MINIMAX_HTTP_URL)
+    # Expire, evict and compact recordings; set the interval to 0 to run it from cron instead
+    if float(os.getenv("RECORDINGS_RETENTION_INTERVAL_SECS", "3600")) > 0:
+        default_retention_service.start()
     yield
+    await default_retention_service.stop()
+    await default_outbox_drainer.stop()
+    await close_tts_pool()
     await default_session_factory.engine.dispose()
-    default_publisher_factory.close()
+    close_publisher()
 
 
 app = FastAPI(
@@ -58,6 +72,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Browsers hide response headers from scripts unless they are listed here
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(api_router, prefix="/api")
@@ -0,0 +1,155 @@
+"""Conditional and partial responses for stored media files.
+
+Players scrub through recordings with `Range` requests and replay them with
+`If-None-Match`; answering those with 206 and 304 instead of the whole file keeps
+egress proportional to what is actually played.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+from collections import OrderedDict
+from typing import AsyncIterator, Optional, Tuple
+
+import aiofiles
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_CHUNK_SIZE = 64 * 1024
+
+# (path, mtime_ns, size) -> sha256 hex digest
+_etag_cache: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_ETAG_CACHE_SIZE = 4096
+
+
+def _hash_file(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+async def file_etag(path: str, stat: os.stat_result) -> str:
+    """Strong ETag from the content hash, computed once per version of the file."""
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    digest = _etag_cache.get(key)
+    if digest is None:
+        digest = await asyncio.to_thread(_hash_file, path)
+        _etag_cache[key] = digest
+        while len(_etag_cache) > _ETAG_CACHE_SIZE:
+            _etag_cache.popitem(last=False)
+    else:
+        _etag_cache.move_to_end(key)
+    return f'"{digest}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as required for If-None-Match
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range `Range` header into an inclusive (start, end).
+
+    Returns:
+        The byte range, or None if the header is not satisfiable. Multiple ranges are
+        not supported and are answered with the first one only.
+
+    Raises:
+        ValueError: If the header is malformed and should be ignored.
+    """
+    match = _RANGE_RE.match(header.split(",")[0].strip())
+    if not match:
+        raise ValueError(f"Malformed range: {header}")
+    first, last = match.groups()
+    if not first and not last:
+        raise ValueError(f"Malformed range: {header}")
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            return None
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return None
+    return start, end
+
+
+async def _iter_file(path: str, start: int, length: int) -> AsyncIterator[bytes]:
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(start)
+        while length > 0:
+            chunk = await f.read(min(_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+async def media_file_response(
+    request: Request, path: str, media_type: str, filename: Optional[str] = None
+) -> Response:
+    """Serve `path` honouring `If-None-Match` and `Range`.
+
+    Args:
+        request: The incoming request, for its conditional and range headers.
+        path: The file to serve.
+        media_type: Content type of the file.
+        filename: Name suggested to the client in `Content-Disposition`.
+
+    Returns:
+        304 if the client's copy is current, 206 for a satisfiable range, 416 for an
+        unsatisfiable one and 200 with the whole file otherwise.
+    """
+    stat = await asyncio.to_thread(os.stat, path)
+    size = stat.st_size
+    etag = await file_etag(path, stat)
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        # Content-addressed, so clients may keep it; revalidation is a cheap 304
+        "Cache-Control": "private, max-age=86400",
+    }
+    if filename:
+        headers["Content-Disposition"] = f'inline; filename="{filename}"'
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    start, end = 0, size - 1
+    status_code = 200
+    range_header = request.headers.get("range")
+    # A stale If-Range means the client's partial copy is of another version
+    if range_header and request.headers.get("if-range", etag) == etag:
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            # Malformed ranges are ignored and the whole file is sent
+            pass
+        else:
+            if byte_range is None:
+                headers["Content-Range"] = f"bytes */{size}"
+                return Response(status_code=416, headers=headers)
+            status_code = 206
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    length = max(0, end - start + 1)
+    headers["Content-Length"] = str(length)
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+    return StreamingResponse(
+        _iter_file(path, start, length),
+        status_code=status_code,
+        headers=headers,
+        media_type=media_type,
+    )